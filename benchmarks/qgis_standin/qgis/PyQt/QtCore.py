@@ -0,0 +1,5 @@
+class QVariant:
+  Int = 2
+  Double = 6
+  String = 10
+  LongLong = 4
@@ -0,0 +1,4 @@
+'''
+  local stand-in for the parts of PyQGIS the pyshores stages use, for the
+  benchmarks on machines without QGIS. see qgis.core
+'''
@@ -0,0 +1,372 @@
+import math
+import os
+import pickle
+import struct
+
+from typing import List
+
+import numpy as np
+
+'''
+  in process stand-in for the qgis.core classes the pyshores stages use, so
+  the stages run headless in the benchmarks.
+
+  a vector "file" (whatever its extension) is a pickle of its fields, geometry
+  type, crs and features, written by QgsVectorFileWriter and read by
+  QgsVectorLayer. geometries keep their vertices as numpy arrays and hand out
+  QgsPointXY lists as QGIS does, features are built one by one when a layer is
+  read, so the stages do the same per feature work as with QGIS. line layers
+  are read back as multilines, as shapefiles are.
+
+  there is no GEOS and no PROJ: the qgis intersection engine, spatial indexes
+  and reprojection are not available. every benchmark layer is in one crs.
+'''
+
+NULL = None
+
+class QgsApplication:
+  _instance = None
+
+  def __init__(self, *args) -> None:
+    QgsApplication._instance = self
+
+  @classmethod
+  def instance(cls):
+    return cls._instance
+
+  def initQgis(self):
+    pass
+
+class QgsWkbTypes:
+  Unknown = 0
+  Point = 1
+  LineString = 2
+  MultiPoint = 4
+  MultiLineString = 5
+  NoGeometry = 100
+
+  names = {0: "Unknown", 1: "Point", 2: "LineString", 4: "MultiPoint", 5: "MultiLineString", 100: "NoGeometry"}
+
+  @classmethod
+  def isMultiType(cls, wkb_type: int) -> bool:
+    return wkb_type in (cls.MultiPoint, cls.MultiLineString)
+
+  @classmethod
+  def isSingleType(cls, wkb_type: int) -> bool:
+    return not cls.isMultiType(wkb_type)
+
+  @classmethod
+  def flatType(cls, wkb_type: int) -> int:
+    return wkb_type
+
+  @classmethod
+  def displayString(cls, wkb_type: int) -> str:
+    return cls.names[wkb_type]
+
+class QgsCoordinateReferenceSystem:
+  WKT2_2019 = 1
+
+  # authority ids the stand-in knows to be geographic
+  geographic = ("EPSG:4326", "EPSG:4269", "OGC:CRS84")
+
+  def __init__(self, definition: str = "") -> None:
+    self.definition = definition or ""
+
+  def isValid(self) -> bool:
+    return self.definition != ""
+
+  def authid(self) -> str:
+    return self.definition
+
+  def toWkt(self, *args) -> str:
+    return self.definition
+
+  def isGeographic(self) -> bool:
+    return self.definition.upper() in self.geographic
+
+  def __eq__(self, other) -> bool:
+    return isinstance(other, QgsCoordinateReferenceSystem) and self.definition == other.definition
+
+class QgsProject:
+  _instance = None
+
+  @classmethod
+  def instance(cls) -> 'QgsProject':
+    if cls._instance is None:
+      cls._instance = QgsProject()
+    return cls._instance
+
+  def homePath(self) -> str:
+    return ""
+
+  def baseName(self) -> str:
+    return ""
+
+  def crs(self) -> QgsCoordinateReferenceSystem:
+    return QgsCoordinateReferenceSystem()
+
+  def transformContext(self):
+    return None
+
+  def mapLayersByName(self, name: str) -> list:
+    return []
+
+class QgsPointXY:
+  __slots__ = ("_x", "_y")
+
+  def __init__(self, x: float, y: float) -> None:
+    self._x = float(x)
+    self._y = float(y)
+
+  def x(self) -> float:
+    return self._x
+
+  def y(self) -> float:
+    return self._y
+
+  def __getitem__(self, indx: int) -> float:
+    return (self._x, self._y)[indx]
+
+  def azimuth(self, other: 'QgsPointXY') -> float:
+    '''
+      degrees clockwise from north, as QgsPointXY.azimuth
+    '''
+    return math.degrees(math.atan2(other._x - self._x, other._y - self._y))
+
+class QgsGeometry:
+  def __init__(self, wkb_type: int = QgsWkbTypes.Unknown, parts: List[np.ndarray] = None) -> None:
+    self.wkb_type = wkb_type
+    self.parts = parts if parts is not None else []
+
+  @classmethod
+  def points(cls, points) -> np.ndarray:
+    return np.array([[point.x(), point.y()] for point in points], dtype=float).reshape(-1, 2)
+
+  @classmethod
+  def fromPointXY(cls, point: QgsPointXY) -> 'QgsGeometry':
+    return cls(QgsWkbTypes.Point, [np.array([[point.x(), point.y()]])])
+
+  @classmethod
+  def fromMultiPointXY(cls, points: List[QgsPointXY]) -> 'QgsGeometry':
+    return cls(QgsWkbTypes.MultiPoint, [cls.points(points)])
+
+  @classmethod
+  def fromPolylineXY(cls, points: List[QgsPointXY]) -> 'QgsGeometry':
+    return cls(QgsWkbTypes.LineString, [cls.points(points)])
+
+  @classmethod
+  def fromMultiPolylineXY(cls, lines: List[List[QgsPointXY]]) -> 'QgsGeometry':
+    return cls(QgsWkbTypes.MultiLineString, [cls.points(line) for line in lines])
+
+  def wkbType(self) -> int:
+    return self.wkb_type
+
+  def isNull(self) -> bool:
+    return self.parts == []
+
+  def asPoint(self) -> QgsPointXY:
+    return QgsPointXY(*self.parts[0][0])
+
+  def asMultiPoint(self) -> List[QgsPointXY]:
+    return [QgsPointXY(x, y) for (x, y) in self.parts[0]]
+
+  # as QGIS, single and multi types do not convert into each other
+  def asPolyline(self) -> List[QgsPointXY]:
+    if self.wkb_type != QgsWkbTypes.LineString:
+      return []
+    return [QgsPointXY(x, y) for (x, y) in self.parts[0]]
+
+  def asMultiPolyline(self) -> List[List[QgsPointXY]]:
+    if self.wkb_type != QgsWkbTypes.MultiLineString:
+      return []
+    return [[QgsPointXY(x, y) for (x, y) in part] for part in self.parts]
+
+  def asWkb(self) -> bytes:
+    '''
+      not real WKB, but bytes that change with the type and every vertex
+    '''
+    header = struct.pack("<II", self.wkb_type, len(self.parts))
+    return header + b"".join(struct.pack("<I", len(part)) + part.tobytes() for part in self.parts)
+
+  def transform(self, *args):
+    raise NotImplementedError("the QGIS stand-in has no reprojection, install pyproj or keep every layer in one crs")
+
+  def intersection(self, *args):
+    raise NotImplementedError("the QGIS stand-in has no GEOS, use the numpy intersection backend")
+
+class QgsField:
+  def __init__(self, name: str, field_type: int = 10) -> None:
+    self._name = name
+    self._type = field_type
+
+  def name(self) -> str:
+    return self._name
+
+  def type(self) -> int:
+    return self._type
+
+class QgsFields:
+  def __init__(self) -> None:
+    self.fields: List[QgsField] = []
+    self.indices = {}
+
+  def append(self, field: QgsField) -> bool:
+    self.indices[field.name()] = len(self.fields)
+    self.fields.append(field)
+    return True
+
+  def names(self) -> List[str]:
+    return [field.name() for field in self.fields]
+
+  def indexOf(self, name: str) -> int:
+    return self.indices.get(name, -1)
+
+  def count(self) -> int:
+    return len(self.fields)
+
+  def __len__(self) -> int:
+    return len(self.fields)
+
+  def __iter__(self):
+    return iter(self.fields)
+
+class QgsFeature:
+  def __init__(self, fields: QgsFields = None, feature_id: int = -1) -> None:
+    self._fields = fields
+    self._id = feature_id
+    self._attributes = []
+    self._geometry = QgsGeometry()
+
+  def id(self) -> int:
+    return self._id
+
+  def setGeometry(self, geometry: QgsGeometry):
+    self._geometry = geometry
+
+  def geometry(self) -> QgsGeometry:
+    return self._geometry
+
+  def setAttributes(self, attributes: list):
+    self._attributes = list(attributes)
+
+  def attributes(self) -> list:
+    return self._attributes
+
+  def fields(self) -> QgsFields:
+    return self._fields
+
+  def __getitem__(self, name):
+    if isinstance(name, int):
+      return self._attributes[name]
+    return self._attributes[self._fields.indexOf(name)]
+
+class QgsFeatureRequest:
+  def __init__(self) -> None:
+    self.destination_crs = None
+
+  def setSubsetOfAttributes(self, attributes, fields=None) -> 'QgsFeatureRequest':
+    return self
+
+  def setDestinationCrs(self, crs: QgsCoordinateReferenceSystem, context) -> 'QgsFeatureRequest':
+    self.destination_crs = crs
+    return self
+
+class QgsVectorFileWriter:
+  NoError = 0
+
+  def __init__(self, file_path: str, encoding: str, fields: QgsFields, geometry_type: int, srs: QgsCoordinateReferenceSystem = None, driverName: str = None) -> None:
+    self.file_path = file_path
+    self.fields = [(field.name(), field.type()) for field in fields]
+    self.geometry_type = geometry_type
+    self.crs = srs.authid() if srs is not None else ""
+    self.features = []
+
+  def hasError(self) -> int:
+    return self.NoError
+
+  def errorMessage(self) -> str:
+    return ""
+
+  def addFeature(self, feature: QgsFeature, *args) -> bool:
+    geometry = feature.geometry()
+    self.features.append((list(feature.attributes()), None if geometry.isNull() else [np.array(part) for part in geometry.parts]))
+    return True
+
+  def addFeatures(self, features: List[QgsFeature], *args) -> bool:
+    for feature in features:
+      self.addFeature(feature)
+    return True
+
+  # the file is written when the writer is deleted, as QGIS finishes it
+  def __del__(self):
+    with open(self.file_path, "wb") as layer_file:
+      pickle.dump({
+        "fields": self.fields,
+        "geometry_type": self.geometry_type,
+        "crs": self.crs,
+        "features": self.features
+      }, layer_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+class QgsVectorLayer:
+  def __init__(self, file_path: str = "", name: str = None, provider: str = "ogr") -> None:
+    self.file_path = file_path
+    self._name = name if name is not None else os.path.splitext(os.path.basename(file_path))[0]
+    self.data = None
+    if os.path.isfile(file_path):
+      with open(file_path, "rb") as layer_file:
+        self.data = pickle.load(layer_file)
+
+    self._fields = QgsFields()
+    for (field_name, field_type) in (self.data["fields"] if self.data is not None else []):
+      self._fields.append(QgsField(field_name, field_type))
+
+  def isValid(self) -> bool:
+    return self.data is not None
+
+  def name(self) -> str:
+    return self._name
+
+  def crs(self) -> QgsCoordinateReferenceSystem:
+    return QgsCoordinateReferenceSystem(self.data["crs"] if self.data is not None else "")
+
+  def fields(self) -> QgsFields:
+    return self._fields
+
+  def featureCount(self) -> int:
+    return len(self.data["features"]) if self.data is not None else 0
+
+  def getFeatures(self, request: QgsFeatureRequest = None):
+    if self.data is None:
+      return
+    if request is not None and request.destination_crs is not None and not (request.destination_crs == self.crs()):
+      raise NotImplementedError("the QGIS stand-in has no reprojection, keep every layer in one crs")
+
+    # lines come back as multilines, as from a shapefile
+    geometry_type = self.data["geometry_type"]
+    if geometry_type == QgsWkbTypes.LineString:
+      geometry_type = QgsWkbTypes.MultiLineString
+
+    for (feature_id, (attributes, parts)) in enumerate(self.data["features"]):
+      feature = QgsFeature(self._fields, feature_id)
+      feature.setAttributes(attributes)
+      if parts is not None:
+        feature.setGeometry(QgsGeometry(geometry_type, parts))
+      yield feature
+
+  def dataProvider(self):
+    raise NotImplementedError("the QGIS stand-in cannot edit layers in place, incremental runs are not benchmarked")
+
+class QgsCoordinateTransform:
+  def __init__(self, *args) -> None:
+    raise NotImplementedError("the QGIS stand-in has no reprojection, install pyproj or keep every layer in one crs")
+
+class QgsSpatialIndex:
+  def __init__(self, *args) -> None:
+    raise NotImplementedError("the QGIS stand-in has no spatial index, use the numpy intersection backend")
+
+# only named in type annotations by the stages
+class QgsLineString:
+  pass
+
+class QgsMultiLineString:
+  pass
@@ -0,0 +1,267 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from synthetic_coast import SyntheticCoast
+
+'''
+  times every pyshores stage on synthetic coasts of increasing size.
+
+  the stage classes run as they do in a project folder, reading and writing layers:
+    transects   TransectGenerator.run
+    intersects  IntersectFinder.run (numpy backend, matrix CoastSat output)
+    parse       CoastSatParser.run
+    metrics     MetricsCalculator.run (with the rates layer)
+  and the whole chain end to end, each in a fresh project folder:
+    pipeline    the four stages one after another, every stage reading the outputs of the last
+    chain       transects, then `pyshores chain` (intersects, parse and metrics sharing a Session)
+
+  QGIS is not needed: the stages import qgis from benchmarks/qgis_standin, an
+  in process stand-in whose layers are pickles. times include the stand-in, so
+  compare them between commits, not with QGIS. --installed-qgis runs the
+  stages on the QGIS install instead (shapefiles, QGIS_PREFIX_PATH as for the cli).
+
+  usage, from the repository root (pyshores is imported from this checkout,
+  installed or not):
+    python benchmarks/run_benchmarks.py --sizes 1000 4000 16000 --dates 50
+
+  writes to --output (default benchmarks/results):
+    results.json   every run of every stage, with the machine and the parameters
+    scaling.csv    best time of every stage at every size, one row per size
+
+  the same seed gives the same coasts, so results of two commits can be compared
+'''
+
+benchmarks_path = os.path.dirname(os.path.abspath(__file__))
+
+spacing = 5
+# across the whole gap between the synthetic baselines (120 m), so transects reach every shoreline
+transect_length = 150
+crs = 'EPSG:32651'
+
+def timed(function, *args, **kwargs):
+  start = time.perf_counter()
+  # the stages print their progress and run reports
+  with contextlib.redirect_stdout(io.StringIO()):
+    result = function(*args, **kwargs)
+  return time.perf_counter() - start, result
+
+def use_qgis(installed_qgis: bool):
+  '''
+    puts the QGIS stand-in (unless installed_qgis) and this checkout of
+    pyshores first on the import path, then starts QGIS
+  '''
+  if not installed_qgis:
+    sys.path.insert(0, os.path.join(benchmarks_path, 'qgis_standin'))
+  sys.path.insert(0, os.path.dirname(benchmarks_path))
+
+  from pyshores.cli import start_qgis
+  start_qgis()
+
+def write_layer(file_path: str, lines, dates=None):
+  '''
+    a line layer of the given lines (each a list of (M, 2) parts), with a
+    dates attribute when dates are given
+  '''
+  from qgis.core import QgsCoordinateReferenceSystem, QgsFeature, QgsField, QgsFields, QgsGeometry, QgsPointXY, QgsVectorFileWriter, QgsWkbTypes
+  from qgis.PyQt.QtCore import QVariant
+
+  fields = QgsFields()
+  if dates is not None:
+    fields.append(QgsField('dates', QVariant.String))
+
+  writer = QgsVectorFileWriter(
+    file_path,
+    'UTF-8',
+    fields,
+    QgsWkbTypes.MultiLineString,
+    srs=QgsCoordinateReferenceSystem(crs),
+    driverName='ESRI Shapefile'
+  )
+  for (indx, parts) in enumerate(lines):
+    feature = QgsFeature()
+    feature.setGeometry(QgsGeometry.fromMultiPolylineXY([[QgsPointXY(x, y) for (x, y) in part] for part in parts]))
+    if dates is not None:
+      feature.setAttributes([dates[indx]])
+    writer.addFeature(feature)
+  del writer
+
+def make_project(project_path: str, coast: dict):
+  '''
+    project folder with the baselines, shorelines and uncertainties of a coast
+  '''
+  if os.path.isdir(project_path):
+    shutil.rmtree(project_path)
+  for folder in ('transects', 'positions', 'intersects', 'shorelines'):
+    os.makedirs(os.path.join(project_path, folder))
+
+  write_layer(os.path.join(project_path, 'transects', 'landward.shp'), [coast['landward']])
+  write_layer(os.path.join(project_path, 'transects', 'seaward.shp'), [coast['seaward']])
+  write_layer(os.path.join(project_path, 'positions', 'shorelines.shp'), coast['shorelines'], coast['dates'])
+
+  with open(os.path.join(project_path, 'shorelines', 'uncertainty.csv'), 'w', newline='') as uncertainty_file:
+    writer = csv.writer(uncertainty_file)
+    writer.writerow(['Date', 'Uncertainty'])
+    writer.writerows(zip(coast['dates'], coast['uncertainty']))
+
+def run_transects(project_path: str):
+  from qgis.core import QgsVectorLayer
+  from pyshores.TransectGenerator import TransectGenerator
+
+  landward = QgsVectorLayer(os.path.join(project_path, 'transects', 'landward.shp'), 'landward', 'ogr')
+  seaward = QgsVectorLayer(os.path.join(project_path, 'transects', 'seaward.shp'), 'seaward', 'ogr')
+  TransectGenerator(landward, seaward, spacing, project_path=project_path, transect_length=transect_length).run()
+
+def run_intersects(project_path: str, processes: int):
+  from pyshores.IntersectFinder import IntersectFinder
+
+  IntersectFinder(
+    'transects_landward.shp',
+    'shorelines.shp',
+    backend='numpy',
+    processes=processes,
+    project_path=project_path,
+    coastSat_format='matrix'
+  ).run()
+
+def run_parse(project_path: str):
+  from pyshores.CoastSatParser import CoastSatParser
+
+  CoastSatParser('coastSat/coastSat_intersects.npy', 'transects_landward.shp', project_path=project_path).run()
+
+def run_metrics(project_path: str, processes: int):
+  from pyshores.MetricsCalculator import MetricsCalculator
+
+  mc = MetricsCalculator(project_path=project_path)
+  mc.loadLayers('coastSat/coastSat_intersects.npy', 'transects_landward.shp', 'uncertainty.csv')
+  mc.run(processes=processes)
+
+def run_pipeline(project_path: str, processes: int):
+  run_transects(project_path)
+  run_intersects(project_path, processes)
+  run_parse(project_path)
+  run_metrics(project_path, processes)
+
+def run_chain(project_path: str, processes: int):
+  from pyshores.cli import main
+
+  run_transects(project_path)
+  main([
+    '-p', project_path,
+    'chain',
+    '--transects', 'transects_landward.shp',
+    '--shorelines', 'shorelines.shp',
+    '--uncertainty', 'uncertainty.csv',
+    '--processes', str(processes)
+  ])
+
+def synthetic_coast(n_transects: int, n_dates: int, seed: int) -> dict:
+  coast = SyntheticCoast(n_transects * spacing, n_dates, seed=seed)
+  landward, seaward = coast.baselines()
+  shorelines, dates, uncertainty = coast.shorelines()
+
+  return {
+    'landward': landward,
+    'seaward': seaward,
+    'shorelines': shorelines,
+    'dates': [str(date.astype(object).strftime('%d/%m/%Y')) for date in dates],
+    'uncertainty': uncertainty.tolist()
+  }
+
+def run_size(n_transects: int, n_dates: int, seed: int, processes: int, output_path: str) -> dict:
+  from pyshores.IntersectMatrix import IntersectMatrix
+
+  coast = synthetic_coast(n_transects, n_dates, seed)
+  project_path = os.path.join(output_path, 'project')
+
+  # every stage on the outputs of the stage before
+  times = {}
+  make_project(project_path, coast)
+  times['transects'], _ = timed(run_transects, project_path)
+  times['intersects'], _ = timed(run_intersects, project_path, processes)
+  times['parse'], _ = timed(run_parse, project_path)
+  times['metrics'], _ = timed(run_metrics, project_path, processes)
+
+  matrix = IntersectMatrix.load(os.path.join(project_path, 'intersects', 'coastSat', 'coastSat_intersects.npy'))
+  n_transects_generated = len(matrix.transects)
+  intersections = int(np.count_nonzero(~np.isnan(np.asarray(matrix.distances))))
+  del matrix
+
+  # end to end, from the baselines and shorelines of a fresh project
+  make_project(project_path, coast)
+  times['pipeline'], _ = timed(run_pipeline, project_path, processes)
+  make_project(project_path, coast)
+  times['chain'], _ = timed(run_chain, project_path, processes)
+
+  shutil.rmtree(project_path)
+
+  return {
+    'size': n_transects,
+    'transects': n_transects_generated,
+    'dates': n_dates,
+    'intersections': intersections,
+    'seconds': times
+  }
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='time every pyshores stage on synthetic coasts')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 16000], help='number of transects of every coast')
+  parser.add_argument('--dates', type=int, default=50, help='shoreline dates of every coast')
+  parser.add_argument('--repeat', type=int, default=3, help='runs of every size, the best is kept in scaling.csv')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--processes', type=int, default=1, help='worker processes of the intersects and metrics stages')
+  parser.add_argument('--installed-qgis', action='store_true', help='run the stages on the installed QGIS instead of the stand-in')
+  parser.add_argument('--output', default=os.path.join(benchmarks_path, 'results'))
+  args = parser.parse_args(argv)
+
+  use_qgis(args.installed_qgis)
+  os.makedirs(args.output, exist_ok=True)
+
+  runs = []
+  for n_transects in args.sizes:
+    for repeat in range(args.repeat):
+      run = run_size(n_transects, args.dates, args.seed, args.processes, args.output)
+      run['repeat'] = repeat
+      runs.append(run)
+      print('{n} transects x {m} dates, run {r}: {stages}'.format(
+        n=run['transects'],
+        m=args.dates,
+        r=repeat,
+        stages=', '.join('{stage} {s:.3f}s'.format(stage=stage, s=seconds) for (stage, seconds) in run['seconds'].items())
+      ))
+
+  with open(os.path.join(args.output, 'results.json'), 'w') as results_file:
+    json.dump({
+      'machine': {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'qgis': 'installed' if args.installed_qgis else 'stand-in'
+      },
+      'parameters': vars(args),
+      'runs': runs
+    }, results_file, indent=2)
+
+  stages = list(runs[0]['seconds'])
+  with open(os.path.join(args.output, 'scaling.csv'), 'w', newline='') as scaling_file:
+    writer = csv.writer(scaling_file)
+    writer.writerow(['n_transects', 'n_dates'] + stages)
+    for n_transects in args.sizes:
+      size_runs = [run for run in runs if run['size'] == n_transects]
+      writer.writerow(
+        [size_runs[0]['transects'], args.dates]
+        + ['{s:.6f}'.format(s=min(run['seconds'][stage] for run in size_runs)) for stage in stages]
+      )
+
+if __name__ == '__main__':
+  main()
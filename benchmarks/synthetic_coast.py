@@ -0,0 +1,93 @@
+from typing import List, Tuple
+
+import numpy as np
+
+'''
+  seeded synthetic coast for the benchmarks.
+
+  the landward baseline is a fractal (midpoint displacement) line running along x,
+  the seaward baseline the same line offset by baseline_gap meters with a fractal
+  perturbation of its own. shorelines lie between the two, at a position that
+  drifts with a per alongshore trend, a seasonal swing and noise. some shorelines
+  have gaps (e.g. clouds), cut out of the line so they become multipart, and
+  some dates only cover part of the coast.
+
+  the same seed always gives the same coast.
+'''
+
+class SyntheticCoast:
+  def __init__(self, length_m: float, n_dates: int, seed: int = 0, vertex_spacing_m: float = 10, baseline_gap_m: float = 120) -> None:
+    self.length_m = length_m
+    self.n_dates = n_dates
+    self.vertex_spacing_m = vertex_spacing_m
+    self.baseline_gap_m = baseline_gap_m
+    self.rng = np.random.default_rng(seed)
+
+    # vertex x and landward y, set by baselines
+    self.x: np.ndarray = None
+    self.landward_y: np.ndarray = None
+
+  def fractalProfile(self, n_vertices: int, roughness: float = 0.6, amplitude: float = 40) -> np.ndarray:
+    '''
+      (n_vertices,) midpoint displacement profile, larger roughness is more jagged
+    '''
+    levels = int(np.ceil(np.log2(max(n_vertices - 1, 1))))
+    profile = np.zeros(2 ** levels + 1)
+    scale = amplitude
+    step = 2 ** levels
+    while step > 1:
+      half = step // 2
+      profile[half::step] = (profile[:-1:step] + profile[step::step]) / 2 + self.rng.normal(0, scale, len(profile[half::step]))
+      scale *= roughness
+      step = half
+
+    # resample to the requested number of vertices
+    return np.interp(np.linspace(0, 1, n_vertices), np.linspace(0, 1, len(profile)), profile)
+
+  def baselines(self) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    '''
+      landward and seaward baselines, each as a list of one (M, 2) part
+    '''
+    n_vertices = int(self.length_m // self.vertex_spacing_m) + 1
+    x = np.linspace(0, self.length_m, n_vertices)
+    self.x = x
+    self.landward_y = self.fractalProfile(n_vertices)
+    seaward_y = self.landward_y + self.baseline_gap_m + self.fractalProfile(n_vertices, amplitude=8)
+
+    return [np.stack([x, self.landward_y], axis=1)], [np.stack([x, seaward_y], axis=1)]
+
+  def shorelines(self, gap_probability: float = 0.3, partial_probability: float = 0.1) -> Tuple[List[List[np.ndarray]], np.ndarray, np.ndarray]:
+    '''
+      shorelines as lists of parts, their dates and their uncertainty in meters.
+      call baselines first
+    '''
+    n_vertices = len(self.x)
+    dates = np.datetime64('1990-01-01') + np.sort(self.rng.choice(365 * 30, self.n_dates, replace=False)).astype('timedelta64[D]')
+    years = (dates - dates[0]).astype(float) / 365
+
+    trend = self.fractalProfile(n_vertices, roughness=0.5, amplitude=0.5)
+    uncertainty = self.rng.uniform(2, 15, self.n_dates)
+
+    shorelines: List[List[np.ndarray]] = []
+    for (year, sigma) in zip(years, uncertainty):
+      offset = (
+        self.baseline_gap_m / 2
+        + trend * year
+        + 5 * np.sin(2 * np.pi * year)
+        + self.rng.normal(0, sigma / 2, n_vertices)
+      )
+      line = np.stack([self.x, self.landward_y + offset], axis=1)
+
+      keep = np.ones(n_vertices, dtype=bool)
+      if self.rng.random() < partial_probability:
+        keep[:self.rng.integers(n_vertices // 4, n_vertices // 2)] = False
+      if self.rng.random() < gap_probability:
+        start = self.rng.integers(0, n_vertices)
+        keep[start:start + self.rng.integers(5, max(6, n_vertices // 10))] = False
+
+      # split the line where vertices were removed
+      breaks = np.flatnonzero(np.diff(keep.astype(int)) != 0) + 1
+      kept = [mask.all() for mask in np.split(keep, breaks)]
+      shorelines.append([part for (part, is_kept) in zip(np.split(line, breaks), kept) if is_kept and len(part) > 1])
+
+    return shorelines, dates, uncertainty
@@ -0,0 +1,387 @@
+import os
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+  from .AzimuthSmoother import AzimuthSmoother
+  from .GeometryArrays import GeometryArrays
+  from .Reprojection import Reprojection
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from AzimuthSmoother import AzimuthSmoother
+  from GeometryArrays import GeometryArrays
+  from Reprojection import Reprojection
+
+'''
+  alongshore aggregation of the per transect rates of MetricsCalculator.
+
+  transects are taken in the order TransectGenerator writes them, along the
+  landward baseline. transects of a batch run ("<site>_T<index>") are grouped
+  by site, and nothing is aggregated across two sites.
+
+  three kinds of cells:
+    windows    the window_size transects centered on every transect, fewer at
+               the ends of a site (as the shrink edges of AzimuthSmoother).
+               n, mean, SD and erosion fraction come from prefix sums of the
+               rates, computed once and shared by every window size of a sweep,
+               so every window size costs O(transects) whatever its size.
+               median and quantiles have no prefix sum, they come from the
+               sorted (transects, window) array of the windows, in tiles of
+               budget_cells, O(transects * window log window)
+    fixed      cells of cell_length meters of chainage (distance along the
+               transect origins from the first transect of the site)
+    polygons   cells given as polygons, a transect belongs to the first polygon
+               holding its midpoint
+
+  fixed and polygon cells are aggregated from one sort of the transects by
+  cell and rate: every cell is a contiguous block of the sort, its sums come
+  from np.add.reduceat at the block starts and its quantiles are read at their
+  index in the block.
+
+  statistics of every metric, as <metric>_<statistic> columns:
+    n          transects with a rate
+    mean, SD   SD with ddof 1, as RatesEngine.summarize
+    median, q<percent>   quantiles, linearly interpolated as np.quantile
+    erosion    fraction of the transects with a rate below 0
+'''
+
+class AlongshoreAggregator:
+  # cells of the (transects, window, metrics) arrays of the window quantiles
+  budget_cells = 2 ** 24
+
+  @classmethod
+  def sites(cls, names: list) -> np.ndarray:
+    '''
+      site of every transect from its "<site>_T<index>" name, "" for plain "T<index>" names
+    '''
+    return np.array([str(name).rpartition("_T")[0] for name in names], dtype=object)
+
+  @classmethod
+  def siteBounds(cls, sites: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+      (start, stop) of the run of transects of the same site around every transect
+    '''
+    n = len(sites)
+    starts = np.concatenate([[0], np.flatnonzero(sites[1:] != sites[:-1]) + 1])
+    stops = np.concatenate([starts[1:], [n]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.concatenate([starts, [n]])))
+
+    return starts[group], stops[group]
+
+  @classmethod
+  def chainage(cls, origins: np.ndarray, sites: np.ndarray) -> np.ndarray:
+    '''
+      distance along the transect origins from the first origin of the site
+    '''
+    steps = np.zeros(len(origins))
+    steps[1:] = np.hypot(*np.diff(origins, axis=0).T)
+    steps[1:][sites[1:] != sites[:-1]] = 0
+
+    cumulative = np.cumsum(steps)
+    starts, _ = cls.siteBounds(sites)
+    return cumulative - cumulative[starts]
+
+  @classmethod
+  def prefixSums(cls, values: np.ndarray) -> Dict[str, np.ndarray]:
+    '''
+      (transects + 1, metrics) prefix sums of the counts, rates, squared rates
+      and erosion counts, nan rates count as nothing
+    '''
+    observed = ~np.isnan(values)
+    filled = np.where(observed, values, 0)
+
+    prefix = {}
+    for (name, terms) in [("n", observed), ("sum", filled), ("squares", filled ** 2), ("erosion", filled < 0)]:
+      prefix[name] = np.zeros((len(values) + 1, values.shape[1]))
+      np.cumsum(terms, axis=0, out=prefix[name][1:])
+
+    return prefix
+
+  @classmethod
+  def windowBounds(cls, window_size: int, site_starts: np.ndarray, site_stops: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    before, after = AzimuthSmoother.windowOffsets(window_size)
+    indices = np.arange(len(site_starts))
+
+    return np.maximum(indices - before, site_starts), np.minimum(indices + after + 1, site_stops)
+
+  @classmethod
+  def momentStats(cls, prefix: Dict[str, np.ndarray], lo: np.ndarray, hi: np.ndarray) -> Dict[str, np.ndarray]:
+    '''
+      n, mean, SD and erosion fraction of the transects lo to hi of every cell
+    '''
+    sums = {name: prefix[name][hi] - prefix[name][lo] for name in prefix}
+    n = sums["n"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      mean = sums["sum"] / n
+      # sum of squared deviations, clipped at 0 against rounding
+      deviations = np.maximum(sums["squares"] - n * mean ** 2, 0)
+      sd = np.where(n > 1, np.sqrt(deviations / (n - 1)), np.nan)
+      erosion = sums["erosion"] / n
+
+    return {"n": n, "mean": mean, "SD": sd, "erosion": erosion}
+
+  @classmethod
+  def windowQuantiles(cls, values: np.ndarray, lo: np.ndarray, hi: np.ndarray, quantiles: List[float]) -> np.ndarray:
+    '''
+      (quantiles, transects, metrics) quantiles of every window, nan beyond the site
+    '''
+    n_transects, n_metrics = values.shape
+    window = int((hi - lo).max()) if n_transects else 0
+    result = np.full((len(quantiles), n_transects, n_metrics), np.nan)
+    tile_size = max(1, cls.budget_cells // max(window * n_metrics, 1))
+
+    for start in range(0, n_transects, tile_size):
+      tile = slice(start, start + tile_size)
+      indices = lo[tile][:, None] + np.arange(window)[None, :]
+      outside = indices >= hi[tile][:, None]
+      windows = values[np.minimum(indices, n_transects - 1)]
+      windows[outside] = np.nan
+
+      # sorted windows (nan last), quantile q of n rates is at q * (n - 1)
+      # ... read with take_along_axis, much faster than np.nanquantile
+      windows.sort(axis=1)
+      n = np.count_nonzero(~np.isnan(windows), axis=1)
+      for (q_indx, q) in enumerate(quantiles):
+        position = q * np.maximum(n - 1, 0)
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, np.maximum(n - 1, 0))
+        fraction = position - below
+        quantile = (
+          np.take_along_axis(windows, below[:, None, :], axis=1)[:, 0] * (1 - fraction)
+          + np.take_along_axis(windows, above[:, None, :], axis=1)[:, 0] * fraction
+        )
+        result[q_indx, tile] = np.where(n > 0, quantile, np.nan)
+
+    return result
+
+  @classmethod
+  def quantileNames(cls, quantiles: List[float]) -> List[str]:
+    return ["median" if q == 0.5 else "q{p:g}".format(p=q * 100) for q in quantiles]
+
+  @classmethod
+  def statsFrame(cls, stats: Dict[str, np.ndarray], metrics: List[str], index=None) -> pd.DataFrame:
+    '''
+      <metric>_<statistic> columns of (cells, metrics) statistics
+    '''
+    columns = {}
+    for metric_indx, metric in enumerate(metrics):
+      for (statistic, values) in stats.items():
+        columns["{m}_{s}".format(m=metric, s=statistic)] = values[:, metric_indx]
+
+    return pd.DataFrame(columns, index=index)
+
+  @classmethod
+  def windows(
+    cls,
+    values: np.ndarray,
+    window_sizes: List[int],
+    sites: np.ndarray,
+    metrics: List[str],
+    quantiles: List[float] = (0.1, 0.25, 0.5, 0.75, 0.9)
+  ) -> Dict[int, pd.DataFrame]:
+    '''
+      statistics of the window of every transect, for every window size.
+      values is (transects, metrics), in transect order
+    '''
+    values = np.asarray(values, dtype=float)
+    site_starts, site_stops = cls.siteBounds(sites)
+    prefix = cls.prefixSums(values)
+
+    frames = {}
+    for window_size in window_sizes:
+      lo, hi = cls.windowBounds(int(window_size), site_starts, site_stops)
+      stats = cls.momentStats(prefix, lo, hi)
+      if len(quantiles) > 0:
+        stats.update(zip(cls.quantileNames(quantiles), cls.windowQuantiles(values, lo, hi, list(quantiles))))
+      frames[int(window_size)] = cls.statsFrame(stats, metrics)
+
+    return frames
+
+  @classmethod
+  def cellStats(
+    cls,
+    values: np.ndarray,
+    cell_ids: np.ndarray,
+    metrics: List[str],
+    quantiles: List[float] = (0.1, 0.25, 0.5, 0.75, 0.9)
+  ) -> pd.DataFrame:
+    '''
+      statistics of every cell with at least one transect, indexed by cell id.
+      cell_ids is the cell of every transect, -1 for none
+    '''
+    values = np.asarray(values, dtype=float)
+    in_cell = cell_ids >= 0
+    values = values[in_cell]
+    cell_ids = cell_ids[in_cell]
+
+    cells, starts = np.unique(np.sort(cell_ids), return_index=True)
+    stats = {name: np.full((len(cells), values.shape[1]), np.nan) for name in ["n", "mean", "SD", "erosion"] + cls.quantileNames(quantiles)}
+    if len(cells) == 0:
+      return cls.statsFrame(stats, metrics, index=cells)
+
+    for metric_indx in range(values.shape[1]):
+      # one sort by cell then rate, nan rates last in every cell
+      order = np.lexsort((values[:, metric_indx], cell_ids))
+      sorted_values = values[order, metric_indx]
+
+      observed = ~np.isnan(sorted_values)
+      filled = np.where(observed, sorted_values, 0)
+      n = np.add.reduceat(observed.astype(float), starts)
+      sums = np.add.reduceat(filled, starts)
+      squares = np.add.reduceat(filled ** 2, starts)
+      eroding = np.add.reduceat((filled < 0).astype(float), starts)
+
+      with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sums / n
+        stats["n"][:, metric_indx] = n
+        stats["mean"][:, metric_indx] = mean
+        stats["SD"][:, metric_indx] = np.where(n > 1, np.sqrt(np.maximum(squares - n * mean ** 2, 0) / (n - 1)), np.nan)
+        stats["erosion"][:, metric_indx] = eroding / n
+
+      # the rates of a cell are sorted_values[start:start + n], quantile q is at q * (n - 1)
+      has_rates = n > 0
+      for (name, q) in zip(cls.quantileNames(quantiles), quantiles):
+        position = starts + q * np.maximum(n - 1, 0)
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, starts + np.maximum(n, 1).astype(int) - 1)
+        fraction = position - below
+        quantile = sorted_values[below] * (1 - fraction) + sorted_values[above] * fraction
+        stats[name][:, metric_indx] = np.where(has_rates, quantile, np.nan)
+
+    return cls.statsFrame(stats, metrics, index=cells)
+
+  @classmethod
+  def fixedCells(cls, chainage: np.ndarray, sites: np.ndarray, cell_length: float) -> Tuple[np.ndarray, pd.DataFrame]:
+    '''
+      (cell of every transect, cells table: cell, site, start and end chainage)
+      for cells of cell_length meters of chainage, numbered from the start of every site
+    '''
+    bins = np.floor(chainage / cell_length).astype(int)
+    site_starts, _ = cls.siteBounds(sites)
+
+    # the first transect of a site gives the site its number, sites stay in transect order
+    keys = np.stack([site_starts, bins], axis=1)
+    unique_keys, cell_ids = np.unique(keys, axis=0, return_inverse=True)
+    cell_ids = cell_ids.reshape(-1)
+
+    site_names = sites[unique_keys[:, 0]]
+    cells = pd.DataFrame({
+      "cell": [
+        "{site}_C{bin}".format(site=site, bin=bin) if site != "" else "C{bin}".format(bin=bin)
+        for (site, bin) in zip(site_names, unique_keys[:, 1])
+      ],
+      "site": site_names,
+      "start_chainage": unique_keys[:, 1] * float(cell_length),
+      "end_chainage": (unique_keys[:, 1] + 1) * float(cell_length)
+    })
+
+    return cell_ids, cells
+
+  @classmethod
+  def polygonCells(cls, points: np.ndarray, polygons: List[List[np.ndarray]]) -> np.ndarray:
+    '''
+      index of the first polygon holding every point, -1 for none
+    '''
+    cell_ids = np.full(len(points), -1)
+    for (polygon_indx, rings) in enumerate(polygons):
+      unassigned = np.flatnonzero(cell_ids < 0)
+      inside = GeometryArrays.pointsInPolygon(points[unassigned], rings)
+      cell_ids[unassigned[inside]] = polygon_indx
+
+    return cell_ids
+
+  @classmethod
+  def transectOrder(cls, rates: pd.DataFrame, transects_path: str = None, spacing: float = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+      (rows of rates in transect order, names, chainage, midpoints) of the
+      transects of a geojson written by TransectGenerator, or of the rows of
+      rates spacing meters apart without one (no midpoints)
+    '''
+    rate_names = rates[rates.columns[0]].astype(str).to_numpy()
+    if transects_path is None:
+      if spacing is None:
+        raise Exception("give the transects geojson or the transect spacing")
+      sites = cls.sites(rate_names)
+      site_starts, _ = cls.siteBounds(sites)
+      return np.arange(len(rates)), rate_names, (np.arange(len(rates)) - site_starts) * float(spacing), None
+
+    transects, names = GeometryArrays.readGeojsonTransects(transects_path)
+    names = np.array([str(name) for name in names], dtype=object)
+    rows = pd.Index(rate_names).get_indexer(names)
+    if np.any(rows < 0):
+      missing = names[rows < 0]
+      raise Exception("no rates for transects {t}".format(t=missing[:10].tolist()))
+
+    return rows, names, cls.chainage(transects[:, 0], cls.sites(names)), transects.mean(axis=1)
+
+  @classmethod
+  def aggregateTable(
+    cls,
+    rates_path: str,
+    output_dir: str,
+    transects_path: str = None,
+    spacing: float = None,
+    window_sizes: List[int] = (),
+    cell_length: float = None,
+    cells_path: str = None,
+    cells_property: str = "name",
+    metrics: List[str] = None,
+    quantiles: List[float] = (0.1, 0.25, 0.5, 0.75, 0.9)
+  ) -> Dict[str, int]:
+    '''
+      aggregates a normals_rates.csv and writes to output_dir
+        alongshore_windows.csv    one row per window size and transect
+        alongshore_cells.csv      one row per fixed cell of cell_length meters
+        alongshore_polygons.csv   one row per polygon of the cells_path geojson
+      metrics default to every rate column. returns the number of rows written
+    '''
+    rates = pd.read_csv(rates_path, index_col=0)
+    if metrics is None:
+      metrics = rates.columns[1:].tolist()
+
+    rows, names, chainage, midpoints = cls.transectOrder(rates, transects_path, spacing)
+    values = rates[metrics].to_numpy(dtype=float)[rows]
+    sites = cls.sites(names)
+    base = pd.DataFrame({"Normal": names, "site": sites, "chainage": chainage})
+    counts = {}
+
+    if len(window_sizes) > 0:
+      frames = cls.windows(values, window_sizes, sites, metrics, quantiles)
+      windows = pd.concat(
+        [pd.concat([base.assign(window=window_size), frame], axis=1) for (window_size, frame) in frames.items()],
+        ignore_index=True
+      )
+      windows.to_csv(os.path.join(output_dir, "alongshore_windows.csv"), index=False)
+      counts["window_rows"] = len(windows)
+
+    if cell_length is not None:
+      cell_ids, cells = cls.fixedCells(chainage, sites, cell_length)
+      stats = cls.cellStats(values, cell_ids, metrics, quantiles)
+      cells = pd.concat([cells.iloc[stats.index].reset_index(drop=True), stats.reset_index(drop=True)], axis=1)
+      cells.insert(2, "transects", np.bincount(cell_ids, minlength=len(cells)))
+      cells.to_csv(os.path.join(output_dir, "alongshore_cells.csv"), index=False)
+      counts["cells"] = len(cells)
+
+    if cells_path is not None:
+      if midpoints is None:
+        raise Exception("polygon cells need the transects geojson")
+      polygons, polygon_names = GeometryArrays.readGeojsonPolygons(cells_path, cells_property)
+      # polygons are reprojected to the crs of the transects
+      source, target = GeometryArrays.readGeojsonCrs(cells_path), GeometryArrays.readGeojsonCrs(transects_path)
+      polygons = Reprojection.transformLines(polygons, source, target)
+
+      cell_ids = cls.polygonCells(midpoints, polygons)
+      stats = cls.cellStats(values, cell_ids, metrics, quantiles)
+      cells = pd.DataFrame({
+        "cell": [polygon_names[cell] for cell in stats.index],
+        "transects": np.bincount(cell_ids[cell_ids >= 0], minlength=len(polygons))[stats.index]
+      })
+      cells = pd.concat([cells, stats.reset_index(drop=True)], axis=1)
+      cells.to_csv(os.path.join(output_dir, "alongshore_polygons.csv"), index=False)
+      counts["polygon_cells"] = len(cells)
+      counts["transects_outside_polygons"] = int(np.count_nonzero(cell_ids < 0))
+
+    return counts
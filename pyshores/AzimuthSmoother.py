@@ -0,0 +1,129 @@
+import numpy as np
+
+'''
+  smoothing of transect orientations along the baseline.
+
+  azimuths are in degrees clockwise from north, as QgsPointXY.azimuth returns them.
+  they are averaged as unit vectors, so transects pointing on both sides of north
+  (e.g. 358 and 2 degrees) average to north and not to south. the smoothed
+  azimuth is the direction of the (weighted) sum of the unit vectors in the window.
+
+  kernels:
+    boxcar    every transect in the window has the same weight.
+              computed with prefix sums, O(n) whatever the window size
+    gaussian  weights exp(-k^2 / (2 sigma^2)) for offsets k in the window.
+              computed with a convolution, O(n * window)
+
+  edges, for the transects closer than half a window to either end:
+    shrink    the window only holds the transects that exist
+    reflect   the window is filled with the transects mirrored about the end
+    wrap      the window is filled from the other end, for closed baselines
+    none      the azimuths are kept as they are
+
+  every window is computed from the original azimuths, never from
+  already smoothed ones.
+'''
+
+class AzimuthSmoother:
+  kernels = ("boxcar", "gaussian")
+  edges = ("shrink", "reflect", "wrap", "none")
+
+  @classmethod
+  def unitVectors(cls, azimuths) -> np.ndarray:
+    '''
+      (n, 2) east and north components of every azimuth
+    '''
+    radians = np.radians(np.asarray(azimuths, dtype=float))
+    return np.stack([np.sin(radians), np.cos(radians)], axis=1)
+
+  @classmethod
+  def windowOffsets(cls, window_size: int):
+    '''
+      offsets before and after the center, the extra one of an even window is before
+    '''
+    before = window_size // 2
+    after = window_size - 1 - before
+    return before, after
+
+  @classmethod
+  def gaussianWeights(cls, window_size: int, sigma: float = None) -> np.ndarray:
+    '''
+      weights of the offsets -before ... after. sigma defaults to a sixth of the
+      window, so the window spans about three sigma on either side
+    '''
+    before, after = cls.windowOffsets(window_size)
+    if sigma is None:
+      sigma = window_size / 6
+
+    offsets = np.arange(-before, after + 1, dtype=float)
+    return np.exp(-0.5 * (offsets / sigma) ** 2)
+
+  @classmethod
+  def pad(cls, vectors: np.ndarray, before: int, after: int, edges: str) -> np.ndarray:
+    if edges == "reflect" and len(vectors) > 1:
+      return np.pad(vectors, ((before, after), (0, 0)), mode="reflect")
+    if edges == "wrap":
+      return np.pad(vectors, ((before, after), (0, 0)), mode="wrap")
+
+    # shrink (and a single transect): zero vectors add nothing to the sum
+    return np.pad(vectors, ((before, after), (0, 0)), mode="constant")
+
+  @classmethod
+  def boxcarSums(cls, padded: np.ndarray, window_size: int) -> np.ndarray:
+    '''
+      sum of every window of the padded vectors from one prefix sum
+    '''
+    prefix = np.zeros((len(padded) + 1, 2))
+    np.cumsum(padded, axis=0, out=prefix[1:])
+    return prefix[window_size:] - prefix[:-window_size]
+
+  @classmethod
+  def weightedSums(cls, padded: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    kernel = weights[::-1]
+    return np.stack([
+      np.convolve(padded[:, 0], kernel, mode="valid"),
+      np.convolve(padded[:, 1], kernel, mode="valid")
+    ], axis=1)
+
+  @classmethod
+  def smooth(
+    cls,
+    azimuths,
+    window_size: int,
+    kernel: str = "boxcar",
+    edges: str = "shrink",
+    sigma: float = None
+  ) -> np.ndarray:
+    '''
+      smoothed azimuth of every transect, in degrees in (-180, 180].
+      window_size is the number of transects in a window, 1 or less keeps the azimuths
+    '''
+    if kernel not in cls.kernels:
+      raise Exception("unknown smoothing kernel {k}".format(k=kernel))
+    if edges not in cls.edges:
+      raise Exception("unknown edge handling {e}".format(e=edges))
+
+    azimuths = np.asarray(azimuths, dtype=float)
+    if window_size <= 1 or len(azimuths) == 0:
+      return azimuths.copy()
+
+    vectors = cls.unitVectors(azimuths)
+    before, after = cls.windowOffsets(window_size)
+    padded = cls.pad(vectors, before, after, edges)
+
+    if kernel == "boxcar":
+      sums = cls.boxcarSums(padded, window_size)
+    else:
+      sums = cls.weightedSums(padded, cls.gaussianWeights(window_size, sigma))
+
+    smoothed = np.degrees(np.arctan2(sums[:, 0], sums[:, 1]))
+
+    # opposite azimuths in a window cancel out and have no mean direction
+    cancelled = np.hypot(sums[:, 0], sums[:, 1]) < 1e-12
+    smoothed[cancelled] = azimuths[cancelled]
+
+    if edges == "none":
+      smoothed[:before] = azimuths[:before]
+      smoothed[len(azimuths) - after:] = azimuths[len(azimuths) - after:]
+
+    return smoothed
@@ -1,32 +1,105 @@
+import os
 import pandas as pd
 import math
+import numpy as np
 
 from qgis.core import *
+from qgis.PyQt.QtCore import QVariant
+
+try:
+  from .FeatureSink import FeatureSink
+  from .GeometryArrays import GeometryArrays
+  from .IncrementalState import IncrementalState
+  from .IntersectMatrix import IntersectMatrix
+  from .Reprojection import Reprojection, Wgs84Copy
+  from .RunReport import RunReport
+  from .Session import LineDataset, Session
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from FeatureSink import FeatureSink
+  from GeometryArrays import GeometryArrays
+  from IncrementalState import IncrementalState
+  from IntersectMatrix import IntersectMatrix
+  from Reprojection import Reprojection, Wgs84Copy
+  from RunReport import RunReport
+  from Session import LineDataset, Session
 
 #####---------------------------DEFINE VARIABLES HERE-----------------------------------####
 transects_time_series: str = 'ts_despiked_processed.csv'
 normals: str = 'normals.shp'
+incremental = False # only convert new or changed dates since the last run
+output_format = 'shp' # shp, gpkg, fgb or parquet, see FeatureSink
+streaming = False # read the time series chunk_rows dates at a time
+wgs84 = False # also write a WGS84 geojson copy of the points
 #####---------------------------END-------------------------------------------------####
 
 class CoastSatParser:
-  def __init__(self, transect_time_series_file_name, normals_filename) -> None:
-    self.crs: QgsCoordinateReferenceSystem = QgsProject.instance().crs()
+  # number of intersection points handed to the writer at once
+  batch_size = 10000
+
+  # number of time series dates read at once by runStreaming
+  chunk_rows = 500
+
+  def __init__(self, transect_time_series_file_name, normals_filename, crs: QgsCoordinateReferenceSystem = None, project_path: str = None, report: RunReport = None, output_format: str = "shp", wgs84: bool = False, session: Session = None) -> None:
+    # project path defaults to the one of the open QGIS project
+    if project_path is None:
+      project_path = QgsProject.instance().homePath()
+
+    # crs of the points, defaults to the one of the normals layer (then to the
+    # ... one of the open QGIS project). normals in another crs are reprojected to it
+    if isinstance(crs, str):
+      crs = QgsCoordinateReferenceSystem(crs)
+    if crs is None:
+      crs = QgsVectorLayer(os.path.join(project_path, "transects", normals_filename), "transects_layer", "ogr").crs()
+    if not crs.isValid():
+      crs = QgsProject.instance().crs()
+
+    self.crs: QgsCoordinateReferenceSystem = crs
+    # crs of the normals layer, set by load_normals
+    self.normals_crs: QgsCoordinateReferenceSystem = crs
+
+    # file names are relative to the intersects and transects folders
+    # ... absolute paths are used as they are
+    self.project_path = project_path
+    self.transect_time_series_file_path  = os.path.join(self.project_path, "intersects", transect_time_series_file_name)
+    self.normals_file_path = os.path.join(self.project_path, "transects", normals_filename)
+    self.output_format = output_format
+    self.output_file_path = FeatureSink.filePath(os.path.join(self.project_path, "intersects", "intersects"), output_format)
+    # WGS84 copy of the points of a full run, see Wgs84Copy
+    self.wgs84_file_path = os.path.join(self.project_path, "intersects", "intersects_wgs84.geojson") if wgs84 else None
+    self.points_wgs84 = Wgs84Copy(None, "Point", crs)
+
+    # fingerprints of the normals and time series rows of the last run
+    self.state_file_path = os.path.join(self.project_path, "intersects", "intersects_state.json")
 
-    self.project_path = QgsProject.instance().homePath()
-    self.transect_time_series_file_path  = self.project_path + "/intersects/" + transect_time_series_file_name
-    self.normals_file_path = normals_filename = self.project_path + "/transects/" + normals_filename
+    # timings and counters of the run, see RunReport
+    self.report = report if report is not None else RunReport("parse")
+    self.report_file_path = os.path.join(self.project_path, "intersects", "parse_report.json")
 
+    # datasets shared with the other stages of the process, see Session
+    self.session: Session = session
+
+  # the normals as a list of features, or as the LineDataset of the session
+  # ... (already in the crs of the points)
   def load_normals(self):
+    if self.session is not None:
+      self.normals_crs = self.crs
+      return self.session.lines(self.normals_file_path, crs=self.crs)
+
     normals = QgsVectorLayer(
       self.normals_file_path,
       "transects_layer",
       "ogr"
     )
+    self.normals_crs = normals.crs()
 
-    return normals 
+    return list(normals.getFeatures())
 
+  # the time series is a csv or an IntersectMatrix (.npy) of the same layout
   def load_transect_time_series(self):
-    transect_ts = pd.read_csv(self.transect_time_series_file_path)
+    if self.session is not None:
+      return self.session.table(self.transect_time_series_file_path).toDataFrame()
+
+    transect_ts = IntersectMatrix.readTable(self.transect_time_series_file_path)
 
     return transect_ts
 
@@ -39,50 +112,251 @@ class CoastSatParser:
     # for identifying dates
     coastCR_fields.append(QgsField("Date", QVariant.String))
 
-    writer = QgsVectorFileWriter(
-      self.project_path + "/intersects/" + "intersects.shp",
-      "UTF-8",
+    writer = FeatureSink(
+      self.output_file_path,
       coastCR_fields,
       QgsWkbTypes.Point,
-      srs = self.crs,
-      driverName="ESRI Shapefile"
+      self.crs,
+      output_format=self.output_format,
+      batch_size=self.batch_size
     )
 
     return writer
 
-  def run(self):
-    writer = self.initialize_writer()
-    normals = self.load_normals().getFeatures()
-    transect_ts = self.load_transect_time_series()
+  # converts normal features to a (N, 2, 2) array of origins and end points
+  # ... every normal is a straight two point line
+  # ... reprojected to the crs of the points in one batched transform
+  def normalArray(self, normals) -> np.ndarray:
+    if isinstance(normals, LineDataset):
+      return normals.endpoints()
 
-    shoreline_dates = transect_ts['dates']
+    normal_array = np.empty((len(normals), 2, 2))
+    for (indx, normal) in enumerate(normals):
+      normal_geom = normal.geometry()
+      if QgsWkbTypes.isMultiType(normal_geom.wkbType()):
+        vertices = normal_geom.asMultiPolyline()[0]
+      else:
+        vertices = normal_geom.asPolyline()
+
+      normal_array[indx] = [
+        [vertices[0].x(), vertices[0].y()],
+        [vertices[-1].x(), vertices[-1].y()]
+      ]
+
+    return Reprojection.transform(normal_array, self.normals_crs, self.crs)
+
+  # the time series as a dates x normals matrix, one column per normal
+  # ... in the order of the normals. the column of a normal is given by its id
+  def normalMatrix(self, normals, transect_ts: pd.DataFrame) -> np.ndarray:
     transect_names = transect_ts.columns[1:]
+    normal_ids = np.array([normal.id() for normal in normals], dtype=int)
 
-    for normal in normals:
-      normal_geom = normal.geometry()
+    return transect_ts[transect_names[normal_ids]].to_numpy(dtype=float)
+
+  # converts the given rows of the time series matrix into intersection points
+  # ... in one pass and writes them in batches of batch_size features.
+  #
+  # points are written in the same order as interpolating one normal
+  # ... and one date at a time: by normal, then by date
+  #
+  # first_row is the time series row of intersects[0], when intersects is a chunk
+  # ... of the time series, so ID_Coast stays the row in the whole time series
+  def writePoints(self, writer, normals, intersects: np.ndarray, shoreline_dates: np.ndarray, rows: np.ndarray = None, first_row: int = 0, normal_array: np.ndarray = None):
+    if rows is None:
+      rows = np.arange(len(intersects))
+    if normal_array is None:
+      normal_array = self.normalArray(normals)
 
-      intersects = transect_ts[ transect_names[normal.id()] ]
+    normal_ids = np.array([normal.id() for normal in normals], dtype=int)
+    normal_indices, row_indices, distances, points = GeometryArrays.pointRecords(
+      normal_array,
+      intersects[rows]
+    )
+    row_indices = rows[row_indices]
+    id_coasts = first_row + row_indices
 
-      for (id_coast, intersect) in enumerate(intersects):
+    for start in range(0, len(distances), self.batch_size):
+      features = []
+      for record in range(start, min(start + self.batch_size, len(distances))):
         feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*points[record])))
+        feature.setAttributes(
+          [
+            int(normal_ids[normal_indices[record]]),
+            int(id_coasts[record]),
+            float(distances[record]),
+            shoreline_dates[row_indices[record]]
+          ]
+        )
+        features.append(feature)
+
+      writer.addFeatures(features)
+      self.report.count("points_written", len(features))
+
+    # collects the points of a full run for their WGS84 copy, the properties are
+    # ... only built when there is a copy to write. incremental runs leave the copy as it is
+    if self.points_wgs84.file_path is not None:
+      self.points_wgs84.extend(points, [
+        {
+          "ID_Profile": int(normal_ids[normal_indices[record]]),
+          "ID_Coast": int(id_coasts[record]),
+          "Distance": float(distances[record]),
+          "Date": str(shoreline_dates[row_indices[record]])
+        }
+        for record in range(len(distances))
+      ])
+
+    self.report.count("nan_cells", len(rows) * intersects.shape[1] - len(distances))
+
+  def normalsFingerprint(self, normals, transect_ts: pd.DataFrame) -> str:
+    parts = list(transect_ts.columns)
+    for normal in normals:
+      parts.append(normal.id())
+      if isinstance(normals, LineDataset):
+        parts.append(normals.geometryBytes(normal.indx))
+      else:
+        parts.append(bytes(normal.geometry().asWkb()))
 
-        if math.isnan(intersect) == False:
-          point = normal_geom.interpolate(intersect)
-          feature.setGeometry(point)
+    return IncrementalState.fingerprint(*parts)
 
-          feature.setAttributes(
-            [
-              normal.id(),
-              id_coast,
-              intersect,
-              shoreline_dates[id_coast]
-            ]
-          )
+  # fingerprint of every row of the time series, keyed by its row (the ID_Coast
+  # ... of its points), as dates are not unique. the date is part of the fingerprint
+  # ... because it is written with every point
+  def rowFingerprints(self, intersects: np.ndarray, shoreline_dates: np.ndarray, first_row: int = 0) -> dict:
+    return {
+      str(first_row + row): IncrementalState.fingerprint(shoreline_date, intersects[row].tobytes())
+      for (row, shoreline_date) in enumerate(shoreline_dates)
+    }
 
-          writer.addFeature(feature)
+  def initWgs84Copy(self):
+    self.points_wgs84 = Wgs84Copy(self.wgs84_file_path, "Point", self.crs)
 
-    del writer
+  def saveReport(self):
+    self.report.save(self.report_file_path)
+    print(self.report.summary())
+
+  def run(self):
+    writer = self.initialize_writer()
+    self.initWgs84Copy()
+    with self.report.stage("load"):
+      normals = self.load_normals()
+      transect_ts = self.load_transect_time_series()
+
+      shoreline_dates = transect_ts['dates'].astype(str).to_numpy()
+      intersects = self.normalMatrix(normals, transect_ts)
+
+    with self.report.stage("points"):
+      self.writePoints(writer, normals, intersects, shoreline_dates)
+      writer.close()
+      self.points_wgs84.close()
+
+    with self.report.stage("state"):
+      fingerprints = self.rowFingerprints(intersects, shoreline_dates)
+      IncrementalState(self.state_file_path).save(
+        self.normalsFingerprint(normals, transect_ts),
+        fingerprints,
+        rows=list(fingerprints)
+      )
+    print('done')
+    self.saveReport()
+
+  # same output as run, reading the time series chunk_rows dates at a time
+  # ... (csv chunks, or row slices of a memory mapped IntersectMatrix).
+  # ... every chunk is converted and written before the next one is read, so
+  # ... memory does not grow with the number of dates
+  def runStreaming(self):
+    writer = self.initialize_writer()
+    self.initWgs84Copy()
+    with self.report.stage("load"):
+      normals = self.load_normals()
+      normal_array = self.normalArray(normals)
+
+    normals_fingerprint = None
+    fingerprints = {}
+    first_row = 0
+    with self.report.stage("points"):
+      for transect_ts in IntersectMatrix.readTableChunks(self.transect_time_series_file_path, self.chunk_rows):
+        if normals_fingerprint is None:
+          normals_fingerprint = self.normalsFingerprint(normals, transect_ts)
+
+        shoreline_dates = transect_ts['dates'].astype(str).to_numpy()
+        intersects = self.normalMatrix(normals, transect_ts)
+        self.writePoints(writer, normals, intersects, shoreline_dates, first_row=first_row, normal_array=normal_array)
+
+        fingerprints.update(self.rowFingerprints(intersects, shoreline_dates, first_row))
+        first_row += len(transect_ts)
+        self.report.count("chunks")
+
+      writer.close()
+      self.points_wgs84.close()
+
+    IncrementalState(self.state_file_path).save(normals_fingerprint, fingerprints, rows=list(fingerprints))
     print('done')
+    self.saveReport()
+
+  # converts only the time series rows that are new or changed since the last run
+  # ... points of changed or removed rows are deleted from intersects.shp (by
+  # ... their ID_Coast) and the points of new or changed rows are appended. when
+  # ... the normals changed, or there is no previous run keyed by rows, this is a full run
+  def runIncremental(self):
+    with self.report.stage("load"):
+      normals = self.load_normals()
+      transect_ts = self.load_transect_time_series()
+
+    state = IncrementalState(self.state_file_path)
+    normals_fingerprint = self.normalsFingerprint(normals, transect_ts)
+    if self.output_format not in FeatureSink.updatable_formats:
+      print('{f} outputs cannot be updated in place, converting all dates'.format(f=self.output_format))
+      self.run()
+      return
+    if not state.load() or not os.path.isfile(self.output_file_path) or state.rows is None or state.inputs != normals_fingerprint:
+      print('no matching previous run, converting all dates')
+      self.run()
+      return
+
+    shoreline_dates = transect_ts['dates'].astype(str).to_numpy()
+    intersects = self.normalMatrix(normals, transect_ts)
+    fingerprints = self.rowFingerprints(intersects, shoreline_dates)
+
+    changed, removed = state.diff(fingerprints)
+    self.report.count("rows_changed", len(changed))
+    self.report.count("rows_removed", len(removed))
+    if changed == [] and removed == []:
+      print('intersects are up to date')
+      self.saveReport()
+      return
+
+    stale = set(changed + removed)
+    layer = QgsVectorLayer(self.output_file_path, "intersects", "ogr")
+    provider = layer.dataProvider()
+    provider.deleteFeatures([
+      feature.id() for feature in layer.getFeatures()
+      if str(feature['ID_Coast']) in stale
+    ])
+
+    rows = np.array(sorted(int(key) for key in changed), dtype=int)
+    with self.report.stage("points"):
+      self.writePoints(provider, normals, intersects, shoreline_dates, rows)
+
+    del layer
+    state.save(normals_fingerprint, fingerprints, rows=list(fingerprints))
+    print('{changed} new or changed and {removed} removed rows updated'.format(
+      changed=len(changed),
+      removed=len(removed)
+    ))
+    self.saveReport()
+
+def main():
+  csP = CoastSatParser(transects_time_series, normals, output_format=output_format, wgs84=wgs84)
+
+  if incremental:
+    csP.runIncremental()
+  elif streaming:
+    csP.runStreaming()
+  else:
+    csP.run()
+
+# run only when executed as a script (e.g. from the QGIS python console)
+if __name__ == '__main__':
+  main()
 
-csP = CoastSatParser(transects_time_series, normals)
-csP.run()
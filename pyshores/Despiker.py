@@ -0,0 +1,192 @@
+import os
+import warnings
+
+from typing import Tuple
+
+import numpy as np
+
+try:
+  from .IntersectMatrix import IntersectMatrix
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from IntersectMatrix import IntersectMatrix
+
+'''
+  outlier rejection on the whole dates x transects matrix of a CoastSat like
+  time series, in place of the despiking done by hand in the CoastSat notebook.
+
+  two rules, both applied to the intersections of every transect in date order
+  (dates where a transect has no intersection are skipped, as CoastSat does):
+
+    median / MAD (hampel filter)
+      a position is rejected when it is farther than threshold * 1.4826 * MAD
+      from the median of the window positions around it. MAD is the median
+      absolute deviation of the window from that median, 1.4826 * MAD is the
+      standard deviation of normally distributed positions.
+
+    max jump
+      a position is rejected when it moves more than max_jump meters away from
+      the previous position and more than max_jump meters back at the next one
+      (a single date spike). rejected spikes are removed and the rule applied
+      again, at most max_iterations times, so neighbouring spikes are found too.
+
+  rejected positions become nan. every cell gets flags, a sum of:
+    MISSING   no intersection in the input
+    MAD       rejected by the median / MAD rule
+    JUMP      rejected by the max jump rule
+
+  rows must be sorted by date, as in the tables written by CoastSat and
+  IntersectFinder. transects are processed in tiles, so the (dates, tile,
+  window) arrays of the rolling windows stay under budget_cells.
+'''
+
+class Despiker:
+  MISSING = 1
+  MAD = 2
+  JUMP = 4
+
+  # scale of the MAD of normally distributed values to their standard deviation
+  mad_scale = 1.4826
+
+  # cells of the (dates, tile, window) arrays of the rolling windows
+  budget_cells = 2 ** 24
+
+  @classmethod
+  def packObserved(cls, distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+      moves the intersections of every transect to the top of its column,
+      keeping their date order, so rolling windows run over intersections only.
+      returns (packed, order, n_observed), distances[order[i, j], j] = packed[i, j]
+    '''
+    missing = np.isnan(distances)
+    order = np.argsort(missing, axis=0, kind="stable")
+    packed = np.take_along_axis(distances, order, axis=0)
+
+    return packed, order, (~missing).sum(axis=0)
+
+  @classmethod
+  def rollingWindows(cls, packed: np.ndarray, window: int) -> np.ndarray:
+    '''
+      (dates, transects, window) view of the window centered on every row,
+      nan beyond the first and last row
+    '''
+    half = window // 2
+    padded = np.pad(packed, ((half, half), (0, 0)), constant_values=np.nan)
+    return np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+
+  @classmethod
+  def madOutliers(cls, distances: np.ndarray, window: int, threshold: float) -> np.ndarray:
+    '''
+      (dates, transects) True where the median / MAD rule rejects a position
+    '''
+    packed, order, _ = cls.packObserved(distances)
+    windows = cls.rollingWindows(packed, window)
+
+    # all nan windows (below the last intersection) warn and give nan, which is never rejected
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+      warnings.simplefilter("ignore", RuntimeWarning)
+      median = np.nanmedian(windows, axis=2)
+      mad = np.nanmedian(np.abs(windows - median[:, :, None]), axis=2)
+
+      rejected_packed = np.abs(packed - median) > threshold * cls.mad_scale * mad
+
+    rejected = np.zeros(distances.shape, dtype=bool)
+    np.put_along_axis(rejected, order, rejected_packed, axis=0)
+    return rejected
+
+  @classmethod
+  def jumpOutliers(cls, distances: np.ndarray, max_jump: float, max_iterations: int = 5) -> np.ndarray:
+    '''
+      (dates, transects) True where the max jump rule rejects a position
+    '''
+    rejected = np.zeros(distances.shape, dtype=bool)
+    for _ in range(max_iterations):
+      packed, order, _ = cls.packObserved(np.where(rejected, np.nan, distances))
+
+      to_previous = np.diff(packed, axis=0)
+      before = to_previous[:-1]
+      after = to_previous[1:]
+      with np.errstate(invalid="ignore"):
+        spikes = (np.abs(before) > max_jump) & (np.abs(after) > max_jump) & (np.sign(before) != np.sign(after))
+
+      if not spikes.any():
+        break
+
+      # spikes[i] is about packed row i + 1, the first and last rows have only one neighbour
+      spikes_packed = np.zeros(packed.shape, dtype=bool)
+      spikes_packed[1:-1] = spikes
+      new_rejected = np.zeros(distances.shape, dtype=bool)
+      np.put_along_axis(new_rejected, order, spikes_packed, axis=0)
+      rejected |= new_rejected
+
+    return rejected
+
+  @classmethod
+  def despike(
+    cls,
+    distances: np.ndarray,
+    window: int = 5,
+    threshold: float = 3,
+    max_jump: float = None,
+    max_iterations: int = 5
+  ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+      (cleaned distances, flags) of a (dates, transects) matrix.
+      window: intersections in the median / MAD window, odd, 0 skips the rule
+      threshold: rejection distance in robust standard deviations
+      max_jump: meters, None skips the rule
+    '''
+    distances = np.asarray(distances, dtype=float)
+    if window and window % 2 == 0:
+      raise Exception("despike window must be odd, got {w}".format(w=window))
+
+    flags = np.where(np.isnan(distances), cls.MISSING, 0).astype(np.uint8)
+    tile_size = max(1, cls.budget_cells // (max(len(distances), 1) * max(window, 1)))
+
+    for start in range(0, distances.shape[1], tile_size):
+      tile = slice(start, start + tile_size)
+      rejected = np.zeros(distances[:, tile].shape, dtype=bool)
+      if window:
+        mad_rejected = cls.madOutliers(distances[:, tile], window, threshold)
+        flags[:, tile] |= np.where(mad_rejected, cls.MAD, 0).astype(np.uint8)
+        rejected |= mad_rejected
+      if max_jump is not None:
+        # the jump rule runs on what the median / MAD rule kept
+        jump_rejected = cls.jumpOutliers(np.where(rejected, np.nan, distances[:, tile]), max_jump, max_iterations)
+        flags[:, tile] |= np.where(jump_rejected, cls.JUMP, 0).astype(np.uint8)
+
+    cleaned = np.where(flags & (cls.MAD | cls.JUMP), np.nan, distances)
+    return cleaned, flags
+
+  @classmethod
+  def flagsPath(cls, output_path: str) -> str:
+    base, extension = os.path.splitext(output_path)
+    return base + "_flags" + extension
+
+  @classmethod
+  def despikeTable(cls, input_path: str, output_path: str, **options) -> dict:
+    '''
+      despikes a CoastSat like table (.csv or IntersectMatrix .npy) and writes the
+      cleaned table to output_path and the flags, same layout, next to it as
+      <output>_flags. the output format follows the extension of output_path.
+      options are the keyword arguments of despike. returns the number of
+      rejected cells of every rule
+    '''
+    if IntersectMatrix.isMatrixPath(input_path):
+      matrix = IntersectMatrix.load(input_path, mmap=False)
+    else:
+      matrix = IntersectMatrix.fromCSV(input_path)
+    cleaned, flags = cls.despike(matrix.distances, **options)
+
+    for (path, values) in [(output_path, cleaned), (cls.flagsPath(output_path), flags)]:
+      output = IntersectMatrix(matrix.dates, matrix.transects, values.astype(float), matrix.crs)
+      if IntersectMatrix.isMatrixPath(path):
+        output.save(path)
+      else:
+        output.toCSV(path)
+
+    return {
+      "cells": int(flags.size),
+      "missing": int(np.count_nonzero(flags & cls.MISSING)),
+      "mad_rejected": int(np.count_nonzero(flags & cls.MAD)),
+      "jump_rejected": int(np.count_nonzero(flags & cls.JUMP)),
+    }
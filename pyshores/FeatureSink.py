@@ -0,0 +1,206 @@
+import json
+import os
+
+from typing import List
+
+from qgis.core import *
+from qgis.PyQt.QtCore import QVariant
+
+'''
+  buffered vector output shared by every stage.
+
+  a FeatureSink has the addFeature / addFeatures methods of QgsVectorFileWriter,
+  so it is used in its place. features are buffered and handed to the backend
+  batch_size at a time, and the output is finished when the sink is closed or
+  deleted (same as deleting a QgsVectorFileWriter).
+
+  output formats:
+    shp      ESRI Shapefile. 2 GB, 10 character field names, at most 255 fields
+    gpkg     GeoPackage. written inside a single transaction, committed on close
+    fgb      FlatGeobuf. streaming friendly, spatial index built on close
+    parquet  GeoParquet (WKB geometry column "geometry"), needs pyarrow
+
+  shp, gpkg and fgb are written by QgsVectorFileWriter, parquet by pyarrow.
+  gpkg and shp outputs can be updated in place (incremental runs), fgb and
+  parquet are rewritten by every run.
+'''
+
+class FeatureSink:
+  formats = {
+    "shp": ("ESRI Shapefile", ".shp"),
+    "gpkg": ("GPKG", ".gpkg"),
+    "fgb": ("FlatGeobuf", ".fgb"),
+    "parquet": (None, ".parquet"),
+  }
+
+  # formats whose outputs can be opened and edited by a later incremental run
+  updatable_formats = ("shp", "gpkg")
+
+  # features handed to the backend at once
+  batch_size = 10000
+
+  @classmethod
+  def filePath(cls, file_path: str, output_format: str) -> str:
+    '''
+      file_path with the extension of output_format, in place of any extension it has
+    '''
+    if output_format not in cls.formats:
+      raise Exception("unknown output format {f}".format(f=output_format))
+
+    base, extension = os.path.splitext(file_path)
+    if extension.lower() not in [format_extension for (_, format_extension) in cls.formats.values()]:
+      base = file_path
+
+    return base + cls.formats[output_format][1]
+
+  def __init__(
+    self,
+    file_path: str,
+    fields: QgsFields,
+    geometry_type,  # QgsWkbTypes
+    crs: QgsCoordinateReferenceSystem,
+    output_format: str = "shp",
+    batch_size: int = None
+  ) -> None:
+    self.output_format = output_format
+    self.file_path = self.filePath(file_path, output_format)
+    self.batch_size = batch_size or FeatureSink.batch_size
+    self.buffer: List[QgsFeature] = []
+    self.features_written = 0
+
+    if output_format == "parquet":
+      self.writer = GeoParquetWriter(self.file_path, fields, geometry_type, crs)
+      return
+
+    driver_name, _ = self.formats[output_format]
+    # GPKG and FlatGeobuf layers are replaced, never appended to
+    if os.path.isfile(self.file_path) and output_format != "shp":
+      os.remove(self.file_path)
+
+    self.writer = QgsVectorFileWriter(
+      self.file_path,
+      "UTF-8",
+      fields,
+      geometry_type,
+      srs=crs,
+      driverName=driver_name
+    )
+    if self.writer.hasError() != QgsVectorFileWriter.NoError:
+      raise Exception("could not create {fp}: {error}".format(fp=self.file_path, error=self.writer.errorMessage()))
+
+    # QgsVectorFileWriter keeps an OGR transaction open for drivers that
+    # ... support them (GeoPackage) and commits it when it is deleted
+
+  # features are buffered as they are, a feature must not be changed after it is added
+  def addFeature(self, feature: QgsFeature, *args) -> bool:
+    self.buffer.append(feature)
+    if len(self.buffer) >= self.batch_size:
+      self.flush()
+    return True
+
+  def addFeatures(self, features: List[QgsFeature], *args) -> bool:
+    for feature in features:
+      self.addFeature(feature)
+    return True
+
+  def flush(self):
+    if self.buffer == [] or self.writer is None:
+      return
+
+    if not self.writer.addFeatures(self.buffer):
+      raise Exception("could not write to {fp}".format(fp=self.file_path))
+
+    self.features_written += len(self.buffer)
+    self.buffer = []
+
+  def close(self):
+    if self.writer is None:
+      return
+
+    self.flush()
+    if isinstance(self.writer, GeoParquetWriter):
+      self.writer.close()
+    # deleting the QgsVectorFileWriter finishes the file
+    self.writer = None
+
+  def __del__(self):
+    if getattr(self, "writer", None) is not None:
+      self.close()
+
+class GeoParquetWriter:
+  '''
+    GeoParquet 1.0 output of QgsFeatures through pyarrow, one row group per batch.
+    attributes keep the types of their fields, the geometry is WKB
+  '''
+  def __init__(self, file_path: str, fields: QgsFields, geometry_type, crs: QgsCoordinateReferenceSystem) -> None:
+    try:
+      import pyarrow
+      import pyarrow.parquet
+    except ImportError:
+      raise Exception("the parquet output format needs pyarrow, install it or pick shp, gpkg or fgb")
+
+    self.pa = pyarrow
+    self.file_path = file_path
+    self.field_names = fields.names()
+    self.has_geometry = geometry_type not in (QgsWkbTypes.Unknown, QgsWkbTypes.NoGeometry)
+
+    columns = [pyarrow.field(field.name(), self.arrowType(field)) for field in fields]
+    metadata = None
+    if self.has_geometry:
+      columns.append(pyarrow.field("geometry", pyarrow.binary()))
+      metadata = {b"geo": self.geoMetadata(geometry_type, crs)}
+
+    self.schema = pyarrow.schema(columns, metadata=metadata)
+    self.writer = pyarrow.parquet.ParquetWriter(file_path, self.schema)
+
+  def arrowType(self, field: QgsField):
+    if field.type() in (QVariant.Int, QVariant.LongLong):
+      return self.pa.int64()
+    if field.type() == QVariant.Double:
+      return self.pa.float64()
+    return self.pa.string()
+
+  @classmethod
+  def projjson(cls, crs: QgsCoordinateReferenceSystem):
+    if hasattr(crs, "toJson"):
+      return json.loads(crs.toJson())
+
+    try:
+      import pyproj
+    except ImportError:
+      raise Exception("writing the crs of a GeoParquet file needs QGIS 3.34 or pyproj")
+    return pyproj.CRS.from_wkt(crs.toWkt(QgsCoordinateReferenceSystem.WKT2_2019)).to_json_dict()
+
+  @classmethod
+  def geoMetadata(cls, geometry_type, crs: QgsCoordinateReferenceSystem) -> bytes:
+    return json.dumps({
+      "version": "1.0.0",
+      "primary_column": "geometry",
+      "columns": {
+        "geometry": {
+          "encoding": "WKB",
+          "geometry_types": [QgsWkbTypes.displayString(QgsWkbTypes.flatType(geometry_type))],
+          "crs": cls.projjson(crs)
+        }
+      }
+    }).encode("utf-8")
+
+  def addFeatures(self, features: List[QgsFeature]) -> bool:
+    columns = {name: [] for name in self.field_names}
+    geometries = []
+    for feature in features:
+      for (name, value) in zip(self.field_names, feature.attributes()):
+        columns[name].append(None if value == NULL else value)
+      if self.has_geometry:
+        geometry = feature.geometry()
+        geometries.append(None if geometry.isNull() else bytes(geometry.asWkb()))
+
+    arrays = [self.pa.array(columns[name], type=self.schema.field(name).type) for name in self.field_names]
+    if self.has_geometry:
+      arrays.append(self.pa.array(geometries, type=self.pa.binary()))
+
+    self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+    return True
+
+  def close(self):
+    self.writer.close()
@@ -0,0 +1,543 @@
+import json
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# array representations used here
+# ... transects: (N, 2, 2) array, transects[i] = [[origin_x, origin_y], [end_x, end_y]]
+# ... polyline: (M, 2) array of vertices
+# ... segments: (S, 2, 2) array, segments[j] = [[start_x, start_y], [end_x, end_y]]
+#
+# everything in this module is plain NumPy so it can be used where QGIS
+# ... is not installed (e.g. headless batch servers)
+
+class SegmentGrid:
+  '''
+    uniform grid index of segments. every segment is listed in every cell
+    its bounding box covers, so the segments near a box are found by
+    reading the cells of the box only. cells are about the size of a
+    typical segment box, and at most max_cells_per_segment times as many
+    as the segments
+  '''
+  max_cells_per_segment = 4
+
+  def __init__(self, segments: np.ndarray) -> None:
+    self.seg_min = segments.min(axis=1)
+    self.seg_max = segments.max(axis=1)
+    self.origin = self.seg_min.min(axis=0)
+    extent = np.maximum(self.seg_max.max(axis=0) - self.origin, 1e-9)
+
+    # cells as large as the typical segment box, and not more than max_cells_per_segment * segments
+    box_size = np.median((self.seg_max - self.seg_min).max(axis=1))
+    min_cell = np.sqrt(extent[0] * extent[1] / (self.max_cells_per_segment * len(segments)))
+    self.cell = max(box_size, min_cell, extent.max() * 1e-9)
+    self.shape = (np.floor(extent / self.cell).astype(int) + 1)
+
+    # every (cell, segment) pair of the boxes, sorted by cell
+    low = self.cells(self.seg_min)
+    high = self.cells(self.seg_max)
+    widths = high[:, 0] - low[:, 0] + 1
+    counts = widths * (high[:, 1] - low[:, 1] + 1)
+    segment_ids = np.repeat(np.arange(len(segments)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_x = low[segment_ids, 0] + k % widths[segment_ids]
+    cell_y = low[segment_ids, 1] + k // widths[segment_ids]
+    keys = cell_y * self.shape[0] + cell_x
+
+    order = np.argsort(keys, kind="stable")
+    self.segment_ids = segment_ids[order]
+    self.offsets = np.searchsorted(keys[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+  def cells(self, points: np.ndarray) -> np.ndarray:
+    '''
+      (..., 2) cell of every point, clamped to the grid
+    '''
+    return np.clip(np.floor((points - self.origin) / self.cell).astype(int), 0, self.shape - 1)
+
+  def inCells(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    '''
+      ids of the segments listed in the cells low to high (inclusive), unique
+    '''
+    runs = [
+      self.segment_ids[self.offsets[row * self.shape[0] + low[0]]:self.offsets[row * self.shape[0] + high[0] + 1]]
+      for row in range(low[1], high[1] + 1)
+    ]
+    return np.unique(np.concatenate(runs))
+
+  def near(self, point: np.ndarray) -> np.ndarray:
+    '''
+      ids of the segments of the ring of cells closest to point that has any,
+      not always the nearest segment but one to bound the search with
+    '''
+    center = self.cells(point)
+    for ring in range(int(self.shape.max()) + 1):
+      found = self.inCells(np.maximum(center - ring, 0), np.minimum(center + ring, self.shape - 1))
+      if len(found) > 0:
+        return found
+
+    return np.arange(len(self.seg_min))
+
+  def inBox(self, box_min: np.ndarray, box_max: np.ndarray, reach: float) -> np.ndarray:
+    '''
+      ids of the segments whose bounding box is at most reach from the box
+    '''
+    found = self.inCells(self.cells(box_min - reach), self.cells(box_max + reach))
+    gap = np.maximum(0, np.maximum(self.seg_min[found] - box_max, box_min - self.seg_max[found]))
+    return found[np.hypot(gap[:, 0], gap[:, 1]) <= reach]
+
+class GeometryArrays:
+  # number of transect x segment pairs evaluated at once by the kernel
+  # ... bounds the size of the temporary arrays
+  chunk_pairs = 4_000_000
+
+  # number of neighbouring transects that share one segment bounding box test
+  block_transects = 256
+
+  # tolerance on the segment parameters so that crossings exactly at
+  # ... a vertex are not lost to rounding
+  eps = 1e-12
+
+  # transects shared by the worker processes of a parallel run
+  # ... set once per worker by initWorker so they are not sent with every task
+  worker_transects: np.ndarray = None
+
+  @classmethod
+  # turns a polyline of M vertices into M-1 segments
+  def polylineSegments(cls, vertices: np.ndarray) -> np.ndarray:
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    return np.stack([vertices[:-1], vertices[1:]], axis=1)
+
+  @classmethod
+  # turns the parts of a (multi)polyline into one segment array
+  # ... segments are never created between the end of one part and the start of the next
+  def partsSegments(cls, parts: List[np.ndarray]) -> np.ndarray:
+    segments = [cls.polylineSegments(part) for part in parts if len(part) > 1]
+    if segments == []:
+      return np.empty((0, 2, 2))
+
+    return np.concatenate(segments)
+
+  @classmethod
+  # keeps only the transects whose bounding boxes overlap the bounding box
+  # ... of the segments. returns the indices of the kept transects
+  def boxCandidates(cls, transects: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    if len(segments) == 0:
+      return np.empty(0, dtype=int)
+
+    seg_min = segments.reshape(-1, 2).min(axis=0)
+    seg_max = segments.reshape(-1, 2).max(axis=0)
+    t_min = transects.min(axis=1)
+    t_max = transects.max(axis=1)
+
+    overlaps = np.all((t_max >= seg_min) & (t_min <= seg_max), axis=1)
+    return np.flatnonzero(overlaps)
+
+  @classmethod
+  # distance along every transect to its closest crossing with the segments
+  # ... starting at q with direction s. nan if there is no crossing
+  def firstCrossing(cls, transects: np.ndarray, q: np.ndarray, s: np.ndarray) -> np.ndarray:
+    p = transects[:, 0]
+    r = transects[:, 1] - transects[:, 0]
+
+    qp_x = q[None, :, 0] - p[:, None, 0]
+    qp_y = q[None, :, 1] - p[:, None, 1]
+    denom = np.outer(r[:, 0], s[:, 1]) - np.outer(r[:, 1], s[:, 0])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      t = (qp_x * s[None, :, 1] - qp_y * s[None, :, 0]) / denom
+      u = (qp_x * r[:, None, 1] - qp_y * r[:, None, 0]) / denom
+
+    crosses = (
+      (denom != 0)
+      & (t >= -cls.eps) & (t <= 1 + cls.eps)
+      & (u >= -cls.eps) & (u <= 1 + cls.eps)
+    )
+    first_t = np.where(crosses, t, np.inf).min(axis=1)
+
+    # found before clipping, a transect without a crossing keeps inf
+    # ... and clipping would turn it into the full transect length
+    found = np.isfinite(first_t)
+    distances = np.full(len(transects), np.nan)
+    distances[found] = np.clip(first_t[found], 0, 1) * np.hypot(r[found, 0], r[found, 1])
+
+    return distances
+
+  @classmethod
+  # finds, for every transect, the distance from its origin to the closest
+  # ... crossing with any of the segments. nan if the transect does not cross.
+  #
+  # with p the transect origin, r the transect direction, q a segment start
+  # ... and s the segment direction, the lines cross at p + t*r = q + u*s where
+  # ...   t = (q - p) x s / (r x s)
+  # ...   u = (q - p) x r / (r x s)
+  # ... the segments cross when both t and u are in [0, 1]. t * |r| is then the
+  # ... along-transect distance. parallel (and collinear) segments are not crossings.
+  def intersectSegments(cls, transects: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    transects = np.asarray(transects, dtype=float).reshape(-1, 2, 2)
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    distances = np.full(len(transects), np.nan)
+
+    candidates = cls.boxCandidates(transects, segments)
+    if len(candidates) == 0:
+      return distances
+
+    seg_min = segments.min(axis=1)
+    seg_max = segments.max(axis=1)
+
+    # transects are processed in blocks and each block is only tested against the
+    # ... segments overlapping the bounding box of the block. transects generated
+    # ... along a baseline are ordered alongshore so a block covers a short stretch
+    # ... of the shoreline
+    for start in range(0, len(candidates), cls.block_transects):
+      indx = candidates[start:start + cls.block_transects]
+      block_min = transects[indx].reshape(-1, 2).min(axis=0)
+      block_max = transects[indx].reshape(-1, 2).max(axis=0)
+      in_block = np.all((seg_max >= block_min) & (seg_min <= block_max), axis=1)
+      if not in_block.any():
+        continue
+
+      block_segments = segments[in_block]
+      q = block_segments[:, 0]
+      s = block_segments[:, 1] - block_segments[:, 0]
+
+      chunk_size = max(1, cls.chunk_pairs // len(block_segments))
+      for chunk_start in range(0, len(indx), chunk_size):
+        chunk_indx = indx[chunk_start:chunk_start + chunk_size]
+        distances[chunk_indx] = cls.firstCrossing(transects[chunk_indx], q, s)
+
+    return distances
+
+  @classmethod
+  # distances from each transect origin to the first crossing with a single polyline
+  def intersectPolyline(cls, transects: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    return cls.intersectSegments(transects, cls.polylineSegments(vertices))
+
+  @classmethod
+  # builds the dates x transects intersect matrix for a list of shorelines,
+  # ... each shoreline given as a list of parts
+  def intersectMatrix(cls, transects: np.ndarray, shorelines: List[List[np.ndarray]]) -> np.ndarray:
+    matrix = np.full((len(shorelines), len(transects)), np.nan)
+    for (row, parts) in enumerate(shorelines):
+      matrix[row] = cls.intersectSegments(transects, cls.partsSegments(parts))
+
+    return matrix
+
+  @classmethod
+  def initWorker(cls, transects: np.ndarray):
+    cls.worker_transects = transects
+
+  @classmethod
+  # intersects a block of shorelines, given as segment arrays, with the worker transects
+  def intersectBlock(cls, shorelines_segments: List[np.ndarray]) -> np.ndarray:
+    block = np.full((len(shorelines_segments), len(cls.worker_transects)), np.nan)
+    for (row, segments) in enumerate(shorelines_segments):
+      block[row] = cls.intersectSegments(cls.worker_transects, segments)
+
+    return block
+
+  @classmethod
+  # intersects every shoreline with the transects across a pool of worker processes
+  # ... shorelines are sent to the workers in blocks of block_size as plain segment
+  # ... arrays, the transects are sent once to every worker.
+  #
+  # yields the distances of every shoreline in the same order as shorelines_segments
+  # ... regardless of which worker finishes first
+  def parallelIntersect(
+    cls,
+    transects: np.ndarray,
+    shorelines_segments: List[np.ndarray],
+    processes: int = None,
+    block_size: int = 8
+  ) -> Iterator[np.ndarray]:
+    transects = np.asarray(transects, dtype=float).reshape(-1, 2, 2)
+    blocks = [
+      shorelines_segments[start:start + block_size]
+      for start in range(0, len(shorelines_segments), block_size)
+    ]
+
+    with ProcessPoolExecutor(
+      max_workers=processes,
+      initializer=cls.initWorker,
+      initargs=(transects,)
+    ) as executor:
+      for block in executor.map(cls.intersectBlock, blocks):
+        for distances in block:
+          yield distances
+
+  @classmethod
+  # the points at the given distances along each transect
+  # ... each transect is a straight segment so this is origin + distance * unit direction
+  def pointsAlong(cls, transects: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    transects = np.asarray(transects, dtype=float).reshape(-1, 2, 2)
+    direction = transects[:, 1] - transects[:, 0]
+    length = np.hypot(direction[:, 0], direction[:, 1])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      unit = direction / length[:, None]
+
+    return transects[:, 0] + np.asarray(distances, dtype=float)[..., None] * unit
+
+  @classmethod
+  # the points at the given distances along a (multi)polyline, measured from the
+  # ... start of its first part. parts are walked one after the other, the gap
+  # ... between the end of one part and the start of the next has no length.
+  # ... distances past the end are clamped to the last vertex
+  #
+  # same result as QgsGeometry.interpolate for every distance, in one pass:
+  # ... the segment of every distance is found by a binary search over the
+  # ... cumulative segment lengths
+  def interpolateParts(cls, parts: List[np.ndarray], distances: np.ndarray) -> np.ndarray:
+    segments = cls.partsSegments(parts)
+    distances = np.asarray(distances, dtype=float)
+
+    direction = segments[:, 1] - segments[:, 0]
+    lengths = np.hypot(direction[:, 0], direction[:, 1])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    indx = np.searchsorted(ends, distances, side="left")
+    indx = np.clip(indx, 0, len(segments) - 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      t = np.where(lengths[indx] > 0, (distances - starts[indx]) / lengths[indx], 0)
+    t = np.clip(t, 0, 1)
+
+    return segments[indx, 0] + t[:, None] * direction[indx]
+
+  @classmethod
+  # total length of a (multi)polyline
+  def partsLength(cls, parts: List[np.ndarray]) -> float:
+    segments = cls.partsSegments(parts)
+    direction = segments[:, 1] - segments[:, 0]
+    return float(np.hypot(direction[:, 0], direction[:, 1]).sum())
+
+  @classmethod
+  # closest point of every segment to every point, and its squared distance
+  # ... returns (P, S) squared distances and (P, S, 2) closest points
+  def projectOnSegments(cls, points: np.ndarray, segments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    q = segments[:, 0]
+    s = segments[:, 1] - segments[:, 0]
+    s_len2 = (s * s).sum(axis=1)
+
+    d_x = points[:, None, 0] - q[None, :, 0]
+    d_y = points[:, None, 1] - q[None, :, 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      t = (d_x * s[None, :, 0] + d_y * s[None, :, 1]) / s_len2[None, :]
+    # degenerate segments are a single point
+    t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+
+    closest = q[None, :, :] + t[..., None] * s[None, :, :]
+    dist2 = (points[:, None, 0] - closest[..., 0]) ** 2 + (points[:, None, 1] - closest[..., 1]) ** 2
+
+    return dist2, closest
+
+  @classmethod
+  # the closest point on the segments to every point, the same point as
+  # ... QgsGeometry.shortestLine ends at. returns (P, 2) closest points and (P,) distances
+  #
+  # points are processed in blocks of block_transects, against a SegmentGrid of
+  # ... the segments. for every block an upper bound of the nearest distance is
+  # ... taken from a segment of the grid cells nearest the block center, then
+  # ... only segments whose bounding box is within that bound of the block
+  # ... bounding box are projected on, read from the grid cells of the box.
+  # ... points along a baseline are ordered so a block only sees a short stretch
+  # ... of the other baseline and reads a few cells, whatever the number of segments
+  def nearestOnSegments(cls, points: np.ndarray, segments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    if len(segments) == 0:
+      raise Exception("no segments to search")
+
+    nearest = np.empty((len(points), 2))
+    distances = np.empty(len(points))
+    grid = SegmentGrid(segments)
+
+    for start in range(0, len(points), cls.block_transects):
+      block = points[start:start + cls.block_transects]
+      block_min = block.min(axis=0)
+      block_max = block.max(axis=0)
+      block_center = (block_min + block_max) / 2
+
+      # upper bound: every point of the block is at most this far from the
+      # ... segment (of the nearest grid cells) closest to the block center
+      near = grid.near(block_center)
+      center_dist2, _ = cls.projectOnSegments(block_center[None], segments[near])
+      best = segments[[near[int(np.argmin(center_dist2[0]))]]]
+      bound_dist2, _ = cls.projectOnSegments(block, best)
+      bound = np.sqrt(bound_dist2.max())
+
+      candidates = segments[grid.inBox(block_min, block_max, bound * (1 + cls.eps) + cls.eps)]
+
+      chunk_size = max(1, cls.chunk_pairs // len(candidates))
+      for chunk_start in range(0, len(block), chunk_size):
+        chunk = block[chunk_start:chunk_start + chunk_size]
+        dist2, closest = cls.projectOnSegments(chunk, candidates)
+        indx = np.argmin(dist2, axis=1)
+        rows = np.arange(len(chunk))
+
+        nearest[start + chunk_start:start + chunk_start + len(chunk)] = closest[rows, indx]
+        distances[start + chunk_start:start + chunk_start + len(chunk)] = np.sqrt(dist2[rows, indx])
+
+    return nearest, distances
+
+  @classmethod
+  # turns a dates x transects distance matrix into intersection point records
+  # ... one record per non nan cell, ordered by transect then by date
+  #
+  # returns (transect_indices, date_indices, distances, points)
+  def pointRecords(cls, transects: np.ndarray, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    matrix = np.asarray(matrix, dtype=float)
+    transect_indices, date_indices = np.nonzero(~np.isnan(matrix.T))
+    distances = matrix[date_indices, transect_indices]
+    points = cls.pointsAlong(np.asarray(transects, dtype=float)[transect_indices], distances)
+
+    return transect_indices, date_indices, distances, points
+
+  @classmethod
+  # reads the (multi)linestrings of a geojson file
+  # ... returns the parts of every feature and the given property of every feature
+  def readGeojsonLines(cls, file_path: str, property_name: str = None) -> Tuple[List[List[np.ndarray]], list]:
+    property_names = [] if property_name is None else [property_name]
+    lines, properties, _ = cls.readGeojsonFeatures(file_path, property_names)
+
+    return lines, properties.get(property_name, [])
+
+  @classmethod
+  # reads the (multi)linestrings of a geojson file in one parse
+  # ... returns the parts of every feature, the values of every given property and the crs of the file
+  def readGeojsonFeatures(cls, file_path: str, property_names: List[str] = ()) -> Tuple[List[List[np.ndarray]], dict, str]:
+    with open(file_path) as geojson_file:
+      collection = json.load(geojson_file)
+
+    lines: List[List[np.ndarray]] = []
+    properties = {property_name: [] for property_name in property_names}
+    for feature in collection["features"]:
+      geometry = feature["geometry"]
+      if geometry["type"] == "LineString":
+        parts = [geometry["coordinates"]]
+      elif geometry["type"] == "MultiLineString":
+        parts = geometry["coordinates"]
+      else:
+        raise Exception("unsupported geometry type {t}".format(t=geometry["type"]))
+
+      lines.append([np.asarray(part, dtype=float)[:, :2] for part in parts])
+      for property_name in property_names:
+        properties[property_name].append(feature["properties"].get(property_name))
+
+    return lines, properties, cls.geojsonCollectionCrs(collection)
+
+  @classmethod
+  # reads the (multi)polygons of a geojson file
+  # ... returns the rings (exterior and holes) of every feature and the given property of every feature
+  def readGeojsonPolygons(cls, file_path: str, property_name: str = None) -> Tuple[List[List[np.ndarray]], list]:
+    with open(file_path) as geojson_file:
+      collection = json.load(geojson_file)
+
+    polygons: List[List[np.ndarray]] = []
+    properties = []
+    for feature in collection["features"]:
+      geometry = feature["geometry"]
+      if geometry["type"] == "Polygon":
+        rings = geometry["coordinates"]
+      elif geometry["type"] == "MultiPolygon":
+        rings = [ring for polygon in geometry["coordinates"] for ring in polygon]
+      else:
+        raise Exception("unsupported geometry type {t}".format(t=geometry["type"]))
+
+      polygons.append([np.asarray(ring, dtype=float)[:, :2] for ring in rings])
+      if property_name is not None:
+        properties.append(feature["properties"].get(property_name))
+
+    return polygons, properties
+
+  @classmethod
+  # True for the points inside a polygon given by its rings, even-odd rule so
+  # ... holes (and the parts of a multipolygon) need no special case.
+  # ... one ray crossing test of every point against every edge, in blocks of points
+  def pointsInPolygon(cls, points: np.ndarray, rings: List[np.ndarray], block_size: int = 2048) -> np.ndarray:
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    edges = np.concatenate([np.stack([ring, np.roll(ring, -1, axis=0)], axis=1) for ring in rings])
+    (x1, y1), (x2, y2) = edges[:, 0].T, edges[:, 1].T
+
+    inside = np.zeros(len(points), dtype=bool)
+    vertices = np.concatenate(rings)
+    in_box = np.all((points >= vertices.min(axis=0)) & (points <= vertices.max(axis=0)), axis=1)
+    candidates = np.flatnonzero(in_box)
+
+    for start in range(0, len(candidates), block_size):
+      block = candidates[start:start + block_size]
+      px = points[block, 0][:, None]
+      py = points[block, 1][:, None]
+      with np.errstate(divide="ignore", invalid="ignore"):
+        crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * (x2 - x1) / (y2 - y1))
+      inside[block] = np.count_nonzero(crosses, axis=1) % 2 == 1
+
+    return inside
+
+  @classmethod
+  # reads two point transects, such as the geojson written by TransectGenerator.save_asGeojson
+  # ... only the first and last vertices of every transect are kept
+  def readGeojsonTransects(cls, file_path: str, property_name: str = "name") -> Tuple[np.ndarray, list]:
+    lines, names = cls.readGeojsonLines(file_path, property_name)
+    transects = np.array([[line[0][0], line[-1][-1]] for line in lines], dtype=float).reshape(-1, 2, 2)
+
+    return transects, names
+
+  @classmethod
+  # the crs of a geojson file as an authority id, from its named crs member
+  # ... (urn:ogc:def:crs:EPSG::3124, EPSG:3124). None without one, such
+  # ... coordinates are taken as they are and never reprojected
+  def readGeojsonCrs(cls, file_path: str) -> str:
+    with open(file_path) as geojson_file:
+      return cls.geojsonCollectionCrs(json.load(geojson_file))
+
+  @classmethod
+  def geojsonCollectionCrs(cls, collection: dict) -> str:
+    name = collection.get("crs", {}).get("properties", {}).get("name")
+    if name is None:
+      return None
+    if name.endswith("CRS84"):
+      return "EPSG:4326"
+
+    fields = [field for field in name.split(":") if field != ""]
+    return "{a}:{c}".format(a=fields[-2], c=fields[-1])
+
+  @classmethod
+  # the named crs member of a geojson for an authority id, e.g. "EPSG:3124"
+  # ... None for WGS84 (the RFC 7946 default) and crs without an authority id
+  def geojsonCrs(cls, crs: str = None) -> dict:
+    if crs is None or crs == "EPSG:4326" or len(crs.split(":")) != 2:
+      return None
+
+    authority, code = crs.split(":")
+    return {"type": "name", "properties": {"name": "urn:ogc:def:crs:{a}::{c}".format(a=authority, c=code)}}
+
+  @classmethod
+  # writes features of one geometry type ("Point", "LineString") with their properties
+  def writeGeojson(cls, file_path: str, geometry_type: str, coordinates: list, properties: List[dict], crs: str = None):
+    collection = {
+      "type": "FeatureCollection",
+      "features": [
+        {
+          "type": "Feature",
+          "geometry": {"type": geometry_type, "coordinates": np.asarray(geometry, dtype=float).tolist()},
+          "properties": feature_properties
+        }
+        for (geometry, feature_properties) in zip(coordinates, properties)
+      ]
+    }
+    if cls.geojsonCrs(crs) is not None:
+      collection["crs"] = cls.geojsonCrs(crs)
+
+    with open(file_path, "w") as geojson_file:
+      json.dump(collection, geojson_file)
+
+  @classmethod
+  # writes transects as two point linestrings with a name property, the layout
+  # ... read back by readGeojsonTransects. crs is recorded as a named crs, e.g. "EPSG:3124"
+  def writeGeojsonTransects(cls, file_path: str, transects: np.ndarray, names: list, crs: str = None):
+    transects = np.asarray(transects, dtype=float).reshape(-1, 2, 2)
+    cls.writeGeojson(file_path, "LineString", transects, [{"name": name} for name in names], crs)
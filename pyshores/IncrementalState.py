@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+
+from typing import Dict, List, Tuple
+
+'''
+  fingerprints of the inputs of a previous run, kept next to its outputs
+  so that a later run only has to process what is new or changed.
+
+  state file layout (json):
+    {
+      "inputs": fingerprint of the inputs every item depends on (e.g. the transect set),
+      "items": { item key: item fingerprint, ... },
+      "labels": { item key: label of the item in the outputs (e.g. its date), ... },
+      "rows": [ item key of every output row, in the order of the rows ]
+    }
+
+  when the inputs fingerprint changes every item is stale and a full run is needed.
+'''
+
+class IncrementalState:
+  def __init__(self, state_filePath: str) -> None:
+    self.state_filePath = state_filePath
+    self.inputs: str = None
+    self.items: Dict[str, str] = {}
+    self.labels: Dict[str, str] = {}
+    # item keys of the output rows in order, None when the previous run did not record them
+    self.rows: List[str] = None
+
+  @classmethod
+  def fingerprint(cls, *parts) -> str:
+    '''
+      sha1 of the given parts. parts are bytes, or anything else which is
+      hashed through its string representation
+    '''
+    digest = hashlib.sha1()
+    for part in parts:
+      if not isinstance(part, (bytes, bytearray)):
+        part = str(part).encode("utf-8")
+      digest.update(len(part).to_bytes(8, "little"))
+      digest.update(part)
+
+    return digest.hexdigest()
+
+  def load(self) -> bool:
+    '''
+      loads the state of the previous run. False if there is none
+    '''
+    if not os.path.isfile(self.state_filePath):
+      return False
+
+    with open(self.state_filePath) as state_file:
+      state = json.load(state_file)
+
+    self.inputs = state["inputs"]
+    self.items = state["items"]
+    self.labels = state.get("labels", {})
+    self.rows = state.get("rows")
+    return True
+
+  def save(self, inputs: str, items: Dict[str, str], labels: Dict[str, str] = None, rows: List[str] = None):
+    self.inputs = inputs
+    self.items = dict(items)
+    self.labels = dict(labels or {})
+    self.rows = list(rows) if rows is not None else None
+
+    # written to a temporary file first so an interrupted run
+    # ... never leaves a half written state behind
+    temp_filePath = self.state_filePath + ".tmp"
+    with open(temp_filePath, "w") as state_file:
+      json.dump({"inputs": self.inputs, "items": self.items, "labels": self.labels, "rows": self.rows}, state_file)
+    os.replace(temp_filePath, self.state_filePath)
+
+  def diff(self, items: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    '''
+      compares the current item fingerprints with the previous run
+
+      returns (changed, removed)
+        changed: keys that are new or whose fingerprint changed
+        removed: keys of the previous run that are gone
+    '''
+    changed = [key for (key, item) in items.items() if self.items.get(key) != item]
+    removed = [key for key in self.items if key not in items]
+
+    return changed, removed
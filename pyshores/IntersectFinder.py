@@ -1,13 +1,42 @@
+import os
+import time
+
 from tokenize import String
 from qgis.core import *
 from qgis.PyQt.QtCore import QVariant 
-from typing import List
+from typing import Iterator, List, Tuple
 from math import nan
 
+import numpy as np
+
+try:
+  from .FeatureSink import FeatureSink
+  from .GeometryArrays import GeometryArrays
+  from .IncrementalState import IncrementalState
+  from .IntersectMatrix import IntersectMatrix, IntersectMatrixWriter
+  from .Reprojection import Reprojection, Wgs84Copy
+  from .RunReport import RunReport
+  from .Session import DatasetFeature, LineDataset, Session
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from FeatureSink import FeatureSink
+  from GeometryArrays import GeometryArrays
+  from IncrementalState import IncrementalState
+  from IntersectMatrix import IntersectMatrix, IntersectMatrixWriter
+  from Reprojection import Reprojection, Wgs84Copy
+  from RunReport import RunReport
+  from Session import DatasetFeature, LineDataset, Session
+
 # --- DEFINE VARIABLES HERE --- # 
 
 transect_fileName = "transects_landward_baseline0.shp"
 shoreline_fileName = "cagliliog_shorelines.shp"
+backend = "qgis" # qgis: QgsGeometry intersections, numpy: batched GeometryArrays kernel
+processes = 1 # more than 1 spreads the shorelines over a pool of worker processes, numpy backend only
+incremental = False # only find intersections of new or changed shorelines since the last run
+coastSat_format = "shp" # shp: wide CoastSat like vector table, matrix: memory mappable IntersectMatrix (.npy + .json)
+output_format = "shp" # shp, gpkg, fgb or parquet vector outputs, see FeatureSink
+streaming = False # read and intersect one shoreline at a time, memory does not grow with the number of dates
+wgs84 = False # also write a WGS84 geojson copy of the CoastCR like points
 
 # add warning when no file detected
 
@@ -51,8 +80,10 @@ class TransectUtility:
 
   @classmethod
   # extracts the features from a layer
-  def extract_features(cls, layer: QgsVectorLayer) -> List[QgsFeature]:
-    features = [feature for feature in layer.getFeatures()]
+  def extract_features(cls, layer: QgsVectorLayer, request: QgsFeatureRequest = None) -> List[QgsFeature]:
+    if request is None:
+      request = QgsFeatureRequest()
+    features = [feature for feature in layer.getFeatures(request)]
     return features 
 
   @classmethod
@@ -62,7 +93,8 @@ class TransectUtility:
     return geometries
 
   @classmethod
-  # writes shape files
+  # writes shape files, or any other FeatureSink output format
+  # ... the extension of output_fileName is replaced by the one of the format
   def init_shpWriter(
     cls,
     output_path: str,
@@ -70,19 +102,19 @@ class TransectUtility:
     geometry_type,  # QgsWkbTypes
     fields: QgsFields,
     srs: QgsCoordinateReferenceSystem, 
-  ) -> QgsVectorFileWriter:
+    output_format: str = "shp"
+  ) -> FeatureSink:
     output_filePath = "{output_path}/{output_fileName}".format(
       output_path=output_path,
       output_fileName=output_fileName
     )
 
-    writer = QgsVectorFileWriter(
+    writer = FeatureSink(
       output_filePath,
-      "UTF-8",
       fields,
       geometry_type,
-      srs=srs,
-      driverName = "ESRI Shapefile"
+      srs,
+      output_format=output_format
     )
 
     return writer
@@ -105,93 +137,387 @@ class IntersectFinder:
     self,
     transect_fileName,
     shoreline_fileName,
-    project_crs = QgsProject.instance().crs()
+    project_crs = None,
+    backend: str = "qgis",
+    processes: int = 1,
+    project_path: str = None,
+    coastSat_format: str = "shp",
+    report: RunReport = None,
+    output_format: str = "shp",
+    wgs84: bool = False,
+    session: Session = None
     ) -> None:
-    self.crs: QgsCoordinateReferenceSystem =project_crs 
+    # project path defaults to the one of the open QGIS project
+    if project_path is None:
+      project_path = QgsProject.instance().homePath()
+
+    # crs of the intersections, defaults to the one of the transects layer
+    # ... (then to the one of the open QGIS project). transects and shorelines
+    # ... in another crs are reprojected to it, see loadLayers
+    if isinstance(project_crs, str):
+      project_crs = QgsCoordinateReferenceSystem(project_crs)
+    if project_crs is None:
+      project_crs = QgsVectorLayer(os.path.join(project_path, "transects", transect_fileName), "transects_layer", "ogr").crs()
+    if not project_crs.isValid():
+      project_crs = QgsProject.instance().crs()
 
-    self.project_path = QgsProject.instance().homePath()
-    self.transects_layer_filePath: str = self.project_path  + "/transects/" + transect_fileName
-    self.shorelines_layer_filePath: str = self.project_path + "/positions/" + shoreline_fileName 
+    self.crs: QgsCoordinateReferenceSystem =project_crs 
+    # crs of the coordinates read from the transects and shorelines layers, set by loadLayers
+    self.transects_crs: QgsCoordinateReferenceSystem = project_crs
+    self.shorelines_crs: QgsCoordinateReferenceSystem = project_crs
+
+    if backend not in ("qgis", "numpy"):
+      raise Exception("unknown intersection backend {b}".format(b=backend))
+    # the worker processes run the numpy kernel, which does not pick crossings
+    # ... exactly as the qgis engine does. never swap engines behind the user's back
+    if processes > 1 and backend != "numpy":
+      raise Exception("{p} processes need the numpy backend, the {b} backend runs in one process".format(p=processes, b=backend))
+    self.backend: str = backend
+    self.processes: int = processes
+
+    if coastSat_format not in ("shp", "matrix"):
+      raise Exception("unknown CoastSat output format {f}".format(f=coastSat_format))
+    self.coastSat_format: str = coastSat_format
+    # format of the CoastCR points and of the CoastSat table unless it is a matrix
+    self.output_format: str = output_format
+
+    # file names are relative to the transects and positions folders
+    # ... absolute paths are used as they are
+    self.project_path = project_path
+    self.transects_layer_filePath: str = os.path.join(self.project_path, "transects", transect_fileName)
+    self.shorelines_layer_filePath: str = os.path.join(self.project_path, "positions", shoreline_fileName)
     self.coastSat_output_path: str = self.project_path + "/intersects/coastSat" 
     self.coastCR_output_path: str= self.project_path + "/intersects/coastCR"
+    self.coastSat_filePath: str = FeatureSink.filePath(self.coastSat_output_path + "/" + "coastSat_intersects", output_format)
+    if coastSat_format == "matrix":
+      self.coastSat_filePath = self.coastSat_output_path + "/" + "coastSat_intersects.npy"
+    self.coastCR_filePath: str = FeatureSink.filePath(self.coastCR_output_path + "/" + "coastCR_intersects", output_format)
+    # WGS84 copy of the CoastCR like points of a full run, see Wgs84Copy
+    self.coastCR_wgs84_filePath: str = self.coastCR_output_path + "/" + "coastCR_intersects_wgs84.geojson" if wgs84 else None
+    self.coastCR_wgs84: Wgs84Copy = Wgs84Copy(None, "Point", project_crs)
+
+    # fingerprints of the transects and shorelines of the last run
+    self.state_filePath: str = self.coastSat_output_path + "/" + "intersects_state.json"
+
+    # timings and counters of the run, see RunReport
+    self.report: RunReport = report if report is not None else RunReport("intersects")
+    self.report_filePath: str = self.coastSat_output_path + "/" + "intersects_report.json"
+
+    # datasets shared with the other stages of the process, see Session
+    # ... used by the numpy engines, the qgis engine needs QgsGeometry
+    self.session: Session = session
 
     # initialize output paths here
     TransectUtility.init_output_path(self.coastSat_output_path)
     TransectUtility.init_output_path(self.coastCR_output_path)
 
     
+  # builds a spatial index over the bounding boxes of the transects
+  # ... the index id of a transect is its position in the transects list
+  # ... transect geometries are also cached here so that they are only built once
+  def indexTransects(self, transects: List[QgsFeature]) -> Tuple[QgsSpatialIndex, List[QgsGeometry]]:
+    transect_index = QgsSpatialIndex()
+    transect_geoms: List[QgsGeometry] = []
+
+    for (indx, transect) in enumerate(transects):
+      transect_geom = transect.geometry()
+      transect_geoms.append(transect_geom)
+      transect_index.addFeature(indx, transect_geom.boundingBox())
+
+    return transect_index, transect_geoms
+
+  # finds the distance from the transect origin to the first intersection 
+  # ... between a transect and a shoreline. returns None if there is no intersection
+  def intersectDistance(self, transect_geom: QgsGeometry, shoreline_geom: QgsGeometry):
+    # cases:
+    # ... no intersection: intersection_point.isEmpty() == true
+    # ... one intersection: singleType as Point
+    # ... two or more intersections: multitype as Multipoint
+    origin: QgsPointXY = transect_geom.asMultiPolyline()[0][0]
+    intersection_point: QgsGeometry = transect_geom.intersection(shoreline_geom)
+
+    if intersection_point.isEmpty():
+      # no intersection point detected
+      # ... do nothing, keep the intersection point as nan in coastsat structure
+      # ... and not add the feature in coastcr structure
+      return None
+
+    if QgsWkbTypes.isSingleType(intersection_point.wkbType()):
+      # one intersection point is detected
+      # ... intersection is of type QgsGeometry:Point can be cast as point
+      intersection_point = intersection_point.asPoint()
+    else: # assume multitype
+      # multiple intersections between transect and shoreline 
+        # ... intersection if of type QgsGeometry:Multipoint and can be cast as multipoint 
+        # ... get only first intersection 
+        # 
+        # When multiple intersections, geometry1.intersection(geometry2) returns geometry 
+        # ... that can be cast as multipoint. When done so multipoint can be interpreted
+        # ... as [
+        # ...     intersection_1: QgsGeometry:Point, 
+        # ...     intersection2: QgsGeometry:Point ... intersection_i: QgsGeometry:Point
+        # ...    ]
+        # ... where intersection_1 is the closest intersection from the origin of geometry 1
+        # ... and intersection_i is the farthest intersection.
+        #
+        # Get intersection_1 (closest to origin) by CoastCR standards on onshore 
+        # ... baseline approach
+
+      intersection_point = intersection_point.asMultiPoint()[0]
+      self.report.count("multi_intersections")
+    
+    # then calculate the distance from origin
+    return origin.distance(intersection_point)
+
   # finds the intersections for all transects and shorelines
+  #
+  # instead of testing every transect against every shoreline, the transect
+  # ... bounding boxes are indexed once and each shoreline is only tested against
+  # ... the transects whose bounding boxes it touches. the shoreline geometry is
+  # ... prepared so that repeated intersects tests against it are cheap.
+  #
+  # candidates are visited in transect order so both outputs are written
+  # ... in the same order as a full shorelines x transects scan
   def findIntersections(self,
     transects: List[QgsFeature],
     shorelines: List[QgsFeature],
     coastCR_writer: QgsVectorFileWriter,
     coastSat_writer: QgsVectorFileWriter
   ):
+    transect_index, transect_geoms = self.indexTransects(transects)
+
+    total_pairs = 0
+    pruned_pairs = 0
+
+    with self.report.stage("pair_loop"):
+      for shoreline in shorelines:
+        intersections = [nan] * len(transects)
+        shoreline_geom: QgsGeometry = shoreline.geometry()
+
+        shoreline_engine = QgsGeometry.createGeometryEngine(shoreline_geom.constGet())
+        shoreline_engine.prepareGeometry()
+
+        candidates = sorted(transect_index.intersects(shoreline_geom.boundingBox()))
+        total_pairs += len(transects)
+        pruned_pairs += len(transects) - len(candidates)
+        found = 0
+
+        for indx in candidates:
+          if self.report.profiling:
+            transect_start = time.perf_counter()
+
+          transect = transects[indx]
+          transect_geom = transect_geoms[indx]
+
+          distance = None
+          if shoreline_engine.intersects(transect_geom.constGet()):
+            distance = self.intersectDistance(transect_geom, shoreline_geom)
+
+          if distance is not None:
+            intersections[indx] = distance
+            found += 1
+
+            # then write to CoastCR like writer
+            coastCR_fet = QgsFeature()
+            coastCR_intersect_fet_geom = transect_geom.interpolate(distance)
+            coastCR_fet.setAttributes([transect.id(), shoreline.id(), distance])
+            coastCR_fet.setGeometry(coastCR_intersect_fet_geom)
+
+            coastCR_writer.addFeature(coastCR_fet)
+            self.coastCR_wgs84.add(
+              coastCR_intersect_fet_geom.asPoint(),
+              {"ID_Profile": transect.id(), "ID_Coast": shoreline.id(), "Distance": distance}
+            )
+
+          if self.report.profiling:
+            self.report.profileTransect(
+              transect.id(),
+              time.perf_counter() - transect_start,
+              shoreline=shoreline.id(),
+              intersects=distance is not None
+            )
+
+        # then write intersection distances to CoastSat like writer  
+        coastSat_fet = QgsFeature()
+        coastSat_fet.setAttributes([shoreline['dates']] + intersections)
+        coastSat_writer.addFeature(coastSat_fet)
+
+        self.report.count("intersections", found)
+        self.report.count("nan_cells", len(transects) - found)
+        self.report.count("coastCR_features_written", found)
+        self.report.count("coastSat_rows_written")
+
+    del coastCR_writer
+    del coastSat_writer
+    self.report.count("pairs_total", total_pairs)
+    self.report.count("pairs_pruned", pruned_pairs)
+    print('{pruned} of {total} candidate pairs pruned by the transect index'.format(
+      pruned=pruned_pairs,
+      total=total_pairs
+    ))
+    print('intesrect calculation done!')
 
-    for shoreline in shorelines:
-      intersections = [nan] * len(transects)
-
-      coastSat_fet = QgsFeature()
-      for (indx, transect) in enumerate(transects):
-        # cases:
-        # ... no intersection: intersection_point.isEmpty() == true
-        # ... one intersection: singleType as Point
-        # ... two or more intersections: multitype as Multipoint
-        origin: QgsGeometry = transect.geometry().asMultiPolyline()[0][0]
-        intersection_point: QgsGeometry = transect.geometry().intersection(shoreline.geometry())
-
-        if intersection_point.isEmpty():
-          # no intersection point detected
-          # ... do nothing, keep the intersection point as nan in coastsat structure
-          # ... and not add the feature in coastcr structure
-          continue
-
-        if QgsWkbTypes.isSingleType(intersection_point.wkbType()):
-          # one intersection point is detected
-          # ... intersection is of type QgsGeometry:Point can be cast as point
-          intersection_point = intersection_point.asPoint()
-        else: # assume multitype
-          # multiple intersections between transect and shoreline 
-            # ... intersection if of type QgsGeometry:Multipoint and can be cast as multipoint 
-            # ... get only first intersection 
-            # 
-            # When multiple intersections, geometry1.intersection(geometry2) returns geometry 
-            # ... that can be cast as multipoint. When done so multipoint can be interpreted
-            # ... as [
-            # ...     intersection_1: QgsGeometry:Point, 
-            # ...     intersection2: QgsGeometry:Point ... intersection_i: QgsGeometry:Point
-            # ...    ]
-            # ... where intersection_1 is the closest intersection from the origin of geometry 1
-            # ... and intersection_i is the farthest intersection.
-            #
-            # Get intersection_1 (closest to origin) by CoastCR standards on onshore 
-            # ... baseline approach
-
-          intersection_point = intersection_point.asMultiPoint()[0]
-        
-        # then calculate the distance from origin
-        distance = origin.distance(intersection_point)
-        intersections[indx] = distance
-
-        # then write to CoastCR like writer
-        coastCR_fet = QgsFeature()
-        coastCR_intersect_fet_geom = transect.geometry().interpolate(distance)
-        coastCR_fet.setAttributes([transect.id(), shoreline.id(), distance])
-        coastCR_fet.setGeometry(coastCR_intersect_fet_geom)
-
-        coastCR_writer.addFeature(coastCR_fet)
-
-      # then write intersection distances to CoastSat like writer  
-      coastSat_fet = QgsFeature()
-      coastSat_fet.setAttributes([shoreline['dates']] + intersections)
-      coastSat_writer.addFeature(coastSat_fet)
+
+  # converts transect features to a (N, 2, 2) array of origins and end points
+  # ... every transect from TransectGenerator is a two point line
+  # ... reprojected to the crs of the run in one batched transform
+  def transectArray(self, transects: List[QgsFeature]) -> np.ndarray:
+    if isinstance(transects, LineDataset):
+      # already in the crs of the run
+      return transects.endpoints()
+
+    transect_array = np.empty((len(transects), 2, 2))
+    for (indx, transect) in enumerate(transects):
+      vertices = transect.geometry().asMultiPolyline()[0]
+      transect_array[indx] = [
+        [vertices[0].x(), vertices[0].y()],
+        [vertices[-1].x(), vertices[-1].y()]
+      ]
+
+    return Reprojection.transform(transect_array, self.transects_crs, self.crs)
+
+  # converts a shoreline geometry to a list of (M, 2) vertex arrays, one per part
+  # ... every vertex of the shoreline reprojected to the crs of the run in one batched transform
+  def shorelineParts(self, shoreline_geom: QgsGeometry) -> List[np.ndarray]:
+    if QgsWkbTypes.isMultiType(shoreline_geom.wkbType()):
+      polylines = shoreline_geom.asMultiPolyline()
+    else:
+      polylines = [shoreline_geom.asPolyline()]
+
+    parts = [
+      np.array([[point.x(), point.y()] for point in polyline], dtype=float)
+      for polyline in polylines
+    ]
+    return Reprojection.transformParts(parts, self.shorelines_crs, self.crs)
+
+  # the parts of a shoreline feature, of a layer or of a session dataset
+  def featureParts(self, shoreline) -> List[np.ndarray]:
+    if isinstance(shoreline, DatasetFeature):
+      return shoreline.parts()
+
+    return self.shorelineParts(shoreline.geometry())
+
+  # the geometry of a feature as bytes, for fingerprints
+  def geometryBytes(self, feature) -> bytes:
+    if isinstance(feature, DatasetFeature):
+      return feature.dataset.geometryBytes(feature.indx)
+
+    return bytes(feature.geometry().asWkb())
+
+  # writes the intersections of one shoreline with all transects
+  # ... one CoastCR like point per intersected transect, in transect order
+  # ... and one CoastSat like row of distances
+  def writeIntersections(self,
+    transects: List[QgsFeature],
+    transect_array: np.ndarray,
+    shoreline: QgsFeature,
+    distances: np.ndarray,
+    coastCR_writer: QgsVectorFileWriter,
+    coastSat_writer: QgsVectorFileWriter
+  ):
+    points = GeometryArrays.pointsAlong(transect_array, distances)
+
+    for indx in np.flatnonzero(~np.isnan(distances)):
+      # then write to CoastCR like writer
+      coastCR_fet = QgsFeature()
+      coastCR_fet.setAttributes([transects[indx].id(), shoreline.id(), float(distances[indx])])
+      coastCR_fet.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*points[indx])))
+
+      coastCR_writer.addFeature(coastCR_fet)
+      self.coastCR_wgs84.add(
+        points[indx],
+        {"ID_Profile": transects[indx].id(), "ID_Coast": shoreline.id(), "Distance": float(distances[indx])}
+      )
+
+    # then write intersection distances to CoastSat like writer  
+    coastSat_fet = QgsFeature()
+    coastSat_fet.setAttributes([shoreline['dates']] + distances.tolist())
+    coastSat_writer.addFeature(coastSat_fet)
+
+    found = int(np.count_nonzero(~np.isnan(distances)))
+    self.report.count("intersections", found)
+    self.report.count("nan_cells", len(distances) - found)
+    self.report.count("coastCR_features_written", found)
+    self.report.count("coastSat_rows_written")
+
+  # finds the intersections for all transects and shorelines using the
+  # ... batched segment intersection kernel in GeometryArrays instead of
+  # ... one QgsGeometry.intersection call per pair.
+  #
+  # writes the same CoastSat like and CoastCR like outputs as findIntersections
+  def findIntersectionsArrays(self,
+    transects: List[QgsFeature],
+    shorelines: List[QgsFeature],
+    coastCR_writer: QgsVectorFileWriter,
+    coastSat_writer: QgsVectorFileWriter
+  ):
+    transect_array = self.transectArray(transects)
+
+    with self.report.stage("kernel"):
+      for shoreline in shorelines:
+        segments = GeometryArrays.partsSegments(self.featureParts(shoreline))
+        distances = GeometryArrays.intersectSegments(transect_array, segments)
+
+        self.writeIntersections(
+          transects,
+          transect_array,
+          shoreline,
+          distances,
+          coastCR_writer,
+          coastSat_writer
+        )
 
     del coastCR_writer
     del coastSat_writer
     print('intesrect calculation done!')
 
+  # finds the intersections for all transects and shorelines across a pool
+  # ... of self.processes worker processes.
+  #
+  # every shoreline is independent, so the shorelines are sharded across the
+  # ... workers. workers only receive numpy arrays (the transects once, then
+  # ... blocks of shoreline segments) and run the GeometryArrays kernel, no QGIS
+  # ... objects are pickled. results come back in shoreline order so both
+  # ... outputs are written in the same order as a single process run
+  def findIntersectionsParallel(self,
+    transects: List[QgsFeature],
+    shorelines: List[QgsFeature],
+    coastCR_writer: QgsVectorFileWriter,
+    coastSat_writer: QgsVectorFileWriter
+  ):
+    transect_array = self.transectArray(transects)
+    shorelines_segments = [
+      GeometryArrays.partsSegments(self.featureParts(shoreline))
+      for shoreline in shorelines
+    ]
+
+    # a few blocks per worker keeps the workers busy when shorelines
+    # ... differ in size without sending one task per shoreline
+    block_size = max(1, len(shorelines) // (self.processes * 4))
+    shoreline_distances = GeometryArrays.parallelIntersect(
+      transect_array,
+      shorelines_segments,
+      processes=self.processes,
+      block_size=block_size
+    )
 
-  def run(self):
+    # cpu time of this stage does not include the worker processes
+    with self.report.stage("parallel_kernel"):
+      for (shoreline, distances) in zip(shorelines, shoreline_distances):
+        self.writeIntersections(
+          transects,
+          transect_array,
+          shoreline,
+          distances,
+          coastCR_writer,
+          coastSat_writer
+        )
+
+    del coastCR_writer
+    del coastSat_writer
+    print('intesrect calculation done!')
+
+  def loadLayers(self) -> Tuple[QgsVectorLayer, QgsVectorLayer]:
     # transects_layer = load transects layer
     # shorelines_layer = load shorelines layer
     transects_layer = QgsVectorLayer(
@@ -206,12 +532,43 @@ class IntersectFinder:
       "ogr"
     )
 
+    # the numpy engines reproject the coordinate arrays of the layers,
+    # ... see transectArray and shorelineParts
+    self.transects_crs = transects_layer.crs()
+    self.shorelines_crs = shorelines_layer.crs()
+
+    return transects_layer, shorelines_layer
+
+  def loadFeatures(self) -> Tuple[List[QgsFeature], List[QgsFeature]]:
+    if self.session is not None and self.intersectionFinder() != self.findIntersections:
+      # arrays of the session, read once per process and already in the crs of the run
+      self.transects_crs = self.crs
+      self.shorelines_crs = self.crs
+      return (
+        self.session.lines(self.transects_layer_filePath, crs=self.crs),
+        self.session.lines(self.shorelines_layer_filePath, ['dates'], crs=self.crs)
+      )
+
+    transects_layer, shorelines_layer = self.loadLayers()
+
+    # the qgis engine intersects the QgsGeometry of the features, so they
+    # ... are reprojected by the provider while they are read
+    request = QgsFeatureRequest()
+    if self.intersectionFinder() == self.findIntersections:
+      request.setDestinationCrs(self.crs, QgsProject.instance().transformContext())
+      self.transects_crs = self.crs
+      self.shorelines_crs = self.crs
+
     # transects = extract transect_layer features
-    transects = TransectUtility.extract_features(transects_layer) 
+    transects = TransectUtility.extract_features(transects_layer, request) 
 
     # shorelines = extract transect_layer features 
-    shorelines = TransectUtility.extract_features(shorelines_layer)
+    shorelines = TransectUtility.extract_features(shorelines_layer, request)
 
+    return transects, shorelines
+
+  # n_shorelines is the number of CoastSat like rows, needed up front by the matrix writer
+  def initWriters(self, transects: List[QgsFeature], n_shorelines: int) -> Tuple[FeatureSink, FeatureSink]:
     coastCR_fields = QgsFields()
     coastCR_fields.append(QgsField("ID_Profile", QVariant.Int))
     coastCR_fields.append(QgsField("ID_Coast", QVariant.Int))
@@ -219,15 +576,18 @@ class IntersectFinder:
 
     # initialize coastSat and CoastCR writers
     # !!! fix naming conventions
-    coastCR_writer = QgsVectorFileWriter(
-      self.coastCR_output_path + "/" + "coastCR_intersects.shp",
-      "UTF-8",
+    coastCR_writer = FeatureSink(
+      self.coastCR_filePath,
       coastCR_fields,
       QgsWkbTypes.Point,
-      srs = QgsProject.instance().crs(),
-      driverName="ESRI Shapefile"
+      self.crs,
+      output_format=self.output_format
     )
 
+    if self.coastSat_format == "matrix":
+      coastSat_writer = self.initMatrixWriter(self.coastSat_filePath, transects, n_shorelines)
+      return coastCR_writer, coastSat_writer
+
     coastSat_fields = QgsFields()
     coastSat_fields.append(QgsField("dates", QVariant.String))
     for transect in transects:
@@ -235,31 +595,288 @@ class IntersectFinder:
       # where each column is a transect and each row is the distance 
       # ... for a particular shoreline date
 
-    coastSat_writer = QgsVectorFileWriter(
-      self.coastSat_output_path + "/" + "coastSat_intersects.shp",
-      "UTF-8",
+    coastSat_writer = FeatureSink(
+      self.coastSat_filePath,
       coastSat_fields,
       QgsWkbTypes.Unknown,
-      srs = QgsProject.instance().crs(),
-      driverName="ESRI Shapefile"
+      self.crs,
+      output_format=self.output_format
+    )
+
+    return coastCR_writer, coastSat_writer
+
+  # CoastSat like writer of the matrix format, one row per shoreline.
+  # ... without a file path the rows are kept in memory
+  def initMatrixWriter(self, file_path: str, transects: List[QgsFeature], n_shorelines: int) -> IntersectMatrixWriter:
+    return IntersectMatrixWriter(
+      file_path,
+      n_shorelines,
+      ["T{tID}".format(tID=transect.id()) for transect in transects],
+      Reprojection.crsId(self.crs)
+    )
+
+  # picks the intersection engine of this run
+  def intersectionFinder(self):
+    if self.backend == "numpy" and self.processes > 1:
+      return self.findIntersectionsParallel
+    elif self.backend == "numpy":
+      return self.findIntersectionsArrays
+    else:
+      return self.findIntersections
+
+  # fingerprint of the whole transect set, any change to it invalidates every row
+  def transectsFingerprint(self, transects: List[QgsFeature]) -> str:
+    parts = []
+    for transect in transects:
+      parts.append(transect.id())
+      parts.append(self.geometryBytes(transect))
+
+    return IncrementalState.fingerprint(*parts)
+
+  # fingerprint and date of every shoreline, keyed by shoreline id (ID_Coast)
+  def shorelineFingerprints(self, shorelines: List[QgsFeature]) -> Tuple[dict, dict]:
+    fingerprints = {}
+    dates = {}
+    for shoreline in shorelines:
+      key = str(shoreline.id())
+      fingerprints[key] = self.shorelineFingerprint(shoreline)
+      dates[key] = str(shoreline['dates'])
+
+    return fingerprints, dates
+
+  def shorelineFingerprint(self, shoreline: QgsFeature) -> str:
+    return IncrementalState.fingerprint(
+      shoreline['dates'],
+      self.geometryBytes(shoreline)
     )
 
+  def saveState(self, transects: List[QgsFeature], shorelines: List[QgsFeature]):
+    fingerprints, dates = self.shorelineFingerprints(shorelines)
+    IncrementalState(self.state_filePath).save(
+      self.transectsFingerprint(transects),
+      fingerprints,
+      dates,
+      [str(shoreline.id()) for shoreline in shorelines]
+    )
+
+  # collects the CoastCR like points of a full run for their WGS84 copy
+  def initWgs84Copy(self):
+    self.coastCR_wgs84 = Wgs84Copy(self.coastCR_wgs84_filePath, "Point", self.crs)
+
+  def saveReport(self):
+    self.report.save(self.report_filePath)
+    print(self.report.summary())
+
+  def run(self):
+    with self.report.stage("load"):
+      transects, shorelines = self.loadFeatures()
+    coastCR_writer, coastSat_writer = self.initWriters(transects, len(shorelines))
+    self.initWgs84Copy()
+
     # to do: move finding and saving 
     # ... intersections to different methods?
     #
     # self.findIntersections finds and saves at the same time
     # ... fast but hard to read
-    self.findIntersections(
-      transects,
-      shorelines,
-      coastCR_writer,
-      coastSat_writer
-    )
+    with self.report.stage("intersect"):
+      findIntersections = self.intersectionFinder()
+      findIntersections(
+        transects,
+        shorelines,
+        coastCR_writer,
+        coastSat_writer
+      )
+
+    # flush both outputs before recording what they contain
+    with self.report.stage("flush"):
+      coastCR_writer.close()
+      coastSat_writer.close()
+      del coastCR_writer
+      del coastSat_writer
+      self.coastCR_wgs84.close()
+      self.saveState(transects, shorelines)
+
+    self.saveReport()
+
+  # shorelines of the shorelines layer one at a time, with their segments
+  # ... only the dates attribute is read
+  def streamShorelines(self, shorelines_layer: QgsVectorLayer) -> Iterator[Tuple[QgsFeature, np.ndarray]]:
+    request = QgsFeatureRequest().setSubsetOfAttributes(['dates'], shorelines_layer.fields())
+    for shoreline in shorelines_layer.getFeatures(request):
+      yield shoreline, GeometryArrays.partsSegments(self.shorelineParts(shoreline.geometry()))
+
+  # same outputs as run, but the shorelines are never held in memory together.
+  #
+  # the transects are loaded once as a (N, 2, 2) array, then every shoreline is
+  # ... read from the layer, intersected with the numpy kernel and written right
+  # ... away. the CoastCR writer flushes every batch_size points and the matrix
+  # ... writer is memory mapped, so memory stays flat however many dates there are.
+  # ... only the fingerprint and date of every shoreline are kept, for the state.
+  # ... it runs the numpy kernel in one process, any other setup is rejected
+  # ... rather than swapped for it
+  def runStreaming(self):
+    if self.backend != "numpy" or self.processes > 1:
+      raise Exception("streaming runs the numpy backend in one process, got the {b} backend with {p} processes".format(b=self.backend, p=self.processes))
+
+    with self.report.stage("load"):
+      transects_layer, shorelines_layer = self.loadLayers()
+      if self.session is not None:
+        # shorelines are still read one at a time, only the transects are shared
+        transects = self.session.lines(self.transects_layer_filePath, crs=self.crs)
+      else:
+        transects = TransectUtility.extract_features(transects_layer)
+      transect_array = self.transectArray(transects)
+
+    coastCR_writer, coastSat_writer = self.initWriters(transects, shorelines_layer.featureCount())
+    self.initWgs84Copy()
+
+    fingerprints = {}
+    dates = {}
+    with self.report.stage("stream"):
+      for (shoreline, segments) in self.streamShorelines(shorelines_layer):
+        distances = GeometryArrays.intersectSegments(transect_array, segments)
+        self.writeIntersections(
+          transects,
+          transect_array,
+          shoreline,
+          distances,
+          coastCR_writer,
+          coastSat_writer
+        )
+
+        key = str(shoreline.id())
+        fingerprints[key] = self.shorelineFingerprint(shoreline)
+        dates[key] = str(shoreline['dates'])
+
+    with self.report.stage("flush"):
+      coastCR_writer.close()
+      coastSat_writer.close()
+      self.coastCR_wgs84.close()
+      IncrementalState(self.state_filePath).save(self.transectsFingerprint(transects), fingerprints, dates, list(fingerprints))
 
-# -- run -- #
-ifn = IntersectFinder(
-  transect_fileName,    
-  shoreline_fileName
-)
+    print('intesrect calculation done!')
+    self.saveReport()
+
+  # finds intersections only for the shorelines that are new or changed since
+  # ... the last run and replaces their rows in the existing outputs.
+  #
+  # shorelines are matched by id and compared by date and geometry. rows of
+  # ... changed or removed shorelines are deleted from both outputs, by
+  # ... shoreline id (dates are not unique), and the rows of new or changed
+  # ... shorelines are added. the CoastSat like rows of a matrix are put back
+  # ... in the order of the shorelines layer, as a full run writes them. the
+  # ... CoastSat like rows of a shapefile or geopackage are appended at the end,
+  # ... out of date order. when the transects changed, or there is no previous
+  # ... run, this is a full run.
+  # ... the WGS84 copy of the CoastCR like points is only written by full runs
+  def runIncremental(self):
+    with self.report.stage("load"):
+      transects, shorelines = self.loadFeatures()
+
+    state = IncrementalState(self.state_filePath)
+    outputs_exist = os.path.isfile(self.coastSat_filePath) and os.path.isfile(self.coastCR_filePath)
+    if self.output_format not in FeatureSink.updatable_formats:
+      print('{f} outputs cannot be updated in place, finding all intersections'.format(f=self.output_format))
+      self.run()
+      return
+    # the shoreline of every CoastSat like row is needed to delete rows, older states did not record them
+    if not state.load() or not outputs_exist or state.rows is None or state.inputs != self.transectsFingerprint(transects):
+      print('no matching previous run, finding all intersections')
+      self.run()
+      return
+
+    with self.report.stage("diff"):
+      fingerprints, dates = self.shorelineFingerprints(shorelines)
+      changed, removed = state.diff(fingerprints)
+    self.report.count("shorelines_changed", len(changed))
+    self.report.count("shorelines_removed", len(removed))
+
+    if changed == [] and removed == []:
+      print('intersections are up to date')
+      self.saveReport()
+      return
+
+    stale = set(changed + removed)
+    # CoastSat like rows of the previous run that stay, and their shorelines
+    kept_rows = [row for (row, key) in enumerate(state.rows) if key not in stale]
+    rows = [state.rows[row] for row in kept_rows]
+
+    coastCR_layer = QgsVectorLayer(self.coastCR_filePath, "coastCR_intersects", "ogr")
+    coastCR_provider = coastCR_layer.dataProvider()
+
+    coastCR_provider.deleteFeatures([
+      feature.id() for feature in coastCR_layer.getFeatures()
+      if str(feature['ID_Coast']) in stale
+    ])
+    changed_shorelines = [shoreline for shoreline in shorelines if str(shoreline.id()) in changed]
+
+    if self.coastSat_format == "matrix":
+      # the matrix is rewritten once, the rows of the changed shorelines
+      # ... are collected in memory first
+      coastSat_matrix = IntersectMatrix.load(self.coastSat_filePath)
+      if len(coastSat_matrix.dates) != len(state.rows):
+        raise Exception("{fp} has {n} rows, the previous run wrote {m}".format(fp=self.coastSat_filePath, n=len(coastSat_matrix.dates), m=len(state.rows)))
+      coastSat_matrix = coastSat_matrix.takeRows(kept_rows)
+      coastSat_writer = self.initMatrixWriter(None, transects, len(changed_shorelines))
+    else:
+      # features come in the order they were written, one per row of the previous run
+      coastSat_layer = QgsVectorLayer(self.coastSat_filePath, "coastSat_intersects", "ogr")
+      if coastSat_layer.featureCount() != len(state.rows):
+        raise Exception("{fp} has {n} rows, the previous run wrote {m}".format(fp=self.coastSat_filePath, n=coastSat_layer.featureCount(), m=len(state.rows)))
+      coastSat_writer = coastSat_layer.dataProvider()
+      coastSat_writer.deleteFeatures([
+        feature.id() for (row, feature) in enumerate(coastSat_layer.getFeatures())
+        if state.rows[row] in stale
+      ])
+
+    # data providers are feature sinks, same as the file writers of a full run
+    with self.report.stage("intersect"):
+      findIntersections = self.intersectionFinder()
+      findIntersections(
+        transects,
+        changed_shorelines,
+        coastCR_provider,
+        coastSat_writer
+      )
+
+    rows += [str(shoreline.id()) for shoreline in changed_shorelines]
+    if self.coastSat_format == "matrix":
+      # back in the order of the shorelines layer
+      order = {str(shoreline.id()): position for (position, shoreline) in enumerate(shorelines)}
+      sorted_rows = sorted(range(len(rows)), key=lambda row: order[rows[row]])
+      coastSat_matrix = coastSat_matrix.appendRows(coastSat_writer.toMatrix()).takeRows(sorted_rows)
+      coastSat_matrix.save(self.coastSat_filePath)
+      rows = [rows[row] for row in sorted_rows]
+    else:
+      del coastSat_layer
+
+    del coastCR_layer
+    state.save(state.inputs, fingerprints, dates, rows)
+    print('{changed} new or changed and {removed} removed shorelines updated'.format(
+      changed=len(changed),
+      removed=len(removed)
+    ))
+    self.saveReport()
+
+def main():
+  ifn = IntersectFinder(
+    transect_fileName,    
+    shoreline_fileName,
+    backend=backend,
+    processes=processes,
+    coastSat_format=coastSat_format,
+    output_format=output_format,
+    wgs84=wgs84
+  )
+
+  if incremental:
+    ifn.runIncremental()
+  elif streaming:
+    ifn.runStreaming()
+  else:
+    ifn.run()
 
-ifn.run()
+# -- run -- #
+# ... only when executed as a script (e.g. from the QGIS python console)
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,313 @@
+import json
+import os
+
+from typing import List
+
+import numpy as np
+
+'''
+  on disk format of the dates x transects distance matrix (the CoastSat like table)
+
+    <name>.npy   float64 matrix, dates x transects, stored column major so that
+                 every transect is one contiguous block of the file
+    <name>.json  metadata sidecar
+                 {"dates": [...], "transects": [...], "crs": "EPSG:3124", "shape": [dates, transects]}
+
+  the matrix is memory mapped when loaded, so opening a large AOI takes constant
+  time and slicing a range of transects only reads that range from disk.
+
+  unlike the wide CoastSat shapefile there is no limit on the number of transects
+  (the DBF format allows at most 255 fields) and no text parsing.
+'''
+
+class IntersectMatrix:
+  def __init__(self, dates: List[str], transects: List[str], distances: np.ndarray, crs: str = None) -> None:
+    self.dates = [str(date) for date in dates]
+    self.transects = [str(transect) for transect in transects]
+    self.distances = distances
+    self.crs = crs
+
+    if self.distances.shape != (len(self.dates), len(self.transects)):
+      raise Exception("matrix shape {shape} does not match {d} dates and {t} transects".format(
+        shape=self.distances.shape,
+        d=len(self.dates),
+        t=len(self.transects)
+      ))
+
+  @classmethod
+  def paths(cls, path: str):
+    '''
+      .npy and .json paths of a matrix, path may be given with or without extension
+    '''
+    base, extension = os.path.splitext(path)
+    if extension not in ('.npy', '.json'):
+      base = path
+
+    return base + '.npy', base + '.json'
+
+  @classmethod
+  def writeMetadata(cls, path: str, dates: List[str], transects: List[str], crs: str = None):
+    _, json_path = cls.paths(path)
+    with open(json_path, 'w') as metadata_file:
+      json.dump(
+        {
+          'dates': [str(date) for date in dates],
+          'transects': [str(transect) for transect in transects],
+          'crs': crs,
+          'shape': [len(dates), len(transects)]
+        },
+        metadata_file
+      )
+
+  def save(self, path: str):
+    npy_path, _ = self.paths(path)
+    matrix = np.lib.format.open_memmap(
+      npy_path,
+      mode='w+',
+      dtype=np.float64,
+      shape=self.distances.shape,
+      fortran_order=True
+    )
+    matrix[:] = self.distances
+    matrix.flush()
+    del matrix
+
+    self.writeMetadata(path, self.dates, self.transects, self.crs)
+
+  @classmethod
+  def load(cls, path: str, mmap: bool = True) -> 'IntersectMatrix':
+    npy_path, json_path = cls.paths(path)
+    with open(json_path) as metadata_file:
+      metadata = json.load(metadata_file)
+
+    distances = np.load(npy_path, mmap_mode='r' if mmap else None)
+    return cls(metadata['dates'], metadata['transects'], distances, metadata.get('crs'))
+
+  def takeRows(self, rows) -> 'IntersectMatrix':
+    '''
+      the matrix of the given rows, in the given order (read into memory)
+    '''
+    rows = np.asarray(rows, dtype=int)
+    return IntersectMatrix([self.dates[row] for row in rows], self.transects, np.asarray(self.distances)[rows], self.crs)
+
+  def appendRows(self, other: 'IntersectMatrix') -> 'IntersectMatrix':
+    if other.transects != self.transects:
+      raise Exception("cannot append rows of a different transect set")
+
+    return IntersectMatrix(
+      self.dates + other.dates,
+      self.transects,
+      np.concatenate([np.asarray(self.distances), np.asarray(other.distances)]),
+      self.crs
+    )
+
+  @classmethod
+  def readTableChunks(cls, path: str, chunk_rows: int):
+    '''
+      the table of readTable in DataFrames of at most chunk_rows dates,
+      only one chunk is in memory at a time
+    '''
+    if cls.isMatrixPath(path):
+      matrix = cls.load(path)
+      for start in range(0, len(matrix.dates), chunk_rows):
+        yield matrix.sliceDates(start, start + chunk_rows).toDataFrame()
+      return
+
+    import pandas as pd
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+      yield chunk
+
+  @classmethod
+  def isMatrixPath(cls, path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in ('.npy', '.json')
+
+  @classmethod
+  def readTable(cls, path: str):
+    '''
+      the CoastSat like table of a .csv or an IntersectMatrix file as a DataFrame
+    '''
+    if cls.isMatrixPath(path):
+      return cls.load(path).toDataFrame()
+
+    import pandas as pd
+    return pd.read_csv(path)
+
+  def sliceTransects(self, start: int, stop: int) -> 'IntersectMatrix':
+    '''
+      the matrix of a range of transects. on a memory mapped matrix this is
+      a view, only the pages of the range are read when it is used
+    '''
+    return IntersectMatrix(self.dates, self.transects[start:stop], self.distances[:, start:stop], self.crs)
+
+  def sliceDates(self, start: int, stop: int) -> 'IntersectMatrix':
+    '''
+      the matrix of a range of dates. rows are strided in the column major
+      file, prefer sliceTransects for large reads
+    '''
+    return IntersectMatrix(self.dates[start:stop], self.transects, self.distances[start:stop], self.crs)
+
+  # --- conversion from and to the existing layouts --- #
+
+  def toDataFrame(self):
+    '''
+      the CoastSat like table: a dates column then one column per transect
+    '''
+    import pandas as pd
+
+    table = pd.DataFrame(np.asarray(self.distances), columns=self.transects)
+    table.insert(0, 'dates', self.dates)
+    return table
+
+  @classmethod
+  def fromDataFrame(cls, table, crs: str = None) -> 'IntersectMatrix':
+    return cls(
+      table['dates'].astype(str).tolist(),
+      list(table.columns[1:]),
+      table[table.columns[1:]].to_numpy(dtype=float),
+      crs
+    )
+
+  @classmethod
+  def fromCSV(cls, csv_path: str, crs: str = None) -> 'IntersectMatrix':
+    import pandas as pd
+
+    return cls.fromDataFrame(pd.read_csv(csv_path), crs)
+
+  def toCSV(self, csv_path: str):
+    self.toDataFrame().to_csv(csv_path, index=False)
+
+  @classmethod
+  def fromShp(cls, shp_path: str) -> 'IntersectMatrix':
+    '''
+      reads a coastSat_intersects.shp written by IntersectFinder (needs QGIS)
+    '''
+    from qgis.core import NULL, QgsVectorLayer
+
+    layer = QgsVectorLayer(shp_path, 'coastSat_intersects', 'ogr')
+    field_names = layer.fields().names()
+    transects = field_names[1:]
+
+    dates = []
+    rows = []
+    for feature in layer.getFeatures():
+      attributes = feature.attributes()
+      dates.append(attributes[0])
+      rows.append([
+        np.nan if value is None or value == NULL else float(value)
+        for value in attributes[1:]
+      ])
+
+    distances = np.array(rows, dtype=float).reshape(len(dates), len(transects))
+    return cls(dates, transects, distances, layer.crs().authid() or None)
+
+  def toShp(self, shp_path: str):
+    '''
+      writes the CoastSat like shapefile of IntersectFinder (needs QGIS).
+      limited to 254 transects by the DBF format
+    '''
+    from qgis.core import QgsCoordinateReferenceSystem, QgsFeature, QgsField, QgsFields, QgsVectorFileWriter, QgsWkbTypes
+    from qgis.PyQt.QtCore import QVariant
+
+    fields = QgsFields()
+    fields.append(QgsField('dates', QVariant.String))
+    for transect in self.transects:
+      fields.append(QgsField(transect, QVariant.Double))
+
+    writer = QgsVectorFileWriter(
+      shp_path,
+      'UTF-8',
+      fields,
+      QgsWkbTypes.Unknown,
+      srs=QgsCoordinateReferenceSystem(self.crs or ''),
+      driverName='ESRI Shapefile'
+    )
+    for (date, row) in zip(self.dates, np.asarray(self.distances)):
+      feature = QgsFeature()
+      feature.setAttributes([date] + row.tolist())
+      writer.addFeature(feature)
+
+    del writer
+
+  @classmethod
+  def convert(cls, input_path: str, output_path: str, crs: str = None):
+    '''
+      converts between .csv, .shp and .npy (this format) by file extension
+    '''
+    input_extension = os.path.splitext(input_path)[1].lower()
+    if input_extension == '.csv':
+      matrix = cls.fromCSV(input_path, crs)
+    elif input_extension == '.shp':
+      matrix = cls.fromShp(input_path)
+    else:
+      matrix = cls.load(input_path)
+
+    if crs is not None:
+      matrix.crs = crs
+
+    output_extension = os.path.splitext(output_path)[1].lower()
+    if output_extension == '.csv':
+      matrix.toCSV(output_path)
+    elif output_extension == '.shp':
+      matrix.toShp(output_path)
+    else:
+      matrix.save(output_path)
+
+class IntersectMatrixWriter:
+  '''
+    writes CoastSat like rows into an IntersectMatrix file as they are produced.
+    has the addFeature method of the QGIS file writers, so it can be handed to
+    IntersectFinder in place of the CoastSat shapefile writer. every feature is
+    expected to have the attributes [date, distance_1, ... distance_n].
+
+    the number of rows must be known up front, rows are filled in order.
+    without a path the rows are kept in memory, see toMatrix.
+  '''
+  def __init__(self, path: str, n_dates: int, transects: List[str], crs: str = None) -> None:
+    self.path = path
+    self.transects = [str(transect) for transect in transects]
+    self.crs = crs
+    self.dates: List[str] = []
+
+    if path is None:
+      self.matrix = np.full((n_dates, len(self.transects)), np.nan)
+      return
+
+    npy_path, _ = IntersectMatrix.paths(path)
+    self.matrix = np.lib.format.open_memmap(
+      npy_path,
+      mode='w+',
+      dtype=np.float64,
+      shape=(n_dates, len(self.transects)),
+      fortran_order=True
+    )
+
+  def addRow(self, date: str, distances):
+    self.matrix[len(self.dates)] = np.asarray(distances, dtype=float)
+    self.dates.append(str(date))
+
+  def addFeature(self, feature, *args) -> bool:
+    attributes = feature.attributes()
+    self.addRow(attributes[0], [np.nan if value is None else value for value in attributes[1:]])
+    return True
+
+  def toMatrix(self) -> IntersectMatrix:
+    '''
+      the rows written so far
+    '''
+    return IntersectMatrix(self.dates, self.transects, np.asarray(self.matrix[:len(self.dates)]), self.crs)
+
+  def close(self):
+    if self.matrix is None or self.path is None:
+      return
+
+    if len(self.dates) != self.matrix.shape[0]:
+      raise Exception("{n} of {m} rows written to {path}".format(n=len(self.dates), m=self.matrix.shape[0], path=self.path))
+
+    self.matrix.flush()
+    self.matrix = None
+    IntersectMatrix.writeMetadata(self.path, self.dates, self.transects, self.crs)
+
+  def __del__(self):
+    # same as the QGIS writers, the output is finished when the writer is deleted
+    if getattr(self, 'matrix', None) is not None and self.path is not None and len(self.dates) == self.matrix.shape[0]:
+      self.close()
@@ -1,9 +1,29 @@
+import itertools
+import numpy as np
 import pandas as pd
 import os.path
-import math
-from qgis.PyQt.QtCore import QVariant
 
-from qgis.core import *
+try:
+  from .RatesEngine import RatesEngine
+  from .RatesAccumulator import RatesAccumulator
+  from .RatesBootstrap import RatesBootstrap
+  from .IntersectMatrix import IntersectMatrix
+  from .Reprojection import Reprojection, Wgs84Copy
+  from .RunReport import RunReport
+  from .Session import DatasetFeature, LineDataset, Session
+  from .TiledRates import TiledRates
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from RatesEngine import RatesEngine
+  from RatesAccumulator import RatesAccumulator
+  from RatesBootstrap import RatesBootstrap
+  from IntersectMatrix import IntersectMatrix
+  from Reprojection import Reprojection, Wgs84Copy
+  from RunReport import RunReport
+  from Session import DatasetFeature, LineDataset, Session
+  from TiledRates import TiledRates
+
+# qgis is only imported by the methods that read or write shapefiles
+# ... so rates can be computed where QGIS is not installed
 
 ### PUT VALUES HERE ###
 
@@ -22,29 +42,77 @@ from qgis.core import *
   ensure that all these folders are present
 '''
 
-intersects_filename = 'intersects.csv'  # csv
+intersects_filename = 'intersects.csv'  # csv, or .npy of the IntersectMatrix format
 transects_filename = 'transects_landward_baseline0.shp'   # shp
+uncertainty_filename = 'shorelines_processed.csv'   # csv, Date and Uncertainty of every shoreline
+bootstrap_replicates = 0  # more than 0 adds bootstrap standard errors and confidence bounds of LRR and WLR
+tiled = False  # compute the rates in tiles of transects, for tables that do not fit in memory
+memory_budget_mb = 1024  # memory of a tile in tiled runs
+wgs84 = False  # also write a WGS84 geojson copy of the rates shapefile
 ### END ###
 
 class MetricsCalculator:
-  def __init__(self) -> None:
-    self.intersects: pd.DataFrame 
-    self.transects: QgsVectorLayer
-    self.homePath: str = QgsProject.instance().homePath()
-    self.output_dir: str = QgsProject.instance().homePath() + '/rates/'
+  # confidence level of the bootstrap bounds, and seed of the resampling
+  # ... so the bounds of a run can be reproduced
+  confidence_level = 0.95
+  bootstrap_seed = 0
+
+  def __init__(self, project_path: str = None, crs = None, report: RunReport = None, output_format: str = 'shp', wgs84: bool = False, session: Session = None) -> None:
+    '''
+      project_path: folder of the project structure above,
+        defaults to the folder of the open QGIS project
+      crs: QgsCoordinateReferenceSystem (or "EPSG:..." string) of the rates
+        shapefile, defaults to the crs of the transects layer. transects in
+        another crs are reprojected to it
+      report: RunReport of the timings and counters of a run,
+        written to rates/output/metrics_report.json
+      output_format: shp, gpkg, fgb or parquet, format of the rates
+        vector output, see FeatureSink
+      wgs84: also write rates/output/normals_rates_wgs84.geojson with the
+        rates shapefile
+      session: Session of the process, the intersects table and the transects
+        are then taken from it instead of read again
+    '''
+    if project_path is None:
+      from qgis.core import QgsProject
+      project_path = QgsProject.instance().homePath()
 
-  def loadLayers(self, intersects_filename: str, transects_filename: str):
+    self.intersects: pd.DataFrame 
+    self.intersects_filePath: str = None
+    self.transects = None # QgsVectorLayer (LineDataset with a session), loaded when the rates shapefile is written
+    self.transects_filePath: str = None
+    self.uncertainty: pd.DataFrame = None
+    self.crs = crs
+    self.homePath: str = project_path
+    self.output_dir: str = os.path.join(project_path, 'rates', 'output', '')
+
+    # per transect sufficient statistics kept between runs by updateRates
+    self.accumulator_filePath: str = self.output_dir + 'normals_rates_state.npz'
+
+    self.report: RunReport = report if report is not None else RunReport('metrics')
+    self.report_filePath: str = self.output_dir + 'metrics_report.json'
+    self.output_format: str = output_format
+    self.wgs84: bool = wgs84
+    self.rates_wgs84: Wgs84Copy = None
+    self.session: Session = session
+
+  def loadLayers(self, intersects_filename: str, transects_filename: str, uncertainty_filename: str = None, read_intersects: bool = True):
     '''
       loads necessary files for computation 
-      intersects_filename: points to a csv file of all intersects with transects
+      intersects_filename: points to a csv file of all intersects with transects,
+        or to an IntersectMatrix (.npy) of the same table
       transects_filename: points to a shp of all transects 
+      uncertainty_filename: optional, points to a csv file of the Date and Uncertainty
+        of every shoreline. needed for EPRunc and WLR
+      read_intersects: False leaves the intersects table on disk, for runTiled
 
       assumed locations:
         intersects is assumed to be in intersects folder
         transects is assumed to be in transects folder
+        uncertainty is assumed to be in shorelines folder
     '''
-    intersects_filePath = self.homePath+'/intersects/'+intersects_filename
-    transects_filePath = self.homePath+'/transects/'+transects_filename
+    intersects_filePath = os.path.join(self.homePath, 'intersects', intersects_filename)
+    transects_filePath = os.path.join(self.homePath, 'transects', transects_filename)
 
     # check if file exists
     if os.path.isfile(intersects_filePath) == False:
@@ -56,100 +124,187 @@ class MetricsCalculator:
 
     # note this later
     # self.intersects = pd.read_csv(intersects_filePath, index_col=0)
-    self.intersects = pd.read_csv(intersects_filePath)
-    self.transects = QgsVectorLayer(transects_filePath)
+    self.intersects_filePath = intersects_filePath
+    if read_intersects and self.session is not None:
+      self.intersects = self.session.table(intersects_filePath).toDataFrame()
+    elif read_intersects:
+      self.intersects = IntersectMatrix.readTable(intersects_filePath)
+    self.transects_filePath = transects_filePath
+
+    if uncertainty_filename is not None:
+      uncertainty_filePath = os.path.join(self.homePath, 'shorelines', uncertainty_filename)
+      if os.path.isfile(uncertainty_filePath) == False:
+        print("warning! {fn} does not exist".format(fn=uncertainty_filePath))
+      else:
+        self.uncertainty = pd.read_csv(uncertainty_filePath)
+
+  def intersectMatrix(self):
+    '''
+      the years and the dates x transects distance matrix of the intersects
+      table as arrays. one column per transect in transect_rates
+    '''
+    years = self.intersects['dates'].to_numpy(dtype=float)
+    distances = self.intersects[self.transect_rates['Normal']].to_numpy(dtype=float)
+
+    return years, distances
 
-  def calcNSM(self, row: pd.Series):
+  def calcNSM(self):
     '''
       youngest_position_intersect - oldest_position_intersect 
       negative if youngest position is closer to transect origin than oldest position
       which signifies the occurence of regression
     '''
-    transectName = row['Normal']
-    youngest_position = self.intersects.loc[self.intersects['dates'] == max(self.intersects['dates'])][transectName].iloc[0]
-    oldest_position = self.intersects.loc[self.intersects['dates'] == min(self.intersects['dates'])][transectName].iloc[0]
+    return RatesEngine.calcNSM(*self.intersectMatrix())
 
-    return youngest_position - oldest_position
+  def calcSCE(self):
+    return RatesEngine.calcSCE(*self.intersectMatrix())
 
-  def calcSCE(self, row: pd.Series):
-    transectName = row['Normal']
-    return max(self.intersects[transectName]) - min(self.intersects[transectName])
+  def calcEPR(self):
+    return RatesEngine.calcEPR(*self.intersectMatrix())
 
-  def calcLRR(self, row: pd.Series):
-    transectName = row['Normal']
+  def calcLRR(self):
+    return RatesEngine.calcLRR(*self.intersectMatrix())
 
-    intersect_table = pd.DataFrame()
-    intersect_table['x'] = self.intersects['dates']
-    intersect_table['y'] = self.intersects[transectName]
-    intersect_table['xy'] = intersect_table['x'] * intersect_table['y'] 
-    intersect_table['x_squared'] = intersect_table['x'] ** 2
+  def dateUncertainty(self):
+    '''
+      uncertainty of the shoreline of every row of the intersects table,
+      matched by date with the uncertainty table
+    '''
+    if self.uncertainty is None:
+      return None
 
-    # set number of rows (intersections as n)
-    n_intersects = intersect_table.shape[0]
+    uncertainty = pd.Series(
+      self.uncertainty['Uncertainty'].to_numpy(dtype=float),
+      index=pd.to_datetime(self.uncertainty['Date'], dayfirst=True)
+    )
+    row_uncertainty = uncertainty.reindex(self.intersect_dates)
 
-    sumX = intersect_table['x'].sum()
-    sumY = intersect_table['y'].sum()
-    sumX_squared = intersect_table['x_squared'].sum()
-    sumXY = intersect_table['xy'].sum()
-    squared_sumX = sumX**2
+    if row_uncertainty.isna().any():
+      missing = self.intersect_dates[row_uncertainty.isna().to_numpy()]
+      raise Exception("no uncertainty for shoreline dates {dates}".format(dates=list(missing.strftime('%d/%m/%Y'))))
 
-    m = ((n_intersects*sumXY)-(sumX * sumY))/((n_intersects*sumX_squared) - (squared_sumX))
-    return m # slope
+    return row_uncertainty.to_numpy()
 
   def calcWLRR(self):
-    pass
+    '''
+      weighted linear regression rate, every shoreline weighted by 1 / uncertainty^2
+    '''
+    return RatesEngine.calcWLR(*self.intersectMatrix(), self.dateUncertainty())
 
   def toShp(self, rates: pd.DataFrame):
     '''
       turns shp file into a normal rates shape file.
       give geometry
     '''
+    writer, transect_features = self.initRatesWriter(rates.columns)
+    self.writeRatesFeatures(writer, transect_features, rates)
+    writer.close()
+    self.rates_wgs84.close()
+
+  def initRatesWriter(self, columns):
+    '''
+      the normals_rates vector writer of the given rates columns, and an
+      iterator over the transects whose geometries the rates take, in order.
+      also starts the WGS84 copy of the rates, closed with the writer
+    '''
+    from qgis.core import QgsCoordinateReferenceSystem, QgsField, QgsFields, QgsProject, QgsVectorLayer, QgsWkbTypes
+    from qgis.PyQt.QtCore import QVariant
+    try:
+      from .FeatureSink import FeatureSink
+    except ImportError: # run as a script, e.g. from the QGIS python console
+      from FeatureSink import FeatureSink
+
+    if self.transects is None and self.session is not None:
+      # in the crs of the rates when given, so the stages share one dataset
+      self.transects = self.session.lines(self.transects_filePath, crs=self.crs)
+    elif self.transects is None:
+      self.transects = QgsVectorLayer(self.transects_filePath)
+    if self.crs is None:
+      self.crs = self.transects.crs()
+    if isinstance(self.crs, str):
+      self.crs = QgsCoordinateReferenceSystem(self.crs)
+    if not self.crs.isValid():
+      self.crs = QgsProject.instance().crs()
+    self.rates_wgs84 = Wgs84Copy(self.output_dir + 'normals_rates_wgs84.geojson' if self.wgs84 else None, 'LineString', self.crs)
 
     fields = QgsFields()
-    fields.append(QgsField(rates.columns[0], QVariant.String))
-    for col in rates.columns[1:]:
+    fields.append(QgsField(columns[0], QVariant.String))
+    for col in columns[1:]:
       fields.append(QgsField(col, QVariant.Double))
 
-    writer = QgsVectorFileWriter(
-      self.output_dir + 'normal_rates.shp',
-      'UTF-8', 
+    writer = FeatureSink(
+      self.output_dir + 'normals_rates',
       fields,
       QgsWkbTypes.LineString, 
-      srs=QgsProject.instance().crs(),
-      driverName="ESRI Shapefile"
+      self.crs,
+      output_format=self.output_format
     )
 
-    transect_rates = []
-    for row in rates.iterrows():
-      transect_rates.append(row[1].tolist())
+    if isinstance(self.transects, LineDataset):
+      return writer, iter(self.transects)
+    return writer, iter(self.transects.getFeatures())
 
-    # get geometries of transects
-    print(self.transects)
-    transect_geoms = [transect.geometry() for transect in self.transects.getFeatures()]
-
-    # get max geometry
-    # for visualizing different rates
-    # ...
-
-    for transect_attrs in zip(transect_geoms, transect_rates):
-      geom = transect_attrs[0]
-      attrs = transect_attrs[1]
+  def writeRatesFeatures(self, writer, transect_features, rates: pd.DataFrame):
+    '''
+      writes the rows of rates with the geometries of the next transects.
+      transects in another crs than the rates, and the transects of a
+      session, are reprojected (rebuilt), every vertex of the rows in one
+      batched transform
+    '''
+    from qgis.core import QgsFeature, QgsGeometry, QgsPointXY
+    try:
+      from .TransectGenerator import TransectUtility
+    except ImportError: # run as a script, e.g. from the QGIS python console
+      from TransectGenerator import TransectUtility
+
+    # rows as plain lists, without a Series per row
+    names = rates[rates.columns[0]].astype(str).tolist()
+    values = rates[rates.columns[1:]].to_numpy(dtype=float).tolist()
+    # islice, not zip, so the transect after the last row stays for the next tile
+    transects = list(itertools.islice(transect_features, len(names)))
+
+    lines = None
+    if self.wgs84 or isinstance(self.transects, LineDataset) or not Reprojection.isSame(self.transects.crs(), self.crs):
+      lines = Reprojection.transformLines(
+        [
+          transect.parts() if isinstance(transect, DatasetFeature) else TransectUtility.geometryParts(transect.geometry())
+          for transect in transects
+        ],
+        self.transects.crs(),
+        self.crs
+      )
+
+    for (indx, (transect, name, row)) in enumerate(zip(transects, names, values)):
       fet = QgsFeature()
 
-      fet.setGeometry(geom)
-      fet.setAttributes(attrs)
+      if lines is None:
+        fet.setGeometry(transect.geometry())
+      else:
+        fet.setGeometry(QgsGeometry.fromMultiPolylineXY([[QgsPointXY(x, y) for (x, y) in part] for part in lines[indx]]))
+      fet.setAttributes([name] + row)
 
       writer.addFeature(fet)
-    
-    del writer
+      self.report.count('shp_features_written')
+
+    if self.wgs84:
+      # nan is not valid json, rates without a value are null
+      columns = rates.columns.tolist()
+      for (line, name, row) in zip(lines, names, values):
+        properties = {columns[0]: name}
+        properties.update({column: (None if np.isnan(value) else value) for (column, value) in zip(columns[1:], row)})
+        self.rates_wgs84.add(np.concatenate(line), properties)
 
   def toCSV(self, rates: pd.DataFrame):
-    output = self.output_dir + '/normal_rates.csv' 
+    output = self.output_dir + 'normals_rates.csv' 
     rates.to_csv(output)
 
   def summarize(self, rates: pd.DataFrame):
-    summary = rates.describe()
-    output = self.output_dir + '/summary.csv' 
+    '''
+      summary statistics of every metric, same layout as the CoastCR summary
+    '''
+    summary = RatesEngine.summarize({col: rates[col].to_numpy(dtype=float) for col in rates.columns[1:]})
+    summary = pd.DataFrame.from_dict(summary, orient='index')
+    output = self.output_dir + 'normals_rates_summary.csv' 
     summary.to_csv(output)
 
   def setupTransects(self):
@@ -157,37 +312,223 @@ class MetricsCalculator:
 
   def setupIntersects(self) -> pd.DataFrame:
     transect_rates = pd.DataFrame()
-    
-    print(self.intersects.columns)
 
     # prepreocess intersects
-    self.intersects['dates'] = pd.to_datetime(self.intersects['dates'])
-    oldest_date = min(self.intersects['dates']).to_pydatetime()
-    self.intersects['dates'] = [  (date_.to_pydatetime() - oldest_date).days/365 for date_ in self.intersects['dates'] ]
+    self.intersect_dates = pd.DatetimeIndex(pd.to_datetime(self.intersects['dates'], dayfirst=True))
+    self.intersects['dates'] = RatesEngine.yearsSince(self.intersect_dates.to_numpy())
 
+    # same columns as the CoastCR normals_rates output
     transect_rates['Normal'] = self.intersects.columns[1:] 
-    transect_rates['NSM'] = [math.nan for i in transect_rates['Normal']]
-    transect_rates['SCE'] = [math.nan for i in transect_rates['Normal']]
-    transect_rates['LRR'] = [math.nan for i in transect_rates['Normal']]
-    transect_rates['WLRR'] = [math.nan for i in transect_rates['Normal']]
+    for metric in ['NSM', 'EPR', 'EPRunc', 'SCE', 'LRR', 'LR2', 'WLR', 'WR2']:
+      transect_rates[metric] = np.nan
 
     return transect_rates
   
-  def run(self):
+  def run(self, write_shp: bool = True, bootstrap_replicates: int = 0, processes: int = 1):
+    '''
+      write_shp: also write the rates shapefile, the only output that needs QGIS
+      bootstrap_replicates: number of bootstrap resamples of the shoreline dates,
+        more than 0 adds LRR_SE, LRR_lo and LRR_hi (and the same for WLR, with
+        uncertainties) next to the rates, see RatesBootstrap
+      processes: worker processes of the bootstrap
+    '''
     # set_up intersects dataframe 
-    self.transect_rates = self.setupIntersects()
+    with self.report.stage('setup'):
+      self.transect_rates = self.setupIntersects()
+
+    # all metrics are computed on the whole intersect matrix at once
+    # ... EPRunc, WLR and WR2 need the shoreline uncertainties
+    with self.report.stage('rates'):
+      years, distances = self.intersectMatrix()
+      rates = RatesEngine.compute(years, distances, self.dateUncertainty())
+      for (metric, values) in rates.items():
+        self.transect_rates[metric] = values
+
+    if bootstrap_replicates > 0:
+      with self.report.stage('bootstrap'):
+        intervals = RatesBootstrap.compute(
+          years,
+          distances,
+          self.dateUncertainty(),
+          n_replicates=bootstrap_replicates,
+          level=self.confidence_level,
+          seed=self.bootstrap_seed,
+          processes=processes
+        )
+        for (metric, values) in intervals.items():
+          self.transect_rates[metric] = values
+      self.report.count('bootstrap_replicates', bootstrap_replicates)
+
+    self.report.count('transects', distances.shape[1])
+    self.report.count('dates', distances.shape[0])
+    self.report.count('nan_cells', int(pd.isna(distances).sum()))
+    for (metric, values) in rates.items():
+      self.report.count('nan_' + metric, int(pd.isna(values).sum()))
+
+    os.makedirs(self.output_dir, exist_ok=True)
+    with self.report.stage('write'):
+      if write_shp:
+        self.toShp(self.transect_rates)
+      self.toCSV(self.transect_rates)
+      self.summarize(self.transect_rates)
 
-    self.transect_rates['NSM'] = self.transect_rates.apply(self.calcNSM, axis=1)
-    self.transect_rates['SCE'] = self.transect_rates.apply(self.calcSCE, axis=1)
-    self.transect_rates['LRR'] = self.transect_rates.apply(self.calcLRR, axis=1)
-    # self.transect_rates['WLRR'] = self.transect_rates.apply(self.calcWLRR, axis=1)
+    print('calculations done')
+    self.report.save(self.report_filePath)
+    print(self.report.summary())
 
-    self.toShp(self.transect_rates)
-    self.toCSV(self.transect_rates)
-    self.summarize(self.transect_rates)
+  def runTiled(self, write_shp: bool = True, memory_budget: int = 2 ** 30, processes: int = 1, bootstrap_replicates: int = 0):
+    '''
+      same outputs as run for an intersects table that does not fit in memory.
+      the table loaded by loadLayers(..., read_intersects=False) is read in tiles
+      of transects (see TiledRates), processes tiles at a time, and the rates of
+      every tile are appended to normals_rates.csv and the rates shapefile as
+      soon as they are done. only the per transect rates are kept, for the summary
+
+      memory_budget: bytes of a tile and its temporaries
+    '''
+    with self.report.stage('setup'):
+      dates, transects = TiledRates.tableIndex(self.intersects_filePath)
+      self.intersect_dates = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates), dayfirst=True))
+      years = RatesEngine.yearsSince(self.intersect_dates.to_numpy())
+      uncertainty = self.dateUncertainty()
+
+    bootstrap = None
+    if bootstrap_replicates > 0:
+      bootstrap = {'n_replicates': bootstrap_replicates, 'level': self.confidence_level, 'seed': self.bootstrap_seed}
+      self.report.count('bootstrap_replicates', bootstrap_replicates)
+
+    os.makedirs(self.output_dir, exist_ok=True)
+    writer = None
+    transect_features = None
+    tile_rates = []
+
+    # written to a temporary file first, so a failed tile never
+    # ... leaves a truncated normals_rates.csv behind
+    csv_file_path = self.output_dir + 'normals_rates.csv'
+    with self.report.stage('tiles'), open(csv_file_path + '.tmp', 'w', newline='') as csv_file:
+      for (start, rates, nan_cells) in TiledRates.compute(self.intersects_filePath, years, uncertainty, memory_budget, processes, bootstrap):
+        n_tile = len(next(iter(rates.values())))
+        tile = pd.DataFrame({'Normal': transects[start:start + n_tile]}, index=pd.RangeIndex(start, start + n_tile))
+        for (metric, values) in rates.items():
+          tile[metric] = values
+
+        # same layout as toCSV, the index continues across tiles
+        tile.to_csv(csv_file, header=(start == 0))
+        if write_shp:
+          if writer is None:
+            writer, transect_features = self.initRatesWriter(tile.columns)
+          self.writeRatesFeatures(writer, transect_features, tile)
+
+        tile_rates.append(tile)
+        self.report.count('tiles')
+        self.report.count('nan_cells', nan_cells)
+        for (metric, values) in rates.items():
+          self.report.count('nan_' + metric, int(pd.isna(values).sum()))
+
+    os.replace(csv_file_path + '.tmp', csv_file_path)
+    if writer is not None:
+      writer.close()
+      self.rates_wgs84.close()
+
+    self.transect_rates = pd.concat(tile_rates)
+    self.report.count('transects', len(transects))
+    self.report.count('dates', len(dates))
+    with self.report.stage('write'):
+      self.summarize(self.transect_rates)
 
     print('calculations done')
+    self.report.save(self.report_filePath)
+    print(self.report.summary())
+
+  def updateRates(self, new_intersects_filename: str = None, rebuild: bool = False) -> pd.DataFrame:
+    '''
+      updates NSM, EPR, SCE, LRR and LR2 from the per transect statistics
+      stored by the previous update, without reading the historical rows.
+
+      new_intersects_filename: csv (or .npy) of only the new shoreline dates, same layout
+        as the intersects table, assumed to be in the intersects folder
+      rebuild: build the statistics from scratch from the full intersects table
+        loaded by loadLayers, e.g. after a historical date was corrected.
+        also done when there are no stored statistics yet
 
-mc = MetricsCalculator()
-mc.loadLayers(intersects_filename, transects_filename)
-mc.run()
\ No newline at end of file
+      writes normals_rates_accumulated.csv
+    '''
+    os.makedirs(self.output_dir, exist_ok=True)
+
+    if rebuild or not os.path.isfile(self.accumulator_filePath):
+      dates = pd.to_datetime(self.intersects['dates'], dayfirst=True).to_numpy()
+      accumulator = RatesAccumulator.rebuild(
+        self.intersects.columns[1:],
+        dates,
+        self.intersects[self.intersects.columns[1:]].to_numpy(dtype=float)
+      )
+    else:
+      accumulator = RatesAccumulator.load(self.accumulator_filePath)
+
+    if new_intersects_filename is not None:
+      new_intersects = IntersectMatrix.readTable(os.path.join(self.homePath, 'intersects', new_intersects_filename))
+      new_dates = pd.to_datetime(new_intersects['dates'], dayfirst=True).to_numpy()
+      new_distances = new_intersects[accumulator.transect_names].to_numpy(dtype=float)
+
+      # each new date is a single O(transects) update
+      for (date, distances) in zip(new_dates, new_distances):
+        accumulator.update(date, distances)
+
+    return self.saveAccumulated(accumulator)
+
+  def streamRates(self, intersects_filename: str, chunk_rows: int = 500) -> pd.DataFrame:
+    '''
+      builds the per transect statistics of updateRates from the full intersects
+      table read chunk_rows dates at a time (csv chunks, or row slices of a memory
+      mapped IntersectMatrix), so memory does not grow with the number of dates.
+      same outputs as updateRates with rebuild, the table is not loaded by loadLayers
+
+      intersects_filename: csv (or .npy) of the intersects table, assumed to be in the intersects folder
+    '''
+    os.makedirs(self.output_dir, exist_ok=True)
+
+    accumulator = None
+    with self.report.stage('rates'):
+      for chunk in IntersectMatrix.readTableChunks(os.path.join(self.homePath, 'intersects', intersects_filename), chunk_rows):
+        dates = pd.to_datetime(chunk['dates'], dayfirst=True).to_numpy()
+        if accumulator is None:
+          # every metric is invariant to the epoch, the first date is as good as the oldest
+          accumulator = RatesAccumulator(chunk.columns[1:], dates[0])
+
+        for (date, distances) in zip(dates, chunk[accumulator.transect_names].to_numpy(dtype=float)):
+          accumulator.update(date, distances)
+        self.report.count('dates', len(chunk))
+
+    if accumulator is None:
+      raise Exception("{fn} has no shoreline dates".format(fn=intersects_filename))
+
+    rates = self.saveAccumulated(accumulator)
+    self.report.save(self.report_filePath)
+    return rates
+
+  def saveAccumulated(self, accumulator: RatesAccumulator) -> pd.DataFrame:
+    '''
+      stores the statistics for the next update and writes normals_rates_accumulated.csv
+    '''
+    accumulator.save(self.accumulator_filePath)
+
+    rates = pd.DataFrame({'Normal': accumulator.transect_names})
+    for (metric, values) in accumulator.rates().items():
+      rates[metric] = values
+    rates.to_csv(self.output_dir + 'normals_rates_accumulated.csv')
+
+    print('{n} shoreline dates in rates'.format(n=len(accumulator.dates)))
+    return rates
+
+def main():
+  mc = MetricsCalculator(wgs84=wgs84)
+  if tiled:
+    mc.loadLayers(intersects_filename, transects_filename, uncertainty_filename, read_intersects=False)
+    mc.runTiled(memory_budget=memory_budget_mb * 2 ** 20, bootstrap_replicates=bootstrap_replicates)
+  else:
+    mc.loadLayers(intersects_filename, transects_filename, uncertainty_filename)
+    mc.run(bootstrap_replicates=bootstrap_replicates)
+
+# run only when executed as a script (e.g. from the QGIS python console)
+if __name__ == '__main__':
+  main()
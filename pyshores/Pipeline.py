@@ -0,0 +1,400 @@
+import itertools
+import json
+import os
+import shutil
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+try:
+  from .GeometryArrays import GeometryArrays
+  from .IncrementalState import IncrementalState
+  from .IntersectMatrix import IntersectMatrix
+  from .Reprojection import Reprojection
+  from .RunReport import RunReport
+  from .TransectBatch import TransectBatch
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from GeometryArrays import GeometryArrays
+  from IncrementalState import IncrementalState
+  from IntersectMatrix import IntersectMatrix
+  from Reprojection import Reprojection
+  from RunReport import RunReport
+  from TransectBatch import TransectBatch
+
+'''
+  the transects -> intersects -> rates chain as a DAG of stages with a
+  content addressed cache of their outputs.
+
+  the key of a stage is a hash of its name, its parameters, the contents of
+  its input files, the keys of the stages it reads from and the source of
+  pyshores (codeVersion, so outputs of older code are never reused). its outputs are
+  kept in <project>/.pyshores_cache/<stage>/<key>/ and a stage whose key is
+  already in the cache is not run again. a change anywhere upstream changes
+  every key below it, so only the stages that depend on the change are rerun:
+    a new shorelines file reruns intersects and rates, not transects,
+    a new spacing reruns everything of that spacing, nothing else.
+
+  stages:
+    transects   landward and seaward baselines (geojson) -> transects.geojson
+                params: spacing, transect_length, window_size, kernel, edges, sigma, crs, wgs84
+    intersects  transects and shorelines (geojson) -> intersects.npy + .json (IntersectMatrix)
+                params: date_property, crs
+    rates       intersects and optional uncertainty csv -> normals_rates.csv, normals_rates_summary.csv
+                params: bootstrap_replicates, confidence_level, seed
+
+  every stage runs on the NumPy code of its QGIS class (TransectBatch,
+  GeometryArrays, MetricsCalculator without the shapefile), so stages can run
+  in worker processes. stages that do not depend on each other (e.g. the
+  branches of a parameter sweep) run concurrently.
+
+  crs is the projected crs of every stage (default: the crs of the landward
+  baseline file). inputs in another crs are reprojected to it in one batched
+  transform, and with wgs84 the transects stage also writes transects_wgs84.geojson.
+
+  a stage writes into a temporary folder which is renamed into the cache
+  when it is done, so an interrupted run never leaves a half written entry.
+'''
+
+class PipelineStage:
+  '''
+    one node of the DAG. input_files are named paths, upstream the named stages it reads
+  '''
+  def __init__(self, name: str, params: dict, input_files: Dict[str, str], upstream: Dict[str, 'PipelineStage'], key: str) -> None:
+    self.name = name
+    self.params = params
+    self.input_files = input_files
+    self.upstream = upstream
+    self.key = key
+
+class PipelineStages:
+  '''
+    the work of every stage: stage(output_path, input_files, upstream_paths, params)
+  '''
+  @classmethod
+  def run(cls, name: str, output_path: str, input_files: Dict[str, str], upstream_paths: Dict[str, str], params: dict) -> float:
+    started = time.perf_counter()
+    temp_path = "{path}.tmp-{pid}".format(path=output_path, pid=os.getpid())
+    os.makedirs(temp_path, exist_ok=True)
+
+    try:
+      getattr(cls, name)(temp_path, input_files, upstream_paths, params)
+    except BaseException:
+      # nothing of a failed stage is kept, not even in the cache folder
+      shutil.rmtree(temp_path, ignore_errors=True)
+      raise
+    seconds = time.perf_counter() - started
+    with open(os.path.join(temp_path, "stage.json"), "w") as stage_file:
+      json.dump({"stage": name, "params": params, "input_files": input_files, "upstream": upstream_paths, "seconds": seconds}, stage_file, indent=2)
+
+    try:
+      os.replace(temp_path, output_path)
+    except OSError: # the same stage was finished by another run
+      shutil.rmtree(temp_path)
+
+    return seconds
+
+  @classmethod
+  def readLines(cls, file_path: str, crs: str, property_name: str = None):
+    '''
+      the lines and properties of a geojson file, reprojected to crs
+    '''
+    property_names = [] if property_name is None else [property_name]
+    lines, properties, source = GeometryArrays.readGeojsonFeatures(file_path, property_names)
+    return Reprojection.transformLines(lines, source, crs), properties.get(property_name, [])
+
+  @classmethod
+  def transects(cls, output_path: str, input_files: Dict[str, str], upstream_paths: Dict[str, str], params: dict):
+    landward, _ = cls.readLines(input_files["landward"], params["crs"])
+    seaward, _ = cls.readLines(input_files["seaward"], params["crs"])
+
+    transects = TransectBatch.siteTransects(
+      [part for parts in landward for part in parts],
+      [part for parts in seaward for part in parts],
+      spacing=params["spacing"],
+      transect_length=params["transect_length"],
+      window_size=params["window_size"],
+      kernel=params["kernel"],
+      edges=params["edges"],
+      sigma=params["sigma"]
+    )
+    names = ["T{indx}".format(indx=indx) for indx in range(len(transects))]
+    GeometryArrays.writeGeojsonTransects(os.path.join(output_path, "transects.geojson"), transects, names, params["crs"])
+    if params["wgs84"]:
+      GeometryArrays.writeGeojsonTransects(
+        os.path.join(output_path, "transects_wgs84.geojson"),
+        Reprojection.transform(transects, params["crs"], Reprojection.WGS84),
+        names
+      )
+
+  @classmethod
+  def intersects(cls, output_path: str, input_files: Dict[str, str], upstream_paths: Dict[str, str], params: dict):
+    transects, names = GeometryArrays.readGeojsonTransects(os.path.join(upstream_paths["transects"], "transects.geojson"))
+    shorelines, dates = cls.readLines(input_files["shorelines"], params["crs"], params["date_property"])
+
+    matrix = GeometryArrays.intersectMatrix(transects, shorelines).reshape(len(shorelines), len(transects))
+    IntersectMatrix(dates, names, matrix, params["crs"]).save(os.path.join(output_path, "intersects.npy"))
+
+  @classmethod
+  def rates(cls, output_path: str, input_files: Dict[str, str], upstream_paths: Dict[str, str], params: dict):
+    import pandas as pd
+    try:
+      from .MetricsCalculator import MetricsCalculator
+    except ImportError: # run as a script, e.g. from the QGIS python console
+      from MetricsCalculator import MetricsCalculator
+
+    # the rates of the cached intersects, written to the cache
+    # ... instead of the rates folder of the project
+    mc = MetricsCalculator(project_path=output_path, report=RunReport("metrics"))
+    mc.output_dir = os.path.join(output_path, "")
+    mc.report_filePath = mc.output_dir + "metrics_report.json"
+    mc.intersects = IntersectMatrix.readTable(os.path.join(upstream_paths["intersects"], "intersects.npy"))
+    if "uncertainty" in input_files:
+      mc.uncertainty = pd.read_csv(input_files["uncertainty"])
+    mc.confidence_level = params["confidence_level"]
+    mc.bootstrap_seed = params["seed"]
+    mc.run(write_shp=False, bootstrap_replicates=params["bootstrap_replicates"])
+
+class Pipeline:
+  cache_folder = ".pyshores_cache"
+  # hash of the pyshores sources, computed once per process by codeVersion
+  code_version: str = None
+
+  # outputs of every stage, copied to the project folders by publish
+  outputs = {
+    "transects": [("transects.geojson", "transects")],
+    "intersects": [("intersects.npy", os.path.join("intersects", "coastSat")), ("intersects.json", os.path.join("intersects", "coastSat"))],
+    "rates": [("normals_rates.csv", os.path.join("rates", "output")), ("normals_rates_summary.csv", os.path.join("rates", "output"))],
+  }
+
+  def __init__(self, project_path: str, processes: int = 1, report: RunReport = None, cache_path: str = None) -> None:
+    '''
+      project_path: folder of the pyshores project structure
+      processes: stages run at once, 1 runs them one after the other in this process
+      cache_path: defaults to <project_path>/.pyshores_cache
+    '''
+    self.project_path = project_path
+    self.processes = processes
+    self.cache_path = cache_path or os.path.join(project_path, self.cache_folder)
+    self.report: RunReport = report if report is not None else RunReport("pipeline")
+
+    # stages by key, the same stage added twice (e.g. shared by two branches of a sweep) is one node
+    self.stages: Dict[str, PipelineStage] = {}
+    # file fingerprints by (path, size, modification time), a file is only read once per pipeline
+    self.file_fingerprints: Dict[tuple, str] = {}
+
+  @classmethod
+  def codeVersion(cls) -> str:
+    '''
+      hash of the source of every pyshores module (__init__ holds the version).
+      any change to the code changes every key, at the price of rerunning
+      stages that a change did not touch
+    '''
+    if cls.code_version is None:
+      package_path = os.path.dirname(os.path.abspath(__file__))
+      sources = []
+      for file_name in sorted(os.listdir(package_path)):
+        if file_name.endswith(".py"):
+          with open(os.path.join(package_path, file_name), "rb") as source_file:
+            sources.extend([file_name, source_file.read()])
+      cls.code_version = IncrementalState.fingerprint(*sources)
+
+    return cls.code_version
+
+  def fileFingerprint(self, file_path: str) -> str:
+    status = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), status.st_size, status.st_mtime_ns)
+    if memo_key not in self.file_fingerprints:
+      with open(file_path, "rb") as input_file:
+        self.file_fingerprints[memo_key] = IncrementalState.fingerprint(input_file.read())
+
+    return self.file_fingerprints[memo_key]
+
+  def add(self, name: str, params: dict, input_files: Dict[str, str] = None, upstream: Dict[str, PipelineStage] = None) -> PipelineStage:
+    '''
+      adds a stage to the DAG and returns it, or the identical stage already in it
+    '''
+    input_files = {input_name: path for (input_name, path) in (input_files or {}).items() if path is not None}
+    upstream = upstream or {}
+
+    key = IncrementalState.fingerprint(
+      name,
+      self.codeVersion(),
+      json.dumps(params, sort_keys=True),
+      *["{n}={f}".format(n=input_name, f=self.fileFingerprint(path)) for (input_name, path) in sorted(input_files.items())],
+      *["{n}={k}".format(n=upstream_name, k=stage.key) for (upstream_name, stage) in sorted(upstream.items())]
+    )
+    if key not in self.stages:
+      self.stages[key] = PipelineStage(name, params, input_files, upstream, key)
+
+    return self.stages[key]
+
+  def chain(
+    self,
+    landward: str,
+    seaward: str,
+    shorelines: str,
+    uncertainty: str = None,
+    spacing: float = 5,
+    transect_length: float = 50,
+    window_size: int = 7,
+    kernel: str = "boxcar",
+    edges: str = "shrink",
+    sigma: float = None,
+    date_property: str = "dates",
+    bootstrap_replicates: int = 0,
+    confidence_level: float = 0.95,
+    seed: int = 0,
+    crs: str = None,
+    wgs84: bool = False
+  ) -> PipelineStage:
+    '''
+      adds the transects, intersects and rates stages of one set of parameters.
+      returns the rates stage
+    '''
+    if crs is None:
+      crs = GeometryArrays.readGeojsonCrs(landward)
+    if crs == Reprojection.WGS84:
+      raise Exception("spacing and lengths are in meters, give a projected crs for {f}".format(f=landward))
+
+    # 5 and 5.0 are the same spacing, and must give the same key
+    transects = self.add(
+      "transects",
+      {
+        "spacing": float(spacing),
+        "transect_length": float(transect_length),
+        "window_size": int(window_size),
+        "kernel": kernel,
+        "edges": edges,
+        "sigma": None if sigma is None else float(sigma),
+        "crs": crs,
+        "wgs84": wgs84
+      },
+      {"landward": landward, "seaward": seaward}
+    )
+    intersects = self.add("intersects", {"date_property": date_property, "crs": crs}, {"shorelines": shorelines}, {"transects": transects})
+    return self.add(
+      "rates",
+      {"bootstrap_replicates": bootstrap_replicates, "confidence_level": confidence_level, "seed": seed},
+      {"uncertainty": uncertainty},
+      {"intersects": intersects}
+    )
+
+  def stagePath(self, stage: PipelineStage) -> str:
+    return os.path.join(self.cache_path, stage.name, stage.key)
+
+  def isCached(self, stage: PipelineStage) -> bool:
+    return os.path.isfile(os.path.join(self.stagePath(stage), "stage.json"))
+
+  def upstreamStages(self, targets: List[PipelineStage]) -> List[PipelineStage]:
+    '''
+      the targets and every stage they depend on, upstream stages first
+    '''
+    ordered: List[PipelineStage] = []
+    seen = set()
+
+    def visit(stage: PipelineStage):
+      if stage.key in seen:
+        return
+      seen.add(stage.key)
+      for upstream_stage in stage.upstream.values():
+        visit(upstream_stage)
+      ordered.append(stage)
+
+    for target in targets:
+      visit(target)
+
+    return ordered
+
+  def stageTask(self, stage: PipelineStage) -> tuple:
+    upstream_paths = {upstream_name: self.stagePath(upstream_stage) for (upstream_name, upstream_stage) in stage.upstream.items()}
+    return (stage.name, self.stagePath(stage), stage.input_files, upstream_paths, stage.params)
+
+  def run(self, targets: List[PipelineStage] = None) -> Dict[str, str]:
+    '''
+      runs every stage the targets (default: every stage) need that is not cached.
+      returns the cache folder of every stage by key
+    '''
+    stages = self.upstreamStages(targets if targets is not None else list(self.stages.values()))
+    done = set()
+    pending: List[PipelineStage] = []
+    for stage in stages:
+      if self.isCached(stage):
+        done.add(stage.key)
+        self.report.count("cache_hits")
+      else:
+        pending.append(stage)
+
+    with self.report.stage("run"):
+      if self.processes == 1:
+        for stage in pending:
+          self.report.record(stage.name, PipelineStages.run(*self.stageTask(stage)))
+          self.report.count("stages_run")
+      else:
+        self.runConcurrently(pending, done)
+
+    return {stage.key: self.stagePath(stage) for stage in stages}
+
+  def runConcurrently(self, pending: List[PipelineStage], done: set):
+    '''
+      submits every stage as soon as the stages it reads from are done
+    '''
+    running = {}
+    with ProcessPoolExecutor(max_workers=self.processes) as executor:
+      while pending or running:
+        ready = [stage for stage in pending if all(upstream_stage.key in done for upstream_stage in stage.upstream.values())]
+        for stage in ready:
+          pending.remove(stage)
+          running[executor.submit(PipelineStages.run, *self.stageTask(stage))] = stage
+
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+          stage = running.pop(future)
+          # raises the exception of a failed stage
+          self.report.record(stage.name, future.result())
+          self.report.count("stages_run")
+          done.add(stage.key)
+
+  def publish(self, target: PipelineStage):
+    '''
+      copies the outputs of the target and of the stages it depends on
+      to the folders of the project structure
+    '''
+    for stage in self.upstreamStages([target]):
+      for (file_name, folder) in self.outputs[stage.name]:
+        os.makedirs(os.path.join(self.project_path, folder), exist_ok=True)
+        shutil.copyfile(os.path.join(self.stagePath(stage), file_name), os.path.join(self.project_path, folder, file_name))
+
+  def sweep(self, spacings: List[float], window_sizes: List[int], **chain_options) -> List[dict]:
+    '''
+      runs the chain for every combination of spacing and window_size.
+      chain_options are the other arguments of chain. returns one row per
+      combination with the cache folder of its rates, also written to
+      <project>/rates/output/sweep.csv
+    '''
+    import pandas as pd
+
+    combinations = list(itertools.product(spacings, window_sizes))
+    targets = [self.chain(spacing=spacing, window_size=window_size, **chain_options) for (spacing, window_size) in combinations]
+    self.run(targets)
+
+    rows = []
+    for ((spacing, window_size), target) in zip(combinations, targets):
+      rates = pd.read_csv(os.path.join(self.stagePath(target), "normals_rates.csv"))
+      rows.append({
+        "spacing": spacing,
+        "window_size": window_size,
+        "transects": len(rates),
+        "LRR_mean": rates["LRR"].mean(),
+        "EPR_mean": rates["EPR"].mean(),
+        "rates_path": self.stagePath(target)
+      })
+
+    output_dir = os.path.join(self.project_path, "rates", "output")
+    os.makedirs(output_dir, exist_ok=True)
+    pd.DataFrame(rows).to_csv(os.path.join(output_dir, "sweep.csv"), index=False)
+    return rows
+
+  def saveReport(self):
+    self.report.save(os.path.join(self.cache_path, "pipeline_report.json"))
+    print(self.report.summary())
@@ -0,0 +1,178 @@
+import os
+
+from typing import Dict, List, Set
+
+import numpy as np
+
+try:
+  from .RatesEngine import RatesEngine
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from RatesEngine import RatesEngine
+
+'''
+  per transect sufficient statistics of the intersect matrix, so that a new
+  shoreline date updates NSM, EPR, SCE and LRR of every transect in a single
+  O(transects) pass without reading the historical rows again.
+
+  per transect:
+    n                            number of intersections
+    sum_x, sum_y                 sum of years and of positions
+    sum_xy, sum_xx, sum_yy       sums of products, for the regression and its r squared
+    first_x, first_y             year and position of the oldest intersection
+    last_x, last_y               year and position of the youngest intersection
+    min_y, max_y                 closest and farthest intersection, for SCE
+
+  years are counted from a fixed epoch date (365 day years, same as RatesEngine).
+  every metric is invariant to the epoch, so it never has to change.
+
+  a shoreline date can only be added once. a corrected historical date
+  changes sums that cannot be subtracted back safely (min, max, first and
+  last), use rebuild with the full corrected matrix instead.
+'''
+
+class RatesAccumulator:
+  fields = [
+    'n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy',
+    'first_x', 'first_y', 'last_x', 'last_y', 'min_y', 'max_y'
+  ]
+
+  def __init__(self, transect_names: List[str], epoch) -> None:
+    self.transect_names = list(transect_names)
+    self.epoch = np.datetime64(epoch, 'D')
+    # a set, so checking a new date does not grow with the dates already added
+    self.dates: Set[np.datetime64] = set()
+
+    n_transects = len(self.transect_names)
+    self.n = np.zeros(n_transects, dtype=np.int64)
+    for field in self.fields[1:6]:
+      setattr(self, field, np.zeros(n_transects))
+    for field in self.fields[6:]:
+      setattr(self, field, np.full(n_transects, np.nan))
+
+  def years(self, dates) -> np.ndarray:
+    days = (np.asarray(dates, dtype='datetime64[D]') - self.epoch).astype(float)
+    return days / 365
+
+  def update(self, date, distances: np.ndarray):
+    '''
+      adds the intersections of one shoreline date with every transect.
+      distances is an (N,) array in the order of transect_names, nan where
+      the shoreline does not intersect a transect
+    '''
+    date = np.datetime64(date, 'D')
+    if date in self.dates:
+      raise Exception("{date} was already added, rebuild to correct a date".format(date=date))
+
+    y = np.asarray(distances, dtype=float)
+    if y.shape != self.n.shape:
+      raise Exception("expected {n} distances, got {m}".format(n=len(self.n), m=len(y)))
+
+    x = float(self.years(date))
+    observed = ~np.isnan(y)
+    y_obs = y[observed]
+
+    self.n[observed] += 1
+    self.sum_x[observed] += x
+    self.sum_y[observed] += y_obs
+    self.sum_xy[observed] += x * y_obs
+    self.sum_xx[observed] += x * x
+    self.sum_yy[observed] += y_obs * y_obs
+
+    # nan comparisons are False, so transects without
+    # ... a previous intersection take the new one
+    older = observed & ~(self.first_x <= x)
+    self.first_x[older] = x
+    self.first_y[older] = y[older]
+
+    younger = observed & ~(self.last_x >= x)
+    self.last_x[younger] = x
+    self.last_y[younger] = y[younger]
+
+    self.min_y[observed] = np.fmin(self.min_y[observed], y_obs)
+    self.max_y[observed] = np.fmax(self.max_y[observed], y_obs)
+
+    self.dates.add(date)
+
+  @classmethod
+  def rebuild(cls, transect_names: List[str], dates, distances: np.ndarray) -> 'RatesAccumulator':
+    '''
+      builds the statistics from scratch from a full dates x transects matrix,
+      e.g. after a historical date was corrected
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if len(np.unique(dates)) != len(dates):
+      raise Exception("intersect matrix has duplicate dates")
+
+    accumulator = cls(transect_names, dates.min())
+    x, y = RatesEngine.sortByDate(accumulator.years(dates), distances)
+    observed = ~np.isnan(y)
+    x_obs = np.where(observed, x[:, None], 0)
+    y_obs = np.where(observed, y, 0)
+
+    accumulator.n = observed.sum(axis=0).astype(np.int64)
+    accumulator.sum_x = x_obs.sum(axis=0)
+    accumulator.sum_y = y_obs.sum(axis=0)
+    accumulator.sum_xy = (x_obs * y_obs).sum(axis=0)
+    accumulator.sum_xx = (x_obs * x_obs).sum(axis=0)
+    accumulator.sum_yy = (y_obs * y_obs).sum(axis=0)
+
+    first_x, first_y, last_x, last_y = RatesEngine.firstLast(x, y)
+    accumulator.first_x, accumulator.first_y = first_x, first_y
+    accumulator.last_x, accumulator.last_y = last_x, last_y
+
+    has_any = observed.any(axis=0)
+    accumulator.min_y = np.where(has_any, np.where(observed, y, np.inf).min(axis=0), np.nan)
+    accumulator.max_y = np.where(has_any, np.where(observed, y, -np.inf).max(axis=0), np.nan)
+
+    accumulator.dates = set(dates)
+    return accumulator
+
+  def rates(self) -> Dict[str, np.ndarray]:
+    '''
+      NSM, EPR, SCE, LRR and LR2 of every transect from the statistics alone,
+      same definitions as RatesEngine.compute
+    '''
+    nsm = self.last_y - self.first_y
+    elapsed = self.last_x - self.first_x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+      epr = np.where(elapsed > 0, nsm / elapsed, np.nan)
+
+      s_xx = self.sum_xx - self.sum_x * self.sum_x / self.n
+      s_xy = self.sum_xy - self.sum_x * self.sum_y / self.n
+      s_yy = self.sum_yy - self.sum_y * self.sum_y / self.n
+
+      fits = (self.n >= 2) & (s_xx > 0)
+      lrr = np.where(fits, s_xy / s_xx, np.nan)
+      lr2 = np.where(fits & (s_yy > 0), s_xy * s_xy / (s_xx * s_yy), np.nan)
+
+    return {
+      'NSM': nsm,
+      'EPR': epr,
+      'SCE': self.max_y - self.min_y,
+      'LRR': lrr,
+      'LR2': lr2,
+    }
+
+  def save(self, file_path: str):
+    # written to a temporary file first so an interrupted
+    # ... update never leaves a half written store behind
+    temp_file_path = file_path + '.tmp.npz'
+    np.savez(
+      temp_file_path,
+      transect_names=np.array(self.transect_names, dtype=str),
+      epoch=np.array(self.epoch),
+      dates=np.array(sorted(self.dates), dtype='datetime64[D]'),
+      **{field: getattr(self, field) for field in self.fields}
+    )
+    os.replace(temp_file_path, file_path)
+
+  @classmethod
+  def load(cls, file_path: str) -> 'RatesAccumulator':
+    with np.load(file_path) as store:
+      accumulator = cls(store['transect_names'].tolist(), store['epoch'])
+      accumulator.dates = set(store['dates'])
+      for field in cls.fields:
+        setattr(accumulator, field, store[field].copy())
+
+    return accumulator
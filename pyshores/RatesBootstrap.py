@@ -0,0 +1,175 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+try:
+  from .RatesEngine import RatesEngine
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from RatesEngine import RatesEngine
+
+'''
+  bootstrap confidence intervals of LRR and WLR for every transect at once.
+
+  a replicate resamples the shoreline dates with replacement. it is stored as
+  the number of times every date was drawn, so the R replicates are an (R, T)
+  count matrix drawn once from a multinomial distribution. the count of a date
+  multiplies its weight in the least squares fit, and the weighted sums of all
+  replicates and all transects are then matrix products:
+
+    sum_w  = counts @ w          sum_wx  = counts @ (w * x)     ...
+
+  with w the (T, N) weight of every date and transect (0 where the transect
+  has no intersection). every replicate of every transect is fitted without a
+  python loop over either.
+
+  transects are processed in tiles of at most budget_cells / R transects, to
+  bound the size of the (R, tile) sums, and tiles can be spread over worker
+  processes. the count matrix is drawn before the tiles are split, so the
+  intervals only depend on the seed, not on the tiles or the processes.
+
+  per transect outputs:
+    <metric>_SE   standard error, standard deviation of the replicate slopes
+    <metric>_lo   lower bound of the confidence interval (percentile method)
+    <metric>_hi   upper bound of the confidence interval
+  nan where fewer than half of the replicates could be fitted.
+'''
+
+class RatesBootstrap:
+  # cells of every (R, tile) array of replicate sums
+  budget_cells = 2 ** 22
+
+  # set in worker processes by initWorker
+  worker_counts: np.ndarray = None
+
+  @classmethod
+  def countMatrix(cls, n_dates: int, n_replicates: int, seed: int = None) -> np.ndarray:
+    '''
+      (R, T) number of times every date is drawn by every replicate
+    '''
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_dates, np.full(n_dates, 1 / n_dates), size=n_replicates).astype(float)
+
+  @classmethod
+  def replicateSlopes(cls, counts: np.ndarray, years: np.ndarray, distances: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+    '''
+      (R, N) slope of every replicate of every transect, nan where a replicate
+      has fewer than two distinct years with intersections
+    '''
+    observed = ~np.isnan(distances)
+    if weights is None:
+      weights = np.ones(len(years))
+    w = np.where(observed, np.asarray(weights, dtype=float)[:, None], 0)
+
+    # centered on the weighted mean of every transect, the slope does not
+    # ... change and the raw sums below lose less precision
+    with np.errstate(divide="ignore", invalid="ignore"):
+      sum_w = w.sum(axis=0)
+      x = np.where(observed, years[:, None] - (w * years[:, None]).sum(axis=0) / sum_w, 0)
+      y = np.where(observed, distances - (w * np.where(observed, distances, 0)).sum(axis=0) / sum_w, 0)
+
+    s_w = counts @ w
+    s_wx = counts @ (w * x)
+    s_wy = counts @ (w * y)
+    s_wxx = counts @ (w * x * x)
+    s_wxy = counts @ (w * x * y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      s_xx = s_wxx - s_wx * s_wx / s_w
+      s_xy = s_wxy - s_wx * s_wy / s_w
+
+      # s_xx of a single drawn year is 0 up to rounding
+      fits = (s_w > 0) & (s_xx > 1e-12 * s_wxx)
+      return np.where(fits, s_xy / s_xx, np.nan)
+
+  @classmethod
+  def intervals(cls, slopes: np.ndarray, level: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+      (se, lower, upper) of every column of the replicate slopes
+    '''
+    fitted = (~np.isnan(slopes)).sum(axis=0)
+    enough = fitted >= max(2, len(slopes) // 2)
+    n_transects = slopes.shape[1]
+
+    se = np.full(n_transects, np.nan)
+    lower = np.full(n_transects, np.nan)
+    upper = np.full(n_transects, np.nan)
+    if not enough.any():
+      return se, lower, upper
+
+    alpha = (1 - level) / 2
+    slopes = slopes[:, enough]
+    # nanquantile goes column by column, quantile sorts all of them at once
+    if np.isnan(slopes).any():
+      se[enough] = np.nanstd(slopes, axis=0, ddof=1)
+      lower[enough], upper[enough] = np.nanquantile(slopes, [alpha, 1 - alpha], axis=0)
+    else:
+      se[enough] = np.std(slopes, axis=0, ddof=1)
+      lower[enough], upper[enough] = np.quantile(slopes, [alpha, 1 - alpha], axis=0)
+
+    return se, lower, upper
+
+  @classmethod
+  def tileIntervals(cls, counts: np.ndarray, years: np.ndarray, distances: np.ndarray, weights: np.ndarray, level: float) -> Dict[str, np.ndarray]:
+    rates = {}
+    metrics = [('LRR', None)] if weights is None else [('LRR', None), ('WLR', weights)]
+    for (metric, metric_weights) in metrics:
+      se, lower, upper = cls.intervals(cls.replicateSlopes(counts, years, distances, metric_weights), level)
+      rates[metric + '_SE'] = se
+      rates[metric + '_lo'] = lower
+      rates[metric + '_hi'] = upper
+
+    return rates
+
+  @classmethod
+  def initWorker(cls, counts: np.ndarray):
+    cls.worker_counts = counts
+
+  @classmethod
+  def tileTask(cls, task) -> Dict[str, np.ndarray]:
+    years, distances, weights, level = task
+    return cls.tileIntervals(cls.worker_counts, years, distances, weights, level)
+
+  @classmethod
+  def tiles(cls, distances: np.ndarray, tile_size: int) -> Iterator[slice]:
+    for start in range(0, distances.shape[1], tile_size):
+      yield slice(start, start + tile_size)
+
+  @classmethod
+  def compute(
+    cls,
+    years: np.ndarray,
+    distances: np.ndarray,
+    uncertainty: np.ndarray = None,
+    n_replicates: int = 1000,
+    level: float = 0.95,
+    seed: int = 0,
+    processes: int = 1
+  ) -> Dict[str, np.ndarray]:
+    '''
+      standard errors and confidence bounds of LRR, and of WLR when the (T,)
+      per date uncertainty is given, same inputs as RatesEngine.compute.
+      processes above 1 spreads the tiles over a pool of worker processes
+    '''
+    weights = None
+    if uncertainty is None:
+      years, distances = RatesEngine.sortByDate(years, distances)
+    else:
+      years, distances, uncertainty = RatesEngine.sortByDate(years, distances, uncertainty)
+      weights = RatesEngine.uncertaintyWeights(uncertainty)
+
+    counts = cls.countMatrix(len(years), n_replicates, seed)
+    tile_size = max(1, cls.budget_cells // n_replicates)
+    tiles = list(cls.tiles(distances, tile_size))
+
+    if processes == 1 or len(tiles) <= 1:
+      results = [cls.tileIntervals(counts, years, distances[:, tile], weights, level) for tile in tiles]
+    else:
+      with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=cls.initWorker,
+        initargs=(counts,)
+      ) as executor:
+        results = list(executor.map(cls.tileTask, [(years, distances[:, tile], weights, level) for tile in tiles]))
+
+    return {metric: np.concatenate([result[metric] for result in results]) for metric in results[0]}
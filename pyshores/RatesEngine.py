@@ -0,0 +1,267 @@
+from typing import Dict
+
+import numpy as np
+
+'''
+  shoreline change metrics computed on the whole dates x transects
+  intersect matrix at once.
+
+  inputs:
+    years: (T,) array, time of every shoreline in years from the oldest shoreline
+    distances: (T, N) array, distance of every shoreline from every transect origin
+      nan where a shoreline does not intersect a transect
+
+  every metric is returned as an (N,) array, nan for transects that have
+  too few intersections to compute it.
+'''
+
+class RatesEngine:
+  @classmethod
+  def yearsSince(cls, dates) -> np.ndarray:
+    '''
+      years of every date from the oldest date.
+      a year is 365 days, same as CoastCR
+    '''
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    days = (dates - dates.min()).astype(float)
+    return days / 365
+
+  @classmethod
+  def sortByDate(cls, years: np.ndarray, distances: np.ndarray, uncertainty: np.ndarray = None):
+    '''
+      sorts the rows of the intersect matrix from the oldest to the youngest shoreline.
+      the per date uncertainty, if given, is sorted along with them
+    '''
+    years = np.asarray(years, dtype=float)
+    distances = np.asarray(distances, dtype=float).reshape(len(years), -1)
+    order = np.argsort(years, kind="stable")
+
+    if uncertainty is None:
+      return years[order], distances[order]
+
+    return years[order], distances[order], np.asarray(uncertainty, dtype=float)[order]
+
+  @classmethod
+  def firstLastIndex(cls, distances: np.ndarray):
+    '''
+      row of the oldest and youngest intersection of every transect,
+      skipping dates where the transect has no intersection.
+      expects rows sorted by date.
+
+      returns (oldest_rows, youngest_rows, has_any)
+    '''
+    observed = ~np.isnan(distances)
+    has_any = observed.any(axis=0)
+
+    first = np.argmax(observed, axis=0)
+    last = distances.shape[0] - 1 - np.argmax(observed[::-1], axis=0)
+
+    return first, last, has_any
+
+  @classmethod
+  def firstLast(cls, years: np.ndarray, distances: np.ndarray):
+    '''
+      oldest and youngest intersection of every transect, skipping dates
+      where the transect has no intersection.
+      expects rows sorted by date.
+
+      returns (oldest_years, oldest_positions, youngest_years, youngest_positions)
+    '''
+    first, last, has_any = cls.firstLastIndex(distances)
+    columns = np.arange(distances.shape[1])
+
+    oldest_years = np.where(has_any, years[first], np.nan)
+    youngest_years = np.where(has_any, years[last], np.nan)
+    oldest_positions = np.where(has_any, distances[first, columns], np.nan)
+    youngest_positions = np.where(has_any, distances[last, columns], np.nan)
+
+    return oldest_years, oldest_positions, youngest_years, youngest_positions
+
+  @classmethod
+  def calcNSM(cls, years: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    '''
+      youngest_position_intersect - oldest_position_intersect
+      negative if youngest position is closer to transect origin than oldest position
+      which signifies the occurence of regression
+    '''
+    years, distances = cls.sortByDate(years, distances)
+    _, oldest_positions, _, youngest_positions = cls.firstLast(years, distances)
+
+    return youngest_positions - oldest_positions
+
+  @classmethod
+  def calcEPR(cls, years: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    '''
+      NSM / years elapsed between the oldest and youngest intersection
+    '''
+    years, distances = cls.sortByDate(years, distances)
+    oldest_years, oldest_positions, youngest_years, youngest_positions = cls.firstLast(years, distances)
+
+    elapsed = youngest_years - oldest_years
+    with np.errstate(divide="ignore", invalid="ignore"):
+      return np.where(elapsed > 0, (youngest_positions - oldest_positions) / elapsed, np.nan)
+
+  @classmethod
+  def calcSCE(cls, years: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    '''
+      distance between the farthest and closest intersection from the transect origin
+    '''
+    distances = np.asarray(distances, dtype=float).reshape(len(years), -1)
+    observed = ~np.isnan(distances)
+
+    farthest = np.where(observed, distances, -np.inf).max(axis=0)
+    closest = np.where(observed, distances, np.inf).min(axis=0)
+
+    return np.where(observed.any(axis=0), farthest - closest, np.nan)
+
+  @classmethod
+  def regression(cls, years: np.ndarray, distances: np.ndarray, weights: np.ndarray = None):
+    '''
+      (weighted) least squares fit of position against time for every transect.
+      dates where a transect has no intersection are left out of its fit.
+      weights is a (T,) array, one weight per shoreline date
+
+      returns (slope, r_squared)
+    '''
+    distances = np.asarray(distances, dtype=float).reshape(len(years), -1)
+    observed = ~np.isnan(distances)
+
+    if weights is None:
+      weights = np.ones(len(years))
+    w = np.where(observed, np.asarray(weights, dtype=float)[:, None], 0)
+    x = np.asarray(years, dtype=float)[:, None]
+    y = np.where(observed, distances, 0)
+
+    sum_w = w.sum(axis=0)
+    n = observed.sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      mean_x = (w * x).sum(axis=0) / sum_w
+      mean_y = (w * y).sum(axis=0) / sum_w
+
+      # centered sums, more stable than the raw sums of x, y, xy and x squared
+      dx = np.where(observed, x - mean_x, 0)
+      dy = np.where(observed, y - mean_y, 0)
+      s_xx = (w * dx * dx).sum(axis=0)
+      s_xy = (w * dx * dy).sum(axis=0)
+      s_yy = (w * dy * dy).sum(axis=0)
+
+      fits = (n >= 2) & (s_xx > 0)
+      slope = np.where(fits, s_xy / s_xx, np.nan)
+      r_squared = np.where(fits & (s_yy > 0), s_xy * s_xy / (s_xx * s_yy), np.nan)
+
+    return slope, r_squared
+
+  @classmethod
+  def calcLRR(cls, years: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    '''
+      slope of the ordinary least squares fit of position against time
+    '''
+    slope, _ = cls.regression(years, distances)
+    return slope
+
+  @classmethod
+  def calcWLR(cls, years: np.ndarray, distances: np.ndarray, uncertainty: np.ndarray) -> np.ndarray:
+    '''
+      slope of the weighted least squares fit of position against time.
+      every date is weighted by 1 / uncertainty^2, same as CoastCR
+    '''
+    slope, _ = cls.regression(years, distances, cls.uncertaintyWeights(uncertainty))
+    return slope
+
+  @classmethod
+  def calcEPRunc(cls, years: np.ndarray, distances: np.ndarray, uncertainty: np.ndarray) -> np.ndarray:
+    '''
+      uncertainty of the EPR
+      sqrt(oldest_uncertainty^2 + youngest_uncertainty^2) / years elapsed
+    '''
+    years, distances, uncertainty = cls.sortByDate(years, distances, uncertainty)
+    first, last, has_any = cls.firstLastIndex(distances)
+
+    elapsed = years[last] - years[first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+      return np.where(
+        has_any & (elapsed > 0),
+        np.hypot(uncertainty[first], uncertainty[last]) / elapsed,
+        np.nan
+      )
+
+  @classmethod
+  def uncertaintyWeights(cls, uncertainty: np.ndarray) -> np.ndarray:
+    uncertainty = np.asarray(uncertainty, dtype=float)
+    if np.any(~(uncertainty > 0)):
+      raise Exception("shoreline uncertainties must be positive")
+
+    return 1 / uncertainty ** 2
+
+  @classmethod
+  def compute(cls, years: np.ndarray, distances: np.ndarray, uncertainty: np.ndarray = None) -> Dict[str, np.ndarray]:
+    '''
+      computes all metrics with a single sort of the intersect matrix.
+      uncertainty is the (T,) per date shoreline uncertainty in meters,
+      EPRunc, WLR and WR2 are nan without it.
+
+      metrics are returned in the same order as the CoastCR normals_rates output
+    '''
+    if uncertainty is None:
+      years, distances = cls.sortByDate(years, distances)
+    else:
+      years, distances, uncertainty = cls.sortByDate(years, distances, uncertainty)
+
+    first, last, has_any = cls.firstLastIndex(distances)
+    columns = np.arange(distances.shape[1])
+
+    nsm = np.where(has_any, distances[last, columns] - distances[first, columns], np.nan)
+    elapsed = np.where(has_any, years[last] - years[first], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+      epr = np.where(elapsed > 0, nsm / elapsed, np.nan)
+
+    lrr, lr2 = cls.regression(years, distances)
+
+    if uncertainty is None:
+      epr_unc = np.full(distances.shape[1], np.nan)
+      wlr = np.full(distances.shape[1], np.nan)
+      wr2 = np.full(distances.shape[1], np.nan)
+    else:
+      with np.errstate(divide="ignore", invalid="ignore"):
+        epr_unc = np.where(elapsed > 0, np.hypot(uncertainty[first], uncertainty[last]) / elapsed, np.nan)
+      wlr, wr2 = cls.regression(years, distances, cls.uncertaintyWeights(uncertainty))
+
+    return {
+      'NSM': nsm,
+      'EPR': epr,
+      'EPRunc': epr_unc,
+      'SCE': cls.calcSCE(years, distances),
+      'LRR': lrr,
+      'LR2': lr2,
+      'WLR': wlr,
+      'WR2': wr2,
+    }
+
+  @classmethod
+  def summarize(cls, rates: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    '''
+      summary statistics of every metric over all transects,
+      same layout as the CoastCR normals_rates_summary table
+    '''
+    summary = {}
+    for (metric, values) in rates.items():
+      values = np.asarray(values, dtype=float)
+      values = values[~np.isnan(values)]
+      if len(values) == 0:
+        continue
+
+      summary[metric] = {
+        'n': len(values),
+        'Mean': values.mean(),
+        'SD': values.std(ddof=1) if len(values) > 1 else np.nan,
+        'Median': np.median(values),
+        'min': values.min(),
+        'Max': values.max(),
+        'Range': values.max() - values.min(),
+        'Quantile .25': np.quantile(values, 0.25),
+        'Quantile .75': np.quantile(values, 0.75),
+        'Quantile .9': np.quantile(values, 0.9),
+      }
+
+    return summary
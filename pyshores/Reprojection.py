@@ -0,0 +1,164 @@
+from typing import Dict, List
+
+import numpy as np
+
+try:
+  from .GeometryArrays import GeometryArrays
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from GeometryArrays import GeometryArrays
+
+'''
+  coordinate reference systems of the pyshores stages and batched reprojection.
+
+  a crs is given either as a QgsCoordinateReferenceSystem (QGIS stages) or as
+  a string pyproj and QGIS both understand ("EPSG:32651", WKT). crsId turns
+  both into the string, so stages can compare them and record them in outputs.
+
+  coordinates are reprojected as whole (..., 2) arrays, every vertex of every
+  geometry in one call, never geometry by geometry:
+    with pyproj (pip install pyproj) through a cached Transformer,
+    without it through QGIS, all points as a single multipoint geometry.
+
+  Wgs84Copy collects geometries while a stage writes its outputs and writes
+  them, reprojected in one call, as a WGS84 GeoJSON (RFC 7946) copy next to them.
+'''
+
+class Reprojection:
+  WGS84 = "EPSG:4326"
+
+  # pyproj transformers by (source, target), building one is slow
+  transformers: Dict[tuple, object] = {}
+
+  @classmethod
+  def crsId(cls, crs) -> str:
+    '''
+      the authority id (e.g. "EPSG:3124") of a crs, its WKT if it has none
+    '''
+    if crs is None or isinstance(crs, str):
+      return crs
+
+    # QgsCoordinateReferenceSystem
+    return crs.authid() or crs.toWkt()
+
+  @classmethod
+  def isSame(cls, source, target) -> bool:
+    if source is None or target is None:
+      return True
+    if not isinstance(source, str) and not isinstance(target, str):
+      return source == target
+
+    return cls.crsId(source) == cls.crsId(target)
+
+  @classmethod
+  def transformer(cls, source: str, target: str):
+    '''
+      cached pyproj Transformer from source to target in x, y (east, north)
+      order, None without pyproj
+    '''
+    try:
+      import pyproj
+    except ImportError:
+      return None
+
+    key = (source, target)
+    if key not in cls.transformers:
+      cls.transformers[key] = pyproj.Transformer.from_crs(source, target, always_xy=True)
+
+    return cls.transformers[key]
+
+  @classmethod
+  def transform(cls, points: np.ndarray, source, target) -> np.ndarray:
+    '''
+      points (..., 2) from source to target, same shape
+    '''
+    points = np.asarray(points, dtype=float)
+    if cls.isSame(source, target) or points.size == 0:
+      return points
+
+    flat = points.reshape(-1, 2)
+    transformer = cls.transformer(cls.crsId(source), cls.crsId(target))
+    if transformer is not None:
+      x, y = transformer.transform(flat[:, 0], flat[:, 1])
+      return np.stack([x, y], axis=1).reshape(points.shape)
+
+    return cls.qgisTransform(flat, source, target).reshape(points.shape)
+
+  @classmethod
+  def qgisTransform(cls, points: np.ndarray, source, target) -> np.ndarray:
+    from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsGeometry, QgsPointXY, QgsProject
+
+    if isinstance(source, str):
+      source = QgsCoordinateReferenceSystem(source)
+    if isinstance(target, str):
+      target = QgsCoordinateReferenceSystem(target)
+
+    multipoint = QgsGeometry.fromMultiPointXY([QgsPointXY(x, y) for (x, y) in points])
+    multipoint.transform(QgsCoordinateTransform(source, target, QgsProject.instance()))
+
+    return np.array([[point.x(), point.y()] for point in multipoint.asMultiPoint()], dtype=float)
+
+  @classmethod
+  def transformParts(cls, parts: List[np.ndarray], source, target) -> List[np.ndarray]:
+    '''
+      the (M, 2) vertex arrays of a (multi)line, all reprojected in one call
+    '''
+    if cls.isSame(source, target) or parts == []:
+      return parts
+
+    lengths = [len(part) for part in parts]
+    vertices = cls.transform(np.concatenate([np.asarray(part, dtype=float).reshape(-1, 2) for part in parts]), source, target)
+    return np.split(vertices, np.cumsum(lengths)[:-1])
+
+  @classmethod
+  def transformLines(cls, lines: List[List[np.ndarray]], source, target) -> List[List[np.ndarray]]:
+    '''
+      the parts of many (multi)lines, every vertex of every line reprojected in one call
+    '''
+    if cls.isSame(source, target):
+      return lines
+
+    parts = cls.transformParts([part for line in lines for part in line], source, target)
+    ends = np.cumsum([len(line) for line in lines])
+    return [parts[end - len(line):end] for (line, end) in zip(lines, ends)]
+
+class Wgs84Copy:
+  '''
+    WGS84 GeoJSON copy of a stage output, written by close.
+    geometry_type is "Point" or "LineString", coordinates of a point are
+    (2,) and of a line (M, 2), in source_crs. without a file_path nothing
+    is collected or written
+  '''
+  def __init__(self, file_path: str, geometry_type: str, source_crs) -> None:
+    self.file_path = file_path
+    self.geometry_type = geometry_type
+    self.source_crs = source_crs
+    self.coordinates: List[np.ndarray] = []
+    self.properties: List[dict] = []
+
+  def add(self, coordinates, properties: dict = None):
+    if self.file_path is None:
+      return
+    self.coordinates.append(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+    self.properties.append(properties or {})
+
+  def extend(self, coordinates, properties: list):
+    '''
+      many geometries at once, coordinates (K, 2) of K points or a list of K lines
+    '''
+    if self.file_path is None:
+      return
+    self.coordinates.extend(np.asarray(geometry, dtype=float).reshape(-1, 2) for geometry in coordinates)
+    self.properties.extend(properties)
+
+  def close(self):
+    if self.file_path is None:
+      return
+
+    parts = Reprojection.transformParts(self.coordinates, self.source_crs, Reprojection.WGS84)
+    if self.geometry_type == "Point":
+      coordinates = [part[0] for part in parts]
+    else:
+      coordinates = parts
+
+    GeometryArrays.writeGeojson(self.file_path, self.geometry_type, coordinates, self.properties)
+    self.file_path = None
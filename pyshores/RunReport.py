@@ -0,0 +1,149 @@
+import json
+import os
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+try:
+  import resource
+except ImportError: # not available on windows
+  resource = None
+
+'''
+  instrumentation of a pyshores run, written as a json report next to its outputs.
+
+  report layout:
+    {
+      "name": stage class of the run (e.g. "intersects"),
+      "started": unix time of the start of the run,
+      "stages": [
+        {"name": "intersects/pair_loop", "wall_s": ..., "cpu_s": ...,
+         "peak_traced_bytes": ..., "max_rss_bytes": ...}, ...
+      ],
+      "counters": {"intersections": ..., "nan_cells": ..., ...}
+    }
+
+  stages nest, the name of a stage inside another is "<outer>/<inner>".
+  wall_s is elapsed time, cpu_s the cpu time of this process (not of worker
+  processes). peak_traced_bytes is the peak of python and numpy allocations
+  during the stage, only measured with trace_memory (tracemalloc slows
+  allocation heavy loops down). max_rss_bytes is the peak resident memory of
+  the process so far, where the platform reports it.
+
+  transect_hook, when set, is called by the hot loops with the time spent on
+  every transect: hook(transect_id, seconds, details). loops only time single
+  transects when a hook is set.
+'''
+
+class RunReport:
+  def __init__(self, name: str, trace_memory: bool = False, transect_hook: Callable[[int, float, dict], None] = None) -> None:
+    self.name = name
+    self.trace_memory = trace_memory
+    self.transect_hook = transect_hook
+    self.started = time.time()
+    self.stages: List[dict] = []
+    self.counters: Dict[str, int] = {}
+    self.open_stages: List[str] = []
+    # highest traced memory of every open stage, see foldPeak
+    self.open_peaks: List[int] = []
+
+  @classmethod
+  def maxRss(cls) -> int:
+    if resource is None:
+      return None
+
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+  def foldPeak(self):
+    '''
+      adds the traced peak since the last fold to every open stage and starts
+      a new peak, so nested stages each get their own peak without losing it
+      for the stages around them. python 3.8 has no reset_peak, there the
+      peak of a stage is the peak since tracing started
+    '''
+    peak = tracemalloc.get_traced_memory()[1]
+    self.open_peaks = [max(open_peak, peak) for open_peak in self.open_peaks]
+    if hasattr(tracemalloc, "reset_peak"):
+      tracemalloc.reset_peak()
+
+  @contextmanager
+  def stage(self, name: str):
+    self.open_stages.append(name)
+    full_name = "/".join(self.open_stages)
+
+    started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+      tracemalloc.start()
+    if self.trace_memory:
+      self.foldPeak()
+      self.open_peaks.append(tracemalloc.get_traced_memory()[0])
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+      yield self
+    finally:
+      peak = None
+      if self.trace_memory:
+        self.foldPeak()
+        peak = self.open_peaks.pop()
+
+      self.stages.append({
+        "name": full_name,
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": time.process_time() - cpu,
+        "peak_traced_bytes": peak,
+        "max_rss_bytes": self.maxRss()
+      })
+      self.open_stages.pop()
+
+      if started_tracing:
+        tracemalloc.stop()
+
+  def record(self, name: str, wall_s: float, cpu_s: float = None):
+    '''
+      adds a stage timed elsewhere, e.g. in a worker process
+    '''
+    self.stages.append({
+      "name": "/".join(self.open_stages + [name]),
+      "wall_s": wall_s,
+      "cpu_s": cpu_s,
+      "peak_traced_bytes": None,
+      "max_rss_bytes": None
+    })
+
+  def count(self, counter: str, n: int = 1):
+    self.counters[counter] = self.counters.get(counter, 0) + int(n)
+
+  @property
+  def profiling(self) -> bool:
+    return self.transect_hook is not None
+
+  def profileTransect(self, transect_id: int, seconds: float, **details):
+    if self.transect_hook is not None:
+      self.transect_hook(transect_id, seconds, details)
+
+  def toDict(self) -> dict:
+    return {
+      "name": self.name,
+      "started": self.started,
+      "stages": self.stages,
+      "counters": self.counters
+    }
+
+  def summary(self) -> str:
+    stages = ", ".join(
+      "{name} {wall:.2f}s".format(name=stage["name"], wall=stage["wall_s"])
+      for stage in self.stages
+      if "/" not in stage["name"]
+    )
+    counters = ", ".join("{k} {v}".format(k=k, v=v) for (k, v) in self.counters.items())
+    return "{name}: {stages}; {counters}".format(name=self.name, stages=stages, counters=counters)
+
+  def save(self, file_path: str):
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path, "w") as report_file:
+      json.dump(self.toDict(), report_file, indent=2)
@@ -0,0 +1,253 @@
+import os
+
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+  from .GeometryArrays import GeometryArrays
+  from .IntersectMatrix import IntersectMatrix
+  from .Reprojection import Reprojection
+  from .RunReport import RunReport
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from GeometryArrays import GeometryArrays
+  from IntersectMatrix import IntersectMatrix
+  from Reprojection import Reprojection
+  from RunReport import RunReport
+
+'''
+  datasets shared by the stages of one process.
+
+  IntersectFinder, CoastSatParser and MetricsCalculator all read the same
+  transects (normals) and time series. given the same Session, every input is
+  read and converted once, and every later stage gets the converted arrays:
+    LineDataset     the (multi)lines of a vector layer (transects, normals,
+                    shorelines) as flat arrays: the ids of the features, the
+                    vertices of every part and the requested attributes
+                    (e.g. dates), reprojected to a crs in one transform
+    IntersectMatrix the time series (csv parsed once, .npy memory mapped)
+
+  datasets are kept in a least recently used cache keyed by path, file size
+  and modification time (a rewritten file is read again) and the load options.
+  when the datasets take more than memory_budget bytes the least recently used
+  are dropped, the next stage asking for them reads them again. memory mapped
+  matrices count for nothing, their pages are the file cache of the OS.
+
+  a LineDataset is a sequence of DatasetFeature, which answers id() and
+  feature[attribute] as a QgsFeature does, so stages iterate over datasets
+  and layers alike. the geometry is read with parts, not with geometry().
+'''
+
+class DatasetFeature:
+  '''
+    one feature of a LineDataset
+  '''
+  __slots__ = ("dataset", "indx")
+
+  def __init__(self, dataset: 'LineDataset', indx: int) -> None:
+    self.dataset = dataset
+    self.indx = indx
+
+  def id(self) -> int:
+    return int(self.dataset.ids[self.indx])
+
+  def __getitem__(self, attribute: str):
+    return self.dataset.attributes[attribute][self.indx]
+
+  def parts(self) -> List[np.ndarray]:
+    return self.dataset.parts(self.indx)
+
+class LineDataset:
+  '''
+    features of (multi)lines as flat arrays.
+    vertices[part_offsets[p]:part_offsets[p + 1]] are the vertices of part p,
+    parts feature_offsets[f] to feature_offsets[f + 1] are the parts of feature f
+  '''
+  def __init__(
+    self,
+    ids: np.ndarray,
+    vertices: np.ndarray,
+    part_offsets: np.ndarray,
+    feature_offsets: np.ndarray,
+    attributes: Dict[str, np.ndarray] = None,
+    crs: str = None
+  ) -> None:
+    self.ids = ids
+    self.vertices = vertices
+    self.part_offsets = part_offsets
+    self.feature_offsets = feature_offsets
+    self.attributes = attributes if attributes is not None else {}
+    self.crs_id = crs
+
+  @classmethod
+  def fromLines(cls, ids: Sequence[int], lines: List[List[np.ndarray]], attributes: Dict[str, list] = None, crs: str = None) -> 'LineDataset':
+    parts = [np.asarray(part, dtype=float).reshape(-1, 2) for line in lines for part in line]
+    part_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(part) for part in parts], out=part_offsets[1:])
+    feature_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in lines], out=feature_offsets[1:])
+
+    return cls(
+      np.asarray(ids, dtype=np.int64),
+      np.concatenate(parts) if parts else np.empty((0, 2)),
+      part_offsets,
+      feature_offsets,
+      {name: np.asarray(values, dtype=object) for (name, values) in (attributes or {}).items()},
+      crs
+    )
+
+  def crs(self) -> str:
+    '''
+      the crs of the coordinates, a method as QgsVectorLayer.crs
+    '''
+    return self.crs_id
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def __getitem__(self, indx: int) -> DatasetFeature:
+    return DatasetFeature(self, indx)
+
+  def __iter__(self) -> Iterator[DatasetFeature]:
+    return (DatasetFeature(self, indx) for indx in range(len(self.ids)))
+
+  def parts(self, indx: int) -> List[np.ndarray]:
+    first, last = self.feature_offsets[indx], self.feature_offsets[indx + 1]
+    return [self.vertices[self.part_offsets[part]:self.part_offsets[part + 1]] for part in range(first, last)]
+
+  def endpoints(self) -> np.ndarray:
+    '''
+      (N, 2, 2) first and last vertex of the first part of every feature,
+      the transect array of the stages
+    '''
+    first = self.part_offsets[self.feature_offsets[:-1]]
+    last = self.part_offsets[self.feature_offsets[:-1] + 1] - 1
+    return np.stack([self.vertices[first], self.vertices[last]], axis=1)
+
+  def geometryBytes(self, indx: int) -> bytes:
+    '''
+      the vertices of a feature, for fingerprints
+    '''
+    first, last = self.feature_offsets[indx], self.feature_offsets[indx + 1]
+    return self.vertices[self.part_offsets[first]:self.part_offsets[last]].tobytes()
+
+  @property
+  def nbytes(self) -> int:
+    arrays = [self.ids, self.vertices, self.part_offsets, self.feature_offsets]
+    # attributes are python objects, counted at a pointer and a short string each
+    return sum(array.nbytes for array in arrays) + sum(64 * len(values) for values in self.attributes.values())
+
+class Session:
+  def __init__(self, memory_budget: int = 2 ** 30, report: RunReport = None) -> None:
+    '''
+      memory_budget: bytes of the cached datasets
+      report: RunReport counting the loads, hits and evictions of the cache
+    '''
+    self.memory_budget = memory_budget
+    self.report = report if report is not None else RunReport("session")
+    self.datasets: 'OrderedDict[tuple, Tuple[object, int]]' = OrderedDict()
+    self.cached_bytes = 0
+
+  @classmethod
+  def fileKey(cls, path: str) -> tuple:
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+  @classmethod
+  def datasetBytes(cls, dataset) -> int:
+    if isinstance(dataset, IntersectMatrix):
+      return 0 if isinstance(dataset.distances, np.memmap) else dataset.distances.nbytes
+    return dataset.nbytes
+
+  def get(self, key: tuple, loader):
+    '''
+      the dataset of key, loaded by loader() when it is not cached
+    '''
+    if key in self.datasets:
+      self.datasets.move_to_end(key)
+      self.report.count("session_hits")
+      return self.datasets[key][0]
+
+    with self.report.stage("session_load"):
+      dataset = loader()
+    size = self.datasetBytes(dataset)
+    self.report.count("session_loads")
+
+    self.datasets[key] = (dataset, size)
+    self.cached_bytes += size
+    self.evict(keep=key)
+
+    return dataset
+
+  def evict(self, keep: tuple = None):
+    '''
+      drops the least recently used datasets until the cache fits the budget.
+      keep (the dataset just loaded) stays, even alone over the budget
+    '''
+    for key in list(self.datasets):
+      if self.cached_bytes <= self.memory_budget:
+        break
+      if key == keep:
+        continue
+
+      _, size = self.datasets.pop(key)
+      self.cached_bytes -= size
+      self.report.count("session_evictions")
+
+  def clear(self):
+    self.datasets.clear()
+    self.cached_bytes = 0
+
+  def lines(self, path: str, attributes: Sequence[str] = (), crs=None) -> LineDataset:
+    '''
+      the LineDataset of a vector file with the given attributes, reprojected
+      to crs (a QgsCoordinateReferenceSystem or "EPSG:..." string) when given
+    '''
+    crs_id = Reprojection.crsId(crs)
+    key = ("lines", tuple(attributes), crs_id) + self.fileKey(path)
+    return self.get(key, lambda: self.readLines(path, list(attributes), crs))
+
+  def table(self, path: str) -> IntersectMatrix:
+    '''
+      the time series (CoastSat like table) of a .csv or IntersectMatrix file
+    '''
+    key = ("table",) + self.fileKey(path)
+    if IntersectMatrix.isMatrixPath(path):
+      return self.get(key, lambda: IntersectMatrix.load(path))
+    return self.get(key, lambda: IntersectMatrix.fromCSV(path))
+
+  @classmethod
+  def readLines(cls, path: str, attributes: List[str], crs=None) -> LineDataset:
+    '''
+      reads a geojson without QGIS, any other vector file through QGIS, once
+    '''
+    if os.path.splitext(path)[1].lower() == ".geojson":
+      lines, values, source = GeometryArrays.readGeojsonFeatures(path, attributes)
+      # ogr numbers geojson features from 0, as QGIS gives them
+      ids = np.arange(len(lines))
+    else:
+      from qgis.core import QgsFeatureRequest, QgsVectorLayer
+      try:
+        from .TransectGenerator import TransectUtility
+      except ImportError: # run as a script, e.g. from the QGIS python console
+        from TransectGenerator import TransectUtility
+
+      layer = QgsVectorLayer(path, os.path.basename(path), "ogr")
+      if not layer.isValid():
+        raise Exception("could not load {fp}".format(fp=path))
+      source = layer.crs()
+
+      request = QgsFeatureRequest().setSubsetOfAttributes(attributes, layer.fields())
+      ids, lines = [], []
+      values = {attribute: [] for attribute in attributes}
+      for feature in layer.getFeatures(request):
+        ids.append(feature.id())
+        lines.append(TransectUtility.geometryParts(feature.geometry()))
+        for attribute in attributes:
+          values[attribute].append(feature[attribute])
+
+    target = source if crs is None else crs
+    lines = Reprojection.transformLines(lines, source, target)
+    return LineDataset.fromLines(ids, lines, values, Reprojection.crsId(target))
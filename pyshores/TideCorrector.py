@@ -0,0 +1,149 @@
+import numpy as np
+
+try:
+  from .IntersectMatrix import IntersectMatrix
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from IntersectMatrix import IntersectMatrix
+
+'''
+  tidal correction of the dates x transects matrix of a CoastSat like time series.
+
+  a shoreline mapped at high tide lies landward of the same beach mapped at the
+  reference water level. on a beach of slope tan(beta) (beach_slope, rise over
+  run) the horizontal offset is (tide - reference_elevation) / beach_slope, and
+  the corrected cross shore distance is, as in CoastSat:
+
+    corrected[d, t] = distances[d, t] + (tide[d] - reference_elevation) / slope[t]
+
+  one broadcast of the (dates,) tides against the (transects,) slopes, no loop
+  over cells. nan cells stay nan.
+
+  inputs:
+    tides csv    dates,tide    water level of every shoreline date, in the datum of
+                               reference_elevation. dates are matched to the rows of
+                               the matrix by their text, missing dates are
+                               interpolated in time with interpolate
+    slopes       one slope for every transect, or a csv transect,slope
+                 (transect names as in the matrix columns)
+
+  large IntersectMatrix files are corrected in tiles of transects, from the
+  memory mapped input into a memory mapped output, so the matrix is never
+  fully in memory.
+'''
+
+class TideCorrector:
+  # cells of a tile of the memory mapped matrix corrected at once
+  budget_cells = 2 ** 24
+
+  @classmethod
+  def correct(cls, distances: np.ndarray, tide_levels: np.ndarray, slopes: np.ndarray, reference_elevation: float = 0) -> np.ndarray:
+    '''
+      (dates, transects) corrected distances
+    '''
+    offsets = np.asarray(tide_levels, dtype=float) - reference_elevation
+    return np.asarray(distances, dtype=float) + offsets[:, None] / np.asarray(slopes, dtype=float)[None, :]
+
+  @classmethod
+  def tideLevels(cls, dates, tides, interpolate: bool = False) -> np.ndarray:
+    '''
+      (dates,) water level of every date from a tides table (dates, tide columns)
+    '''
+    import pandas as pd
+
+    levels = pd.Series(tides['tide'].to_numpy(dtype=float), index=tides['dates'].astype(str))
+    levels = levels[~levels.index.duplicated()]
+    matched = levels.reindex([str(date) for date in dates]).to_numpy(dtype=float, copy=True)
+
+    missing = np.isnan(matched)
+    if missing.any() and interpolate:
+      table_times = pd.to_datetime(levels.index, dayfirst=True).to_numpy(dtype='datetime64[s]').astype(float)
+      times = pd.to_datetime(pd.Index([str(date) for date in dates]), dayfirst=True).to_numpy(dtype='datetime64[s]').astype(float)
+      order = np.argsort(table_times)
+      matched[missing] = np.interp(times[missing], table_times[order], levels.to_numpy()[order])
+      missing = np.isnan(matched)
+
+    if missing.any():
+      raise Exception("no tide level for dates {dates}".format(dates=[str(date) for date in np.asarray(dates)[missing][:10]]))
+
+    return matched
+
+  @classmethod
+  def transectSlopes(cls, transects, slopes) -> np.ndarray:
+    '''
+      (transects,) beach slope of every transect from one slope or a slopes table
+      (transect, slope columns)
+    '''
+    if np.isscalar(slopes):
+      transect_slopes = np.full(len(transects), float(slopes))
+    else:
+      table = slopes.set_index(slopes['transect'].astype(str))['slope']
+      transect_slopes = table.reindex([str(transect) for transect in transects]).to_numpy(dtype=float)
+      if np.isnan(transect_slopes).any():
+        missing = [transect for (transect, slope) in zip(transects, transect_slopes) if np.isnan(slope)]
+        raise Exception("no beach slope for transects {t}".format(t=missing[:10]))
+
+    if np.any(transect_slopes <= 0):
+      raise Exception("beach slopes must be positive")
+
+    return transect_slopes
+
+  @classmethod
+  def correctMatrix(cls, matrix: IntersectMatrix, tide_levels: np.ndarray, slopes: np.ndarray, output_path: str, reference_elevation: float = 0) -> IntersectMatrix:
+    '''
+      writes the corrected matrix to output_path (IntersectMatrix format) in
+      tiles of transects and returns it memory mapped
+    '''
+    n_dates, n_transects = matrix.distances.shape
+    npy_path, _ = IntersectMatrix.paths(output_path)
+    corrected = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.float64, shape=(n_dates, n_transects), fortran_order=True)
+
+    # column major on both sides, a tile of transects is one contiguous block
+    tile_size = max(1, cls.budget_cells // max(n_dates, 1))
+    for start in range(0, n_transects, tile_size):
+      tile = slice(start, start + tile_size)
+      corrected[:, tile] = cls.correct(matrix.distances[:, tile], tide_levels, slopes[tile], reference_elevation)
+
+    corrected.flush()
+    del corrected
+    IntersectMatrix.writeMetadata(output_path, matrix.dates, matrix.transects, matrix.crs)
+
+    return IntersectMatrix.load(output_path)
+
+  @classmethod
+  def correctTable(
+    cls,
+    input_path: str,
+    output_path: str,
+    tides_path: str,
+    slopes,
+    reference_elevation: float = 0,
+    interpolate: bool = False
+  ) -> IntersectMatrix:
+    '''
+      corrects a CoastSat like table (.csv or IntersectMatrix .npy) and writes it
+      to output_path, format by extension. slopes is one slope or the path of a
+      slopes csv
+    '''
+    import pandas as pd
+
+    if IntersectMatrix.isMatrixPath(input_path):
+      matrix = IntersectMatrix.load(input_path)
+    else:
+      matrix = IntersectMatrix.fromCSV(input_path)
+
+    if isinstance(slopes, str):
+      slopes = pd.read_csv(slopes)
+    tide_levels = cls.tideLevels(matrix.dates, pd.read_csv(tides_path), interpolate)
+    transect_slopes = cls.transectSlopes(matrix.transects, slopes)
+
+    if IntersectMatrix.isMatrixPath(output_path):
+      return cls.correctMatrix(matrix, tide_levels, transect_slopes, output_path, reference_elevation)
+
+    corrected = IntersectMatrix(
+      matrix.dates,
+      matrix.transects,
+      cls.correct(matrix.distances, tide_levels, transect_slopes, reference_elevation),
+      matrix.crs
+    )
+    corrected.toCSV(output_path)
+    return corrected
@@ -0,0 +1,134 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+try:
+  from .IntersectMatrix import IntersectMatrix
+  from .RatesBootstrap import RatesBootstrap
+  from .RatesEngine import RatesEngine
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from IntersectMatrix import IntersectMatrix
+  from RatesBootstrap import RatesBootstrap
+  from RatesEngine import RatesEngine
+
+'''
+  rates of an intersects table too large for memory, computed in tiles of transects.
+
+  every tile is a contiguous range of transects (columns) of the table. with an
+  IntersectMatrix (.npy) the matrix is memory mapped and stored column major, so
+  a tile is one contiguous block of the file and reading it only reads that block.
+  a csv is parsed again for every tile with only the columns of the tile kept,
+  convert it to .npy first (pyshores convert) for large tables.
+
+  tiles are sized so that a tile and the temporaries of RatesEngine.compute
+  stay under memory_budget bytes. they run in worker processes, every worker
+  opens the table once, and the rates of every tile are yielded in transect
+  order as soon as they are done, so the caller can stream them to its outputs.
+'''
+
+class TiledRates:
+  # arrays of the size of a tile alive at once in RatesEngine.compute
+  # ... (the tile, its sorted copy, masks and regression temporaries)
+  tile_copies = 12
+
+  # set in worker processes by initWorker
+  worker_table = None
+
+  @classmethod
+  def tileSize(cls, n_dates: int, memory_budget: int) -> int:
+    return max(1, memory_budget // (max(n_dates, 1) * 8 * cls.tile_copies))
+
+  @classmethod
+  def openTable(cls, path: str):
+    '''
+      the memory mapped IntersectMatrix of path, or the column names of a csv
+    '''
+    if IntersectMatrix.isMatrixPath(path):
+      return IntersectMatrix.load(path)
+
+    import pandas as pd
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+  @classmethod
+  def readTile(cls, path: str, table, start: int, stop: int) -> np.ndarray:
+    '''
+      (dates, stop - start) distances of the transects start to stop
+    '''
+    if isinstance(table, IntersectMatrix):
+      return np.asarray(table.distances[:, start:stop], dtype=float)
+
+    import pandas as pd
+    columns = table[1 + start:1 + stop]
+    return pd.read_csv(path, usecols=columns)[columns].to_numpy(dtype=float)
+
+  @classmethod
+  def tableIndex(cls, path: str) -> Tuple[List[str], List[str]]:
+    '''
+      (dates, transects) of a table, without reading its distances
+    '''
+    table = cls.openTable(path)
+    if isinstance(table, IntersectMatrix):
+      return table.dates, table.transects
+
+    import pandas as pd
+    return pd.read_csv(path, usecols=['dates'])['dates'].astype(str).tolist(), table[1:]
+
+  @classmethod
+  def initWorker(cls, path: str, years: np.ndarray, uncertainty: np.ndarray, bootstrap: dict):
+    cls.worker_table = (path, cls.openTable(path), years, uncertainty, bootstrap)
+
+  @classmethod
+  def tileTask(cls, tile: Tuple[int, int]) -> Tuple[int, Dict[str, np.ndarray], int]:
+    '''
+      (start, rates, nan cells) of one tile, in a worker initialized by initWorker
+    '''
+    path, table, years, uncertainty, bootstrap = cls.worker_table
+    start, stop = tile
+    distances = cls.readTile(path, table, start, stop)
+
+    rates = RatesEngine.compute(years, distances, uncertainty)
+    if bootstrap is not None:
+      # the count matrix only depends on the seed and the dates, so every
+      # ... tile resamples the same dates and the bounds match an untiled run
+      rates.update(RatesBootstrap.compute(years, distances, uncertainty, processes=1, **bootstrap))
+
+    return start, rates, int(np.count_nonzero(np.isnan(distances)))
+
+  @classmethod
+  def compute(
+    cls,
+    path: str,
+    years: np.ndarray,
+    uncertainty: np.ndarray = None,
+    memory_budget: int = 2 ** 30,
+    processes: int = 1,
+    bootstrap: dict = None
+  ) -> Iterator[Tuple[int, Dict[str, np.ndarray], int]]:
+    '''
+      yields (first transect, rates, nan cells) of every tile in transect order.
+      years and uncertainty are the (dates,) arrays of RatesEngine.compute for
+      the rows of the table. bootstrap, when given, holds the keyword arguments
+      of RatesBootstrap.compute (n_replicates, level, seed)
+    '''
+    table = cls.openTable(path)
+    n_transects = len(table.transects) if isinstance(table, IntersectMatrix) else len(table) - 1
+
+    # the (replicates, transects) sums of the bootstrap are tiled by RatesBootstrap itself
+    tile_size = cls.tileSize(len(years), memory_budget)
+    tiles = [(start, min(start + tile_size, n_transects)) for start in range(0, n_transects, tile_size)]
+
+    if processes == 1 or len(tiles) <= 1:
+      cls.initWorker(path, years, uncertainty, bootstrap)
+      for tile in tiles:
+        yield cls.tileTask(tile)
+      return
+
+    with ProcessPoolExecutor(
+      max_workers=processes,
+      initializer=cls.initWorker,
+      initargs=(path, years, uncertainty, bootstrap)
+    ) as executor:
+      # map keeps the order of the tiles, results wait until the tiles before them are written
+      for result in executor.map(cls.tileTask, tiles):
+        yield result
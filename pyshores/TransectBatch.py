@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+  from .AzimuthSmoother import AzimuthSmoother
+  from .GeometryArrays import GeometryArrays
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from AzimuthSmoother import AzimuthSmoother
+  from GeometryArrays import GeometryArrays
+
+'''
+  transect generation for many sites (coastal cells) at once.
+
+  a site is a landward and a seaward baseline, each given as a list of (M, 2)
+  vertex arrays (one per part). the transects of a site are generated the same
+  way as TransectGenerator.run does for a single pair of baselines:
+    origins every spacing meters along the landward baseline,
+    azimuth of the shortest line from every origin to the seaward baseline,
+    azimuths smoothed along the baseline (AzimuthSmoother),
+    transects of transect_length meters from every origin along the smoothed azimuth.
+
+  everything is plain NumPy, so sites are spread over worker processes
+  without sending QGIS objects to them.
+
+  transect names are "<site>_T<index along the site baseline>". they only
+  depend on the site and its baselines, so they stay the same when other sites
+  are added, removed or changed, and they are unique across sites.
+'''
+
+class TransectBatch:
+  @classmethod
+  def transectName(cls, site: str, indx: int) -> str:
+    return "{site}_T{indx}".format(site=site, indx=indx)
+
+  @classmethod
+  def siteTransects(
+    cls,
+    landward_parts: List[np.ndarray],
+    seaward_parts: List[np.ndarray],
+    spacing: float = 5,
+    transect_length: float = 50,
+    window_size: int = 7,
+    kernel: str = "boxcar",
+    edges: str = "shrink",
+    sigma: float = None
+  ) -> np.ndarray:
+    '''
+      (N, 2, 2) transects of one site, transects[i] = [origin, end]
+    '''
+    n_origins = int(GeometryArrays.partsLength(landward_parts) // spacing) + 1
+    origins = GeometryArrays.interpolateParts(landward_parts, np.arange(n_origins) * float(spacing))
+
+    nearest, _ = GeometryArrays.nearestOnSegments(origins, GeometryArrays.partsSegments(seaward_parts))
+    direction = nearest - origins
+    azimuths = np.degrees(np.arctan2(direction[:, 0], direction[:, 1]))
+
+    smoothed = np.radians(AzimuthSmoother.smooth(azimuths, window_size, kernel=kernel, edges=edges, sigma=sigma))
+    ends = origins + transect_length * np.stack([np.sin(smoothed), np.cos(smoothed)], axis=1)
+
+    return np.stack([origins, ends], axis=1)
+
+  @classmethod
+  def siteTask(cls, task: Tuple[List[np.ndarray], List[np.ndarray], dict]) -> np.ndarray:
+    landward_parts, seaward_parts, options = task
+    return cls.siteTransects(landward_parts, seaward_parts, **options)
+
+  @classmethod
+  def generate(
+    cls,
+    sites: Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]],
+    processes: int = None,
+    **options
+  ) -> Dict[str, np.ndarray]:
+    '''
+      transects of every site, keyed by site in sorted order.
+      sites are generated in a pool of processes worker processes,
+      1 generates them one after the other in this process.
+      options are the keyword arguments of siteTransects
+    '''
+    names = sorted(sites)
+    tasks = [(sites[name][0], sites[name][1], options) for name in names]
+
+    if processes == 1 or len(tasks) <= 1:
+      results = [cls.siteTask(task) for task in tasks]
+    else:
+      with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(cls.siteTask, tasks))
+
+    return dict(zip(names, results))
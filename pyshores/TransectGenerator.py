@@ -1,16 +1,43 @@
+import csv
 import os
 
-from typing import List
+from typing import Dict, List, Tuple
 from numpy import outer
 from qgis.core import *
-from geojson import Feature, LineString, FeatureCollection
+from qgis.PyQt.QtCore import QVariant
 
 import math
+import numpy as np
+
+try:
+  from .FeatureSink import FeatureSink
+  from .AzimuthSmoother import AzimuthSmoother
+  from .GeometryArrays import GeometryArrays
+  from .Reprojection import Reprojection
+  from .RunReport import RunReport
+  from .TransectBatch import TransectBatch
+except ImportError: # run as a script, e.g. from the QGIS python console
+  from FeatureSink import FeatureSink
+  from AzimuthSmoother import AzimuthSmoother
+  from GeometryArrays import GeometryArrays
+  from Reprojection import Reprojection
+  from RunReport import RunReport
+  from TransectBatch import TransectBatch
 
 #####---------------------------DEFINE VARIABLES HERE-----------------------------------####
 landward_baseline_name = "lw_baseline" # define name here
 seaward_baseline_name = "sw_baseline" # define name here
 spacing = 5 # transect origin spacing in meters
+smoothing_kernel = "boxcar" # boxcar or gaussian, see AzimuthSmoother
+smoothing_edges = "shrink" # shrink, reflect, wrap or none, see AzimuthSmoother
+output_format = "shp" # shp, gpkg, fgb or parquet, see FeatureSink
+wgs84 = False # also write a WGS84 copy of the transects geojson
+
+# batch mode, many sites in one run (see BatchTransectGenerator)
+batch = False
+site_field = "site" # attribute naming the site of every baseline feature
+manifest_fileName = None # or a csv of site,landward,seaward layers in the transects folder
+processes = None # worker processes, None uses every core
 #####---------------------------END-------------------------------------------------####
 
 # recommended file structure
@@ -25,28 +52,6 @@ spacing = 5 # transect origin spacing in meters
 # ... └── transects
 
 class TransectUtility:
-  @classmethod
-  def movingWindow(cls, myList, size):
-    left = 0
-    right = 0
-
-    newList = myList.copy()
-
-    while right <= len(newList) - 1:
-      if right - left + 1 == size:
-        average = sum(newList[left:right+1])/size
-        newList[left+size//2] = average
-
-
-        left+=1
-        right+=1
-
-      else: 
-        # keep moving right
-        right+=1
-    
-    return newList
-
   @classmethod
   def nextPoint(cls, azimuth, distance, origin) -> QgsPointXY:
     x = distance*math.cos(math.radians(90-azimuth))
@@ -55,9 +60,50 @@ class TransectUtility:
     return QgsPointXY(origin[0]+x, origin[1]+y) 
 
   @classmethod
-  def format_output_path(cls, output_dirname: str):
+  # converts a (multi)line geometry to a list of (M, 2) vertex arrays, one per part
+  def geometryParts(cls, geometry: QgsGeometry) -> List[np.ndarray]:
+    if QgsWkbTypes.isMultiType(geometry.wkbType()):
+      polylines = geometry.asMultiPolyline()
+    else:
+      polylines = [geometry.asPolyline()]
+
+    return [
+      np.array([[point.x(), point.y()] for point in polyline], dtype=float)
+      for polyline in polylines
+    ]
+
+  @classmethod
+  # the parts of the first feature of a layer, reprojected to crs in one batched transform
+  def baselineParts(cls, layer: QgsVectorLayer, crs: QgsCoordinateReferenceSystem) -> List[np.ndarray]:
+    parts = cls.geometryParts(cls.extract_geometries(layer)[0])
+    return Reprojection.transformParts(parts, layer.crs(), crs)
+
+  @classmethod
+  # the crs of the transects: crs when given, else the one of the baseline
+  # ... layer, else the one of the open QGIS project. spacing and lengths are
+  # ... in meters, so it must be projected
+  def projectedCrs(cls, crs: QgsCoordinateReferenceSystem = None, layer: QgsVectorLayer = None) -> QgsCoordinateReferenceSystem:
+    if isinstance(crs, str):
+      crs = QgsCoordinateReferenceSystem(crs)
+    if crs is None and layer is not None and layer.crs().isValid():
+      crs = layer.crs()
+    if crs is None:
+      crs = QgsProject.instance().crs()
+
+    if crs.isGeographic():
+      raise Exception("transects need a projected crs in meters, got {crs}, give the crs to reproject the baselines to".format(
+        crs=Reprojection.crsId(crs)
+      ))
+
+    return crs
+
+  @classmethod
+  def format_output_path(cls, output_dirname: str, project_path: str = None):
+    if project_path is None:
+      project_path = QgsProject.instance().homePath()
+
     file_path = "{homepath}/{output_directory}".format(
-      homepath=QgsProject.instance().homePath(),
+      homepath=project_path,
       output_directory=output_dirname
     )
     return file_path
@@ -75,7 +121,8 @@ class TransectUtility:
     return geometries
 
   @classmethod
-  # writes shape files
+  # writes shape files, or any other FeatureSink output format
+  # ... the extension of output_fileName is replaced by the one of the format
   def init_shpWriter(
     cls,
     output_path: str,
@@ -83,19 +130,19 @@ class TransectUtility:
     geometry_type,  # QgsWkbTypes
     fields: QgsFields,
     srs: QgsCoordinateReferenceSystem, 
-  ) -> QgsVectorFileWriter:
+    output_format: str = "shp"
+  ) -> FeatureSink:
     output_filePath = "{output_path}/{output_fileName}".format(
       output_path=output_path,
       output_fileName=output_fileName
     )
 
-    writer = QgsVectorFileWriter(
+    writer = FeatureSink(
       output_filePath,
-      "UTF-8",
       fields,
       geometry_type,
-      srs=srs,
-      driverName = "ESRI Shapefile"
+      srs,
+      output_format=output_format
     )
 
     return writer
@@ -119,13 +166,42 @@ class TransectGenerator:
     seaward_baseline: QgsVectorLayer,
     spacing_m: int = 5,
     output_path: str = "transects", 
-    crs: QgsCoordinateReferenceSystem = QgsProject.instance().crs()
+    crs: QgsCoordinateReferenceSystem = None,
+    project_path: str = None,
+    transect_length: int = 50,
+    window_size: int = 7,
+    smoothing_kernel: str = "boxcar",
+    smoothing_edges: str = "shrink",
+    smoothing_sigma: float = None,
+    report: RunReport = None,
+    output_format: str = "shp",
+    wgs84: bool = False
   ) -> None:
+    # crs defaults to the one of the landward baseline, project path to the one of the open QGIS project
+    # ... resolved here and not in the signature so importing this module does not need a project
+    # baselines in another crs are reprojected to crs
+    crs = TransectUtility.projectedCrs(crs, landward_baseline)
+    if project_path is None:
+      project_path = QgsProject.instance().homePath()
+
     self.landward_baseline = landward_baseline
     self.seaward_baseline = seaward_baseline
     self.spacing = spacing_m 
     self.crs = crs
-    self.output_path= TransectUtility.format_output_path(output_path)
+    self.project_path = project_path
+    self.transect_length = transect_length
+    self.window_size = window_size
+    self.smoothing_kernel = smoothing_kernel
+    self.smoothing_edges = smoothing_edges
+    self.smoothing_sigma = smoothing_sigma
+    self.output_path= TransectUtility.format_output_path(output_path, project_path)
+
+    # timings and counters of the run, see RunReport
+    self.report = report if report is not None else RunReport("transects")
+    # shp, gpkg, fgb or parquet, see FeatureSink
+    self.output_format = output_format
+    # also write <name>_wgs84.geojson
+    self.wgs84 = wgs84
 
   # creates equally spaced points in landward baseline
   # ... spaced in meters defined by the spacing attribute
@@ -134,36 +210,36 @@ class TransectGenerator:
     # assumes only one feature (landward baseline line) in the landward baseline layer
     # then get the geometry of the baseline
     #
-    # start with distance of 0, keep increasing the distance by the spacing until
-    # the distance is greater than the lenght of the baseline geometry, all the while
-    # interpolating to get the point associated with the interpolation of the given distance
-    transect_origins: List[QgsPointXY] = []
-    lw_baseline_geometry = TransectUtility.extract_geometries(
-      self.landward_baseline
-    )[0]
-
-    current_distance = 0
-    while current_distance <= lw_baseline_geometry.length():
-      point = lw_baseline_geometry.interpolate(current_distance).asPoint()
-      transect_origins.append(point)
-
-      current_distance += self.spacing
-    
+    # every distance from 0 to the length of the baseline geometry in steps of
+    # the spacing is interpolated at once along the baseline vertices
+    lw_baseline_parts = TransectUtility.baselineParts(self.landward_baseline, self.crs)
+
+    n_origins = int(GeometryArrays.partsLength(lw_baseline_parts) // self.spacing) + 1
+    distances = np.arange(n_origins) * float(self.spacing)
+    points = GeometryArrays.interpolateParts(lw_baseline_parts, distances)
+
+    transect_origins: List[QgsPointXY] = [QgsPointXY(x, y) for (x, y) in points]
     return transect_origins
 
   # generates a list of all shortest lines from a transect 
   # ... origin to the seaward baseline
+  #
+  # the closest point on the seaward baseline is found for all origins at once
+  # ... by GeometryArrays.nearestOnSegments, which only projects each block of
+  # ... origins on the baseline segments that can hold its nearest point
   def generateTransects(self, transect_origins: List[QgsPointXY]) -> List[QgsLineString]:
     # get the seaward baseline
     # assume only one feature in seaward baseline which is the seaward baseline
     # then get the geometry
-    transects : List[QgsLineString] = []
-    sw_baseline_geom = TransectUtility.extract_geometries(self.seaward_baseline)[0]
+    sw_baseline_segments = GeometryArrays.partsSegments(TransectUtility.baselineParts(self.seaward_baseline, self.crs))
 
-    for transect_origin in transect_origins:
-      transect = QgsGeometry.fromPointXY(transect_origin).shortestLine(sw_baseline_geom).asPolyline()
-      transects.append(transect)
-    
+    origins = np.array([[origin.x(), origin.y()] for origin in transect_origins], dtype=float)
+    nearest, _ = GeometryArrays.nearestOnSegments(origins, sw_baseline_segments)
+
+    transects : List[QgsLineString] = [
+      [transect_origin, QgsPointXY(x, y)]
+      for (transect_origin, (x, y)) in zip(transect_origins, nearest)
+    ]
     return transects
 
   def filterTransects(self, transect_origins: List[QgsPointXY], transects_unfiltered: List[QgsLineString], distance: int, window_size: int) -> List[QgsLineString]:
@@ -172,15 +248,21 @@ class TransectGenerator:
     # get azimuths
     azimuths = [line[0].azimuth(line[1]) for line in transects_unfiltered]
 
-    # do moving window
-    averaged_azimuths = TransectUtility.movingWindow(azimuths, window_size)
+    # smooth the azimuths as unit vectors, every window from the original azimuths
+    averaged_azimuths = AzimuthSmoother.smooth(
+      azimuths,
+      window_size,
+      kernel=self.smoothing_kernel,
+      edges=self.smoothing_edges,
+      sigma=self.smoothing_sigma
+    )
 
     # assure averaged azimuths same number with transect origins
     if len(averaged_azimuths) != len(transect_origins):
       raise Exception("inconsistent number of azimuths and origins")
 
     # create a new line based on the coordinates
-    for azimuth, origin in zip(averaged_azimuths, transect_origins):
+    for azimuth, origin in zip(averaged_azimuths.tolist(), transect_origins):
       line = [origin, TransectUtility.nextPoint(azimuth, distance, origin)]
       filtered_lines.append(line)
 
@@ -191,14 +273,15 @@ class TransectGenerator:
     output_fileName: str = "transectOrigins_{basename}.shp".format(basename=self.landward_baseline.name())
     geometry_type = QgsWkbTypes.Point
     fields: QgsFields = QgsFields()
-    srs = QgsProject.instance().crs()
+    srs = self.crs
 
     writer = TransectUtility.init_shpWriter(
       self.output_path,
       output_fileName,
       geometry_type,
       fields,
-      srs
+      srs,
+      output_format=self.output_format
     )
 
     for transect_origin in transect_origins:
@@ -214,14 +297,15 @@ class TransectGenerator:
     output_fileName: str = "transects_{basename}.shp".format(basename=self.landward_baseline.name())
     geometry_type = QgsWkbTypes.LineString
     fields: QgsFields = QgsFields()
-    srs = QgsProject.instance().crs()
+    srs = self.crs
 
     writer = TransectUtility.init_shpWriter(
       self.output_path,
       output_fileName,
       geometry_type,
       fields,
-      srs
+      srs,
+      output_format=self.output_format
     )
 
     for transect in transects:
@@ -235,61 +319,276 @@ class TransectGenerator:
     del writer
 
   def save_asGeojson(self, transects: List[QgsGeometry]):
-    feats: List[Feature] = []
+    transect_array = np.array([[[point.x(), point.y()] for point in transect] for transect in transects], dtype=float).reshape(-1, 2, 2)
+    names = ["T{indx}".format(indx=transect_indx) for transect_indx in range(len(transect_array))]
 
-    for (transect_indx, transect) in enumerate(transects):
-      transect_name = "T{indx}".format(indx=transect_indx)
-      transect_geometry = transect
+    geojson_name = QgsProject.instance().baseName() or self.landward_baseline.name()
+    output_path = self.output_path + '/' + geojson_name + '.geojson'
+    GeometryArrays.writeGeojsonTransects(output_path, transect_array, names, Reprojection.crsId(self.crs))
 
-      properties = {"name": transect_name}
-      geometry=LineString([(transect[0].x(), transect[0].y()), (transect[1].x(), transect[1].y())])
-      feature = Feature(geometry=geometry, properties=properties)
+    if self.wgs84:
+      GeometryArrays.writeGeojsonTransects(
+        self.output_path + '/' + geojson_name + '_wgs84.geojson',
+        Reprojection.transform(transect_array, self.crs, Reprojection.WGS84),
+        names
+      )
 
-      feats.append(feature)
-    
+  def run(self):
+    with self.report.stage("origins"):
+      transect_origins = self.generateTransectOrigins() 
+    with self.report.stage("nearest"):
+      transects = self.generateTransects(transect_origins)
+    with self.report.stage("smoothing"):
+      transects = self.filterTransects(transect_origins, transects, self.transect_length, self.window_size)
 
-    crs_info = ['EPSG', 3124]
-    crs_name = "urn:ogc:def:crs:{authority}::{code}".format(authority=crs_info[0], code=crs_info[1])
-    feature_collection = FeatureCollection(
-      crs={ "type": "name", "properties": { "name": crs_name } },
-      features=feats
-    )
+    TransectUtility.init_output_path(self.output_path)
 
-    geojson_filename = QgsProject.instance().baseName() + '.geojson'
-    output_path = QgsProject.instance().homePath() + '/transects/' + geojson_filename
+    with self.report.stage("write"):
+      self.saveTransectOrigins(transect_origins)
+      self.saveTransects(transects)
+      self.save_asGeojson(transects)
+    self.report.count("transects_written", len(transects))
 
-    with open(output_path, "w") as text_file:
-      text_file.write("{0}".format(feature_collection))
+    print('transects generated!')
+    self.report.save(self.output_path + "/transects_report.json")
+    print(self.report.summary())
+
+class BatchTransectGenerator:
+  '''
+    generates the transects of many sites (coastal cells) in one run, the
+    sites are spread over worker processes by TransectBatch.
+
+    sites come either from
+      one landward and one seaward layer holding the baselines of every site,
+        keyed by the site_field attribute, or
+      a manifest csv with a site, landward and seaward column, naming one
+        layer per baseline (relative to the transects folder).
+    a site may have more than one feature per baseline, their parts are
+    walked in feature id order.
+
+    writes, in the transects folder
+      <site>/transects_<site>.shp, transectOrigins_<site>.shp and <site>.geojson per site
+      transects_merged.shp and transects_merged.geojson with the transects of every site
+    every transect has a name ("<site>_T<index>", unique across sites and stable
+    between runs), its site and its index along the site baseline
+  '''
+  def __init__(
+    self,
+    spacing_m: float = 5,
+    output_path: str = "transects",
+    crs: QgsCoordinateReferenceSystem = None,
+    project_path: str = None,
+    transect_length: float = 50,
+    window_size: int = 7,
+    smoothing_kernel: str = "boxcar",
+    smoothing_edges: str = "shrink",
+    smoothing_sigma: float = None,
+    processes: int = None,
+    report: RunReport = None,
+    output_format: str = "shp",
+    wgs84: bool = False
+  ) -> None:
+    # baselines in another crs are reprojected to crs
+    crs = TransectUtility.projectedCrs(crs)
+    if project_path is None:
+      project_path = QgsProject.instance().homePath()
 
-  def run(self):
-    transect_origins = self.generateTransectOrigins() 
-    transects = self.generateTransects(transect_origins)
-    transects = self.filterTransects(transect_origins, transects, 50, 7)
+    self.crs = crs
+    self.project_path = project_path
+    self.output_path = TransectUtility.format_output_path(output_path, project_path)
+    self.processes = processes
+    self.report = report if report is not None else RunReport("transects_batch")
+    self.output_format = output_format
+    self.wgs84 = wgs84
+    self.options = {
+      "spacing": spacing_m,
+      "transect_length": transect_length,
+      "window_size": window_size,
+      "kernel": smoothing_kernel,
+      "edges": smoothing_edges,
+      "sigma": smoothing_sigma
+    }
 
-    TransectUtility.init_output_path(self.output_path)
+  @classmethod
+  # parts of every feature of a layer, grouped by the value of site_field
+  # ... (every feature of the layer when site_field is None)
+  # ... reprojected to crs in one batched transform of every vertex of the layer
+  def layerParts(cls, layer: QgsVectorLayer, site_field: str = None, crs: QgsCoordinateReferenceSystem = None) -> Dict[str, List[np.ndarray]]:
+    parts: Dict[str, List[np.ndarray]] = {}
+    for feature in sorted(layer.getFeatures(), key=lambda feature: feature.id()):
+      site = str(feature[site_field]) if site_field is not None else layer.name()
+      parts.setdefault(site, []).extend(TransectUtility.geometryParts(feature.geometry()))
+
+    sites = list(parts)
+    reprojected = Reprojection.transformLines([parts[site] for site in sites], layer.crs(), crs)
+    return dict(zip(sites, reprojected))
+
+  def sitesFromLayers(
+    self,
+    landward_baselines: QgsVectorLayer,
+    seaward_baselines: QgsVectorLayer,
+    site_field: str = "site"
+  ) -> Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]]:
+    landward = self.layerParts(landward_baselines, site_field, self.crs)
+    seaward = self.layerParts(seaward_baselines, site_field, self.crs)
+
+    missing = set(landward) ^ set(seaward)
+    if missing:
+      raise Exception("sites without both baselines: {sites}".format(sites=", ".join(sorted(missing))))
+
+    return {site: (landward[site], seaward[site]) for site in landward}
+
+  def sitesFromManifest(self, manifest_filePath: str) -> Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]]:
+    sites = {}
+    with open(manifest_filePath, newline="") as manifest_file:
+      for row in csv.DictReader(manifest_file):
+        baselines = []
+        for column in ("landward", "seaward"):
+          layer = QgsVectorLayer(os.path.join(self.project_path, "transects", row[column]), row[column], "ogr")
+          if not layer.isValid():
+            raise Exception("could not load {column} baseline {fn} of site {site}".format(
+              column=column,
+              fn=row[column],
+              site=row["site"]
+            ))
+          baselines.append(self.layerParts(layer, crs=self.crs)[layer.name()])
+
+        if row["site"] in sites:
+          raise Exception("site {site} is listed twice".format(site=row["site"]))
+        sites[row["site"]] = tuple(baselines)
+
+    return sites
+
+  # writes one shapefile of transects (or of their origins) with their names
+  def saveShp(self, output_path: str, output_fileName: str, sites: Dict[str, np.ndarray], origins_only: bool = False):
+    fields = QgsFields()
+    fields.append(QgsField("name", QVariant.String))
+    fields.append(QgsField("site", QVariant.String))
+    fields.append(QgsField("site_tid", QVariant.Int))
 
-    self.saveTransectOrigins(transect_origins)
-    self.saveTransects(transects)
-    self.save_asGeojson(transects)
-    print('transects generated!')
+    writer = TransectUtility.init_shpWriter(
+      output_path,
+      output_fileName,
+      QgsWkbTypes.Point if origins_only else QgsWkbTypes.LineString,
+      fields,
+      self.crs,
+      output_format=self.output_format
+    )
+
+    for (site, transects) in sites.items():
+      for (indx, transect) in enumerate(transects):
+        fet = QgsFeature()
+        if origins_only:
+          fet.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*transect[0])))
+        else:
+          fet.setGeometry(QgsGeometry.fromPolylineXY([QgsPointXY(*transect[0]), QgsPointXY(*transect[1])]))
+        fet.setAttributes([TransectBatch.transectName(site, indx), site, indx])
+
+        writer.addFeature(fet)
 
-project = QgsProject.instance() 
-landward_baseline = project.mapLayersByName(landward_baseline_name)
-seaward_baseline = project.mapLayersByName(seaward_baseline_name)
-
-if landward_baseline == [] and seaward_baseline == []:
-  print('check layer names. all layers not detected')
-elif landward_baseline == []:
-  print('check landward baseline name. layer not detected')
-elif seaward_baseline == []:
-  print('check seaward baseline name. layer not detected')
-else:
-  landward_baseline_ = landward_baseline[0]
-  seaward_baseline_ = seaward_baseline[0]
-  t = TransectGenerator(
-    landward_baseline_,
-    seaward_baseline_,
-    spacing
+    del writer
+
+  # writes the transects of sites with their names, and a WGS84 copy
+  # ... (<name>_wgs84.geojson) when wgs84 is set
+  def saveGeojson(self, output_filePath: str, sites: Dict[str, np.ndarray]):
+    transects = np.concatenate([np.asarray(site_transects, dtype=float).reshape(-1, 2, 2) for site_transects in sites.values()])
+    properties = [
+      {"name": TransectBatch.transectName(site, indx), "site": site, "site_tid": indx}
+      for (site, site_transects) in sites.items()
+      for indx in range(len(site_transects))
+    ]
+    GeometryArrays.writeGeojson(output_filePath, "LineString", transects, properties, Reprojection.crsId(self.crs))
+
+    if self.wgs84:
+      GeometryArrays.writeGeojson(
+        os.path.splitext(output_filePath)[0] + "_wgs84.geojson",
+        "LineString",
+        Reprojection.transform(transects, self.crs, Reprojection.WGS84),
+        properties
+      )
+
+  def run(self, sites: Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]]) -> Dict[str, np.ndarray]:
+    # cpu time of this stage does not include the worker processes
+    with self.report.stage("generate"):
+      site_transects = TransectBatch.generate(sites, processes=self.processes, **self.options)
+
+    with self.report.stage("write"):
+      for (site, transects) in site_transects.items():
+        site_output_path = os.path.join(self.output_path, site)
+        TransectUtility.init_output_path(site_output_path)
+
+        self.saveShp(site_output_path, "transects_{site}.shp".format(site=site), {site: transects})
+        self.saveShp(site_output_path, "transectOrigins_{site}.shp".format(site=site), {site: transects}, origins_only=True)
+        self.saveGeojson(os.path.join(site_output_path, "{site}.geojson".format(site=site)), {site: transects})
+
+      self.saveShp(self.output_path, "transects_merged.shp", site_transects)
+      self.saveGeojson(os.path.join(self.output_path, "transects_merged.geojson"), site_transects)
+
+    self.report.count("sites", len(site_transects))
+    self.report.count("transects_written", sum(len(transects) for transects in site_transects.values()))
+
+    print('{n} transects generated for {sites} sites!'.format(
+      n=sum(len(transects) for transects in site_transects.values()),
+      sites=len(site_transects)
+    ))
+    self.report.save(os.path.join(self.output_path, "transects_batch_report.json"))
+    print(self.report.summary())
+    return site_transects
+
+def main_batch():
+  project = QgsProject.instance()
+  generator = BatchTransectGenerator(
+    spacing,
+    smoothing_kernel=smoothing_kernel,
+    smoothing_edges=smoothing_edges,
+    processes=processes,
+    output_format=output_format,
+    wgs84=wgs84
   )
 
-  t.run() 
\ No newline at end of file
+  if manifest_fileName is not None:
+    sites = generator.sitesFromManifest(os.path.join(generator.project_path, "transects", manifest_fileName))
+  else:
+    landward_baselines = project.mapLayersByName(landward_baseline_name)
+    seaward_baselines = project.mapLayersByName(seaward_baseline_name)
+    if landward_baselines == [] or seaward_baselines == []:
+      print('check layer names. all layers not detected')
+      return
+    sites = generator.sitesFromLayers(landward_baselines[0], seaward_baselines[0], site_field)
+
+  generator.run(sites)
+
+def main():
+  if batch:
+    main_batch()
+    return
+
+  project = QgsProject.instance() 
+  landward_baseline = project.mapLayersByName(landward_baseline_name)
+  seaward_baseline = project.mapLayersByName(seaward_baseline_name)
+
+  if landward_baseline == [] and seaward_baseline == []:
+    print('check layer names. all layers not detected')
+  elif landward_baseline == []:
+    print('check landward baseline name. layer not detected')
+  elif seaward_baseline == []:
+    print('check seaward baseline name. layer not detected')
+  else:
+    landward_baseline_ = landward_baseline[0]
+    seaward_baseline_ = seaward_baseline[0]
+    t = TransectGenerator(
+      landward_baseline_,
+      seaward_baseline_,
+      spacing,
+      smoothing_kernel=smoothing_kernel,
+      smoothing_edges=smoothing_edges,
+      output_format=output_format,
+      wgs84=wgs84
+    )
+
+    t.run()
+
+# run only when executed as a script (e.g. from the QGIS python console)
+# ... importing the module does nothing
+if __name__ == '__main__':
+  main()
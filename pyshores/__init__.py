@@ -0,0 +1,22 @@
+'''
+  pyshores: transect generation, shoreline intersection and shoreline change
+  rates for CoastSat and CoastCR workflows.
+
+  every module is named after its class, import them from their modules:
+    from pyshores.IntersectFinder import IntersectFinder
+
+  stages:
+    TransectGenerator  transects from a landward and a seaward baseline  (QGIS)
+    IntersectFinder    transect and shoreline intersections              (QGIS, numpy backend)
+    CoastSatParser     CoastSat time series to CoastCR intersect points  (QGIS)
+    MetricsCalculator  NSM, EPR, SCE, LRR and WLR rates                  (QGIS only for shapefiles)
+
+  QGIS free array helpers:
+    GeometryArrays     batched transect / shoreline geometry
+    RatesEngine        batched shoreline change metrics
+
+  nothing is imported here so that importing pyshores (and starting the
+  pyshores command) stays fast and does not import QGIS.
+'''
+
+__version__ = "0.2.0"
@@ -0,0 +1,3 @@
+from pyshores.cli import main
+
+main()
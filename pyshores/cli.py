@@ -0,0 +1,580 @@
+import argparse
+import contextlib
+import csv
+import os
+import sys
+
+# only the standard library is imported at module level. every subcommand
+# ... imports what it needs when it runs, and QGIS is only started by the
+# ... subcommands (or backends) that read or write shapefiles
+
+# keeps the standalone QgsApplication alive for the whole run
+_qgis_app = []
+
+def start_qgis():
+  '''
+    starts a standalone QGIS application, needed by the ogr provider when
+    pyshores runs outside the QGIS python console. does nothing inside QGIS.
+    set QGIS_PREFIX_PATH if QGIS is not installed in the default location
+  '''
+  from qgis.core import QgsApplication
+
+  if QgsApplication.instance() is None and _qgis_app == []:
+    app = QgsApplication([], False)
+    app.initQgis()
+    _qgis_app.append(app)
+
+def layer_crs(file_path: str):
+  from qgis.core import QgsVectorLayer
+
+  return QgsVectorLayer(file_path, os.path.basename(file_path), "ogr").crs()
+
+def project_file(project_path: str, folder: str, file_name: str) -> str:
+  return os.path.join(project_path, folder, file_name)
+
+def make_report(args, name: str):
+  '''
+    RunReport of a stage with the instrumentation options of the command line.
+    --profile-transects writes one csv row per transect visited by a hot loop,
+    to the writer opened by main (shared by the stages of chain)
+  '''
+  from .RunReport import RunReport
+
+  transect_hook = None
+  if args.profile_writer is not None:
+    def transect_hook(transect_id, seconds, details):
+      args.profile_writer.writerow([transect_id, seconds, details.get("shoreline"), details.get("intersects")])
+
+  return RunReport(name, trace_memory=args.trace_memory, transect_hook=transect_hook)
+
+def run_transects(args):
+  start_qgis()
+  from qgis.core import QgsVectorLayer
+  from .TransectGenerator import TransectGenerator
+
+  if args.batch or args.manifest is not None:
+    run_transects_batch(args)
+    return
+
+  layers = []
+  for file_path in (args.landward, args.seaward):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    layer = QgsVectorLayer(project_file(args.project, "transects", file_path), name, "ogr")
+    if not layer.isValid():
+      sys.exit("could not load baseline {fp}".format(fp=file_path))
+    layers.append(layer)
+
+  # baselines in another crs than --crs (default: the crs of the landward baseline) are reprojected
+  t = TransectGenerator(
+    layers[0],
+    layers[1],
+    args.spacing,
+    crs=args.crs,
+    project_path=args.project,
+    transect_length=args.length,
+    window_size=args.window,
+    smoothing_kernel=args.kernel,
+    smoothing_edges=args.edges,
+    smoothing_sigma=args.sigma,
+    report=make_report(args, "transects"),
+    output_format=args.output_format,
+    wgs84=args.wgs84
+  )
+  t.run()
+
+def run_transects_batch(args):
+  from qgis.core import QgsVectorLayer
+  from .TransectGenerator import BatchTransectGenerator
+
+  options = dict(
+    project_path=args.project,
+    transect_length=args.length,
+    window_size=args.window,
+    smoothing_kernel=args.kernel,
+    smoothing_edges=args.edges,
+    smoothing_sigma=args.sigma,
+    processes=args.processes,
+    report=make_report(args, "transects_batch"),
+    output_format=args.output_format,
+    wgs84=args.wgs84
+  )
+
+  if args.manifest is not None:
+    manifest_filePath = project_file(args.project, "transects", args.manifest)
+    # the crs of the outputs is --crs, else the crs of the first landward baseline in the manifest
+    crs = args.crs
+    if crs is None:
+      with open(manifest_filePath, newline="") as manifest_file:
+        first_landward = next(csv.DictReader(manifest_file))["landward"]
+      crs = layer_crs(project_file(args.project, "transects", first_landward))
+    generator = BatchTransectGenerator(args.spacing, crs=crs, **options)
+    sites = generator.sitesFromManifest(manifest_filePath)
+  else:
+    layers = []
+    for file_path in (args.landward, args.seaward):
+      name = os.path.splitext(os.path.basename(file_path))[0]
+      layer = QgsVectorLayer(project_file(args.project, "transects", file_path), name, "ogr")
+      if not layer.isValid():
+        sys.exit("could not load baselines {fp}".format(fp=file_path))
+      layers.append(layer)
+
+    generator = BatchTransectGenerator(args.spacing, crs=args.crs or layers[0].crs(), **options)
+    sites = generator.sitesFromLayers(layers[0], layers[1], args.site_field)
+
+  generator.run(sites)
+
+def run_intersects(args):
+  if args.backend == "numpy" and args.transects.endswith(".geojson") and args.shorelines.endswith(".geojson"):
+    # fully QGIS free: geojson in, CoastSat like csv (or matrix) out
+    run_intersects_geojson(args)
+    return
+
+  start_qgis()
+  from .IntersectFinder import IntersectFinder
+
+  ifn = IntersectFinder(
+    args.transects,
+    args.shorelines,
+    project_crs=args.crs,
+    backend=args.backend,
+    processes=args.processes,
+    project_path=args.project,
+    coastSat_format=args.format,
+    report=make_report(args, "intersects"),
+    output_format=args.output_format,
+    wgs84=args.wgs84
+  )
+
+  if args.incremental:
+    ifn.runIncremental()
+  elif args.streaming:
+    ifn.runStreaming()
+  else:
+    ifn.run()
+
+def run_intersects_geojson(args):
+  import numpy as np
+  from .GeometryArrays import GeometryArrays
+  from .IntersectMatrix import IntersectMatrix
+  from .Reprojection import Reprojection
+
+  # transects and shorelines are reprojected to --crs, default the crs of the transects
+  transects_filePath = project_file(args.project, "transects", args.transects)
+  shorelines_filePath = project_file(args.project, "positions", args.shorelines)
+  crs = args.crs or GeometryArrays.readGeojsonCrs(transects_filePath)
+
+  transects, _ = GeometryArrays.readGeojsonTransects(transects_filePath)
+  transects = Reprojection.transform(transects, GeometryArrays.readGeojsonCrs(transects_filePath), crs)
+  shorelines, dates = GeometryArrays.readGeojsonLines(shorelines_filePath, args.date_property)
+  shorelines = Reprojection.transformLines(shorelines, GeometryArrays.readGeojsonCrs(shorelines_filePath), crs)
+
+  if args.processes > 1:
+    shorelines_segments = [GeometryArrays.partsSegments(parts) for parts in shorelines]
+    matrix = np.array(list(GeometryArrays.parallelIntersect(transects, shorelines_segments, args.processes)))
+  else:
+    matrix = GeometryArrays.intersectMatrix(transects, shorelines)
+  matrix = matrix.reshape(len(shorelines), len(transects))
+
+  output_path = os.path.join(args.project, "intersects", "coastSat")
+  os.makedirs(output_path, exist_ok=True)
+
+  coastSat_matrix = IntersectMatrix(dates, ["T{tID}".format(tID=tID) for tID in range(len(transects))], matrix, crs)
+  if args.format == "matrix":
+    coastSat_matrix.save(os.path.join(output_path, "coastSat_intersects.npy"))
+  else:
+    coastSat_matrix.toCSV(os.path.join(output_path, "coastSat_intersects.csv"))
+  print('intesrect calculation done!')
+
+def run_parse(args):
+  start_qgis()
+  from .CoastSatParser import CoastSatParser
+
+  csP = CoastSatParser(
+    args.time_series,
+    args.normals,
+    crs=args.crs,
+    project_path=args.project,
+    report=make_report(args, "parse"),
+    output_format=args.output_format,
+    wgs84=args.wgs84
+  )
+
+  csP.chunk_rows = args.chunk_rows
+  if args.incremental:
+    csP.runIncremental()
+  elif args.streaming:
+    csP.runStreaming()
+  else:
+    csP.run()
+
+def run_metrics(args):
+  from .MetricsCalculator import MetricsCalculator
+
+  if not args.no_shp:
+    start_qgis()
+
+  # the rates take the crs of the transects unless --crs is given
+  mc = MetricsCalculator(
+    project_path=args.project,
+    crs=args.crs,
+    report=make_report(args, "metrics"),
+    output_format=args.output_format,
+    wgs84=args.wgs84
+  )
+  mc.confidence_level = args.confidence
+  mc.bootstrap_seed = args.seed
+  if args.tiled:
+    mc.loadLayers(args.intersects, args.transects, args.uncertainty, read_intersects=False)
+    mc.runTiled(
+      write_shp=not args.no_shp,
+      memory_budget=args.memory_mb * 2 ** 20,
+      processes=args.processes,
+      bootstrap_replicates=args.bootstrap
+    )
+    return
+
+  mc.loadLayers(args.intersects, args.transects, args.uncertainty)
+  mc.run(write_shp=not args.no_shp, bootstrap_replicates=args.bootstrap, processes=args.processes)
+
+def run_update_rates(args):
+  from .MetricsCalculator import MetricsCalculator
+
+  mc = MetricsCalculator(project_path=args.project, report=make_report(args, "metrics"))
+  if args.stream:
+    # rebuilds the statistics from the full table, one chunk of dates at a time
+    mc.streamRates(args.intersects, args.chunk_rows)
+    return
+
+  if args.rebuild or not os.path.isfile(mc.accumulator_filePath):
+    # the full table is only read when the statistics are rebuilt
+    mc.loadLayers(args.intersects, args.transects)
+  mc.updateRates(args.add, rebuild=args.rebuild)
+
+def run_convert(args):
+  from .IntersectMatrix import IntersectMatrix
+
+  if ".shp" in (os.path.splitext(args.input)[1].lower(), os.path.splitext(args.output)[1].lower()):
+    start_qgis()
+
+  IntersectMatrix.convert(
+    project_file(args.project, "intersects", args.input),
+    project_file(args.project, "intersects", args.output),
+    crs=args.crs
+  )
+
+def run_despike(args):
+  from .Despiker import Despiker
+
+  report = make_report(args, "despike")
+  output_path = project_file(args.project, "intersects", args.output)
+  with report.stage("despike"):
+    counts = Despiker.despikeTable(
+      project_file(args.project, "intersects", args.time_series),
+      output_path,
+      window=args.window,
+      threshold=args.threshold,
+      max_jump=args.max_jump,
+      max_iterations=args.iterations
+    )
+  for (counter, n) in counts.items():
+    report.count(counter, n)
+
+  report.save(os.path.splitext(output_path)[0] + "_report.json")
+  print(report.summary())
+
+def run_tides(args):
+  from .TideCorrector import TideCorrector
+
+  slopes = args.slope if args.slopes is None else project_file(args.project, "intersects", args.slopes)
+  if slopes is None:
+    raise Exception("give a beach slope (--slope) or a slopes csv (--slopes)")
+
+  report = make_report(args, "tides")
+  output_path = project_file(args.project, "intersects", args.output)
+  with report.stage("correct"):
+    corrected = TideCorrector.correctTable(
+      project_file(args.project, "intersects", args.time_series),
+      output_path,
+      project_file(args.project, "intersects", args.tides),
+      slopes,
+      reference_elevation=args.reference_elevation,
+      interpolate=args.interpolate
+    )
+  report.count("dates", len(corrected.dates))
+  report.count("transects", len(corrected.transects))
+
+  report.save(os.path.splitext(output_path)[0] + "_report.json")
+  print(report.summary())
+
+def run_alongshore(args):
+  from .AlongshoreAggregator import AlongshoreAggregator
+
+  if args.windows == [] and args.cell_length is None and args.cells is None:
+    raise Exception("give window sizes (--windows), a cell length (--cell-length) or cell polygons (--cells)")
+
+  report = make_report(args, "alongshore")
+  output_dir = os.path.join(args.project, "rates", "output")
+  with report.stage("aggregate"):
+    counts = AlongshoreAggregator.aggregateTable(
+      project_file(args.project, "rates", args.rates),
+      output_dir,
+      transects_path=None if args.transects is None else project_file(args.project, "transects", args.transects),
+      spacing=args.spacing,
+      window_sizes=args.windows,
+      cell_length=args.cell_length,
+      cells_path=None if args.cells is None else project_file(args.project, "transects", args.cells),
+      cells_property=args.cells_property,
+      metrics=args.metrics,
+      quantiles=[percentile / 100 for percentile in args.percentiles]
+    )
+  for (counter, n) in counts.items():
+    report.count(counter, n)
+
+  report.save(os.path.join(output_dir, "alongshore_report.json"))
+  print(report.summary())
+
+def run_pipeline(args):
+  from .Pipeline import Pipeline
+
+  pipeline = Pipeline(args.project, processes=args.processes, report=make_report(args, "pipeline"))
+  chain_options = dict(
+    landward=project_file(args.project, "transects", args.landward),
+    seaward=project_file(args.project, "transects", args.seaward),
+    shorelines=project_file(args.project, "positions", args.shorelines),
+    uncertainty=None if args.uncertainty is None else project_file(args.project, "shorelines", args.uncertainty),
+    transect_length=args.length,
+    kernel=args.kernel,
+    edges=args.edges,
+    sigma=args.sigma,
+    date_property=args.date_property,
+    bootstrap_replicates=args.bootstrap,
+    crs=args.crs,
+    wgs84=args.wgs84
+  )
+
+  if len(args.spacing) == 1 and len(args.window_size) == 1:
+    target = pipeline.chain(spacing=args.spacing[0], window_size=args.window_size[0], **chain_options)
+    pipeline.run([target])
+    pipeline.publish(target)
+  else:
+    pipeline.sweep(args.spacing, args.window_size, **chain_options)
+
+  pipeline.saveReport()
+
+def run_chain(args):
+  start_qgis()
+  from .CoastSatParser import CoastSatParser
+  from .IntersectFinder import IntersectFinder
+  from .MetricsCalculator import MetricsCalculator
+  from .Reprojection import Reprojection
+  from .Session import Session
+
+  # every input is read once into the session and shared by the three stages
+  session = Session(memory_budget=args.session_mb * 2 ** 20, report=make_report(args, "session"))
+
+  ifn = IntersectFinder(
+    args.transects,
+    args.shorelines,
+    project_crs=args.crs,
+    backend="numpy",
+    processes=args.processes,
+    project_path=args.project,
+    coastSat_format="matrix",
+    report=make_report(args, "intersects"),
+    output_format=args.output_format,
+    wgs84=args.wgs84,
+    session=session
+  )
+  ifn.run()
+
+  # the crs of the intersects for the later stages, so they ask the session for the same transects
+  crs = Reprojection.crsId(ifn.crs)
+  time_series = os.path.relpath(ifn.coastSat_filePath, os.path.join(args.project, "intersects"))
+
+  csP = CoastSatParser(
+    time_series,
+    args.transects,
+    crs=crs,
+    project_path=args.project,
+    report=make_report(args, "parse"),
+    output_format=args.output_format,
+    wgs84=args.wgs84,
+    session=session
+  )
+  csP.run()
+
+  mc = MetricsCalculator(
+    project_path=args.project,
+    crs=crs,
+    report=make_report(args, "metrics"),
+    output_format=args.output_format,
+    wgs84=args.wgs84,
+    session=session
+  )
+  mc.loadLayers(time_series, args.transects, args.uncertainty)
+  mc.run(processes=args.processes)
+
+  session.report.save(os.path.join(args.project, "rates", "output", "session_report.json"))
+  print(session.report.summary())
+
+def build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(
+    prog="pyshores",
+    description="shoreline change analysis with CoastSat and CoastCR data"
+  )
+  parser.add_argument(
+    "-p", "--project",
+    default=os.getcwd(),
+    help="project folder holding transects, positions, intersects, shorelines and rates (default: current folder)"
+  )
+  parser.add_argument(
+    "--output-format",
+    choices=["shp", "gpkg", "fgb", "parquet"],
+    default="shp",
+    help="format of the vector outputs: shapefile, GeoPackage, FlatGeobuf or GeoParquet (needs pyarrow)"
+  )
+  parser.add_argument("--wgs84", action="store_true", help="also write WGS84 geojson copies of the transects, intersect points and rates")
+  parser.add_argument("--trace-memory", action="store_true", help="record the peak python and numpy memory of every stage in the run report (slower)")
+  parser.add_argument("--profile-transects", default=None, help="csv of the time spent on every transect by the qgis intersection loop")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  transects = subparsers.add_parser("transects", help="generate transects from a landward and a seaward baseline")
+  transects.add_argument("--landward", default="lw_baseline.shp", help="landward baseline, relative to transects/")
+  transects.add_argument("--seaward", default="sw_baseline.shp", help="seaward baseline, relative to transects/")
+  transects.add_argument("--spacing", type=float, default=5, help="transect origin spacing in meters")
+  transects.add_argument("--length", type=float, default=50, help="transect length in meters")
+  transects.add_argument("--window", type=int, default=7, help="azimuth smoothing window in transects")
+  transects.add_argument("--kernel", choices=["boxcar", "gaussian"], default="boxcar", help="azimuth smoothing kernel")
+  transects.add_argument("--edges", choices=["shrink", "reflect", "wrap", "none"], default="shrink", help="azimuth smoothing at the ends of the baseline, wrap for closed baselines")
+  transects.add_argument("--sigma", type=float, default=None, help="gaussian kernel sigma in transects (default: window / 6)")
+  transects.add_argument("--batch", action="store_true", help="one set of transects per site, the baseline layers hold every site keyed by --site-field")
+  transects.add_argument("--site-field", default="site", help="site attribute of the baseline features in --batch mode")
+  transects.add_argument("--manifest", default=None, help="csv of site,landward,seaward baseline layers relative to transects/, implies --batch")
+  transects.add_argument("--processes", type=int, default=None, help="worker processes in --batch mode (default: every core)")
+  transects.add_argument("--crs", default=None, help="projected crs of the transects, baselines are reprojected to it (default: crs of the landward baseline)")
+  transects.set_defaults(func=run_transects)
+
+  intersects = subparsers.add_parser("intersects", help="find transect and shoreline intersections")
+  intersects.add_argument("--transects", default="transects_landward_baseline0.shp", help="transects, relative to transects/")
+  intersects.add_argument("--shorelines", default="cagliliog_shorelines.shp", help="shorelines, relative to positions/")
+  intersects.add_argument("--backend", choices=["qgis", "numpy"], default="qgis")
+  intersects.add_argument("--processes", type=int, default=1, help="worker processes, shorelines are sharded across them (numpy backend only)")
+  intersects.add_argument("--date-property", default="dates", help="shoreline date attribute of geojson shorelines")
+  intersects.add_argument("--incremental", action="store_true", help="only intersect shorelines that are new or changed since the last run")
+  intersects.add_argument("--streaming", action="store_true", help="read and intersect one shoreline at a time, memory stays flat with the number of dates (numpy backend, one process)")
+  intersects.add_argument("--crs", default=None, help="crs of the intersections, transects and shorelines are reprojected to it (default: crs of the transects)")
+  intersects.add_argument("--format", choices=["shp", "matrix"], default="shp", help="CoastSat like output, matrix is the memory mappable .npy + .json format (csv for geojson inputs when shp)")
+  intersects.set_defaults(func=run_intersects)
+
+  parse = subparsers.add_parser("parse", help="turn a CoastSat time series into CoastCR intersect points")
+  parse.add_argument("--time-series", default="ts_despiked_processed.csv", help="time series csv, relative to intersects/")
+  parse.add_argument("--normals", default="normals.shp", help="normals, relative to transects/")
+  parse.add_argument("--incremental", action="store_true", help="only convert dates that are new or changed since the last run")
+  parse.add_argument("--streaming", action="store_true", help="read the time series --chunk-rows dates at a time")
+  parse.add_argument("--chunk-rows", type=int, default=500, help="dates read at once by --streaming")
+  parse.add_argument("--crs", default=None, help="crs of the points, normals are reprojected to it (default: crs of the normals)")
+  parse.set_defaults(func=run_parse)
+
+  despike = subparsers.add_parser("despike", help="reject outliers of a CoastSat like time series (median / MAD and max jump rules)")
+  despike.add_argument("--time-series", default="ts_processed.csv", help="time series csv or .npy matrix, relative to intersects/")
+  despike.add_argument("--output", default="ts_despiked_processed.csv", help="cleaned time series, relative to intersects/, format by extension. flags are written next to it")
+  despike.add_argument("--window", type=int, default=5, help="intersections in the median / MAD window, odd, 0 skips the rule")
+  despike.add_argument("--threshold", type=float, default=3, help="rejection distance from the window median, in robust standard deviations")
+  despike.add_argument("--max-jump", type=float, default=None, help="meters, rejects single date spikes that jump away and back by more")
+  despike.add_argument("--iterations", type=int, default=5, help="passes of the max jump rule")
+  despike.set_defaults(func=run_despike)
+
+  tides = subparsers.add_parser("tides", help="tidal correction of a CoastSat like time series with beach slopes")
+  tides.add_argument("--time-series", default="ts_processed.csv", help="time series csv or .npy matrix, relative to intersects/")
+  tides.add_argument("--tides", required=True, help="csv of dates,tide water levels, relative to intersects/")
+  tides.add_argument("--slope", type=float, default=None, help="beach slope (tan beta) of every transect")
+  tides.add_argument("--slopes", default=None, help="csv of transect,slope, relative to intersects/, in place of --slope")
+  tides.add_argument("--reference-elevation", type=float, default=0, help="water level the shorelines are corrected to, same datum as the tides")
+  tides.add_argument("--interpolate", action="store_true", help="interpolate the tides in time for dates not in the tides csv")
+  tides.add_argument("--output", default="ts_tidally_corrected.csv", help="corrected time series, relative to intersects/, format by extension")
+  tides.set_defaults(func=run_tides)
+
+  metrics = subparsers.add_parser("metrics", help="compute shoreline change rates")
+  metrics.add_argument("--intersects", default="intersects.csv", help="intersects csv or .npy matrix, relative to intersects/")
+  metrics.add_argument("--transects", default="normals.shp", help="transects, relative to transects/")
+  metrics.add_argument("--uncertainty", default=None, help="shoreline uncertainty csv, relative to shorelines/")
+  metrics.add_argument("--no-shp", action="store_true", help="only write csv outputs, does not need QGIS")
+  metrics.add_argument("--bootstrap", type=int, default=0, help="bootstrap replicates, adds standard errors and confidence bounds of LRR and WLR")
+  metrics.add_argument("--confidence", type=float, default=0.95, help="confidence level of the bootstrap bounds")
+  metrics.add_argument("--seed", type=int, default=0, help="seed of the bootstrap resampling")
+  metrics.add_argument("--processes", type=int, default=1, help="worker processes of the bootstrap, or of the tiles with --tiled")
+  metrics.add_argument("--tiled", action="store_true", help="compute the rates in tiles of transects with bounded memory, for tables larger than memory")
+  metrics.add_argument("--memory-mb", type=int, default=1024, help="memory of a tile with --tiled")
+  metrics.add_argument("--crs", default=None, help="crs of the rates shapefile, transects are reprojected to it (default: crs of the transects)")
+  metrics.set_defaults(func=run_metrics)
+
+  update_rates = subparsers.add_parser("update-rates", help="update rates with new shoreline dates from the stored per transect statistics")
+  update_rates.add_argument("--add", default=None, help="csv of only the new dates, relative to intersects/")
+  update_rates.add_argument("--rebuild", action="store_true", help="rebuild the statistics from the full --intersects table")
+  update_rates.add_argument("--intersects", default="intersects.csv", help="full intersects csv, relative to intersects/")
+  update_rates.add_argument("--transects", default="normals.shp", help="transects, relative to transects/")
+  update_rates.add_argument("--stream", action="store_true", help="rebuild the statistics from the full --intersects table read --chunk-rows dates at a time")
+  update_rates.add_argument("--chunk-rows", type=int, default=500, help="dates read at once by --stream")
+  update_rates.set_defaults(func=run_update_rates)
+
+  alongshore = subparsers.add_parser("alongshore", help="aggregate rates alongshore over windows of transects, fixed length cells or cell polygons")
+  alongshore.add_argument("--rates", default="output/normals_rates.csv", help="rates csv, relative to rates/")
+  alongshore.add_argument("--transects", default=None, help="transects geojson written with the transects, relative to transects/, gives their order and chainage")
+  alongshore.add_argument("--spacing", type=float, default=None, help="transect spacing in meters, in place of --transects (rates rows are taken in order)")
+  alongshore.add_argument("--windows", type=int, nargs="*", default=[], help="one or more window sizes in transects")
+  alongshore.add_argument("--cell-length", type=float, default=None, help="length of fixed cells in meters of chainage")
+  alongshore.add_argument("--cells", default=None, help="geojson of cell polygons, relative to transects/, needs --transects")
+  alongshore.add_argument("--cells-property", default="name", help="name attribute of the cell polygons")
+  alongshore.add_argument("--metrics", nargs="+", default=None, help="rates to aggregate (default: every rate)")
+  alongshore.add_argument("--percentiles", type=float, nargs="*", default=[10, 25, 50, 75, 90], help="percentiles of every cell")
+  alongshore.set_defaults(func=run_alongshore)
+
+  chain = subparsers.add_parser("chain", help="run intersects, parse and metrics in one process, reading every input once")
+  chain.add_argument("--transects", default="normals.shp", help="transects, relative to transects/")
+  chain.add_argument("--shorelines", default="cagliliog_shorelines.shp", help="shorelines, relative to positions/")
+  chain.add_argument("--uncertainty", default=None, help="shoreline uncertainty csv, relative to shorelines/")
+  chain.add_argument("--processes", type=int, default=1, help="worker processes of the intersections and of the rates bootstrap")
+  chain.add_argument("--crs", default=None, help="crs of every stage, inputs are reprojected to it (default: crs of the transects)")
+  chain.add_argument("--session-mb", type=int, default=1024, help="memory of the datasets kept by the session, least recently used are dropped above it")
+  chain.set_defaults(func=run_chain)
+
+  pipeline = subparsers.add_parser("pipeline", help="run transects, intersects and rates from geojson inputs, reusing cached stage outputs")
+  pipeline.add_argument("--landward", required=True, help="landward baseline geojson, relative to transects/")
+  pipeline.add_argument("--seaward", required=True, help="seaward baseline geojson, relative to transects/")
+  pipeline.add_argument("--shorelines", required=True, help="shorelines geojson, relative to positions/")
+  pipeline.add_argument("--uncertainty", default=None, help="shoreline uncertainty csv, relative to shorelines/")
+  pipeline.add_argument("--spacing", type=float, nargs="+", default=[5], help="one or more spacings, more than one spacing or window size runs a sweep")
+  pipeline.add_argument("--window-size", type=int, nargs="+", default=[7], help="one or more smoothing window sizes")
+  pipeline.add_argument("--length", type=float, default=50, help="transect length")
+  pipeline.add_argument("--kernel", choices=["boxcar", "gaussian"], default="boxcar")
+  pipeline.add_argument("--edges", choices=["shrink", "reflect", "wrap", "none"], default="shrink")
+  pipeline.add_argument("--sigma", type=float, default=None)
+  pipeline.add_argument("--date-property", default="dates", help="shoreline date attribute")
+  pipeline.add_argument("--bootstrap", type=int, default=0, help="bootstrap replicates of the rates")
+  pipeline.add_argument("--crs", default=None, help="projected crs of every stage, e.g. EPSG:3124, inputs are reprojected to it (default: crs of the landward baseline)")
+  pipeline.add_argument("--processes", type=int, default=1, help="stages run at once")
+  pipeline.set_defaults(func=run_pipeline)
+
+  convert = subparsers.add_parser("convert", help="convert a CoastSat like table between .csv, .shp and the .npy matrix format")
+  convert.add_argument("input", help="input table, relative to intersects/")
+  convert.add_argument("output", help="output table, relative to intersects/, format by extension")
+  convert.add_argument("--crs", default=None, help="crs recorded in the output, e.g. EPSG:3124")
+  convert.set_defaults(func=run_convert)
+
+  return parser
+
+def main(argv=None):
+  args = build_parser().parse_args(argv)
+
+  # the --profile-transects csv is closed when the command ends, also when it fails
+  with contextlib.ExitStack() as stack:
+    args.profile_writer = None
+    if args.profile_transects is not None:
+      profile_file = stack.enter_context(open(args.profile_transects, "w", newline=""))
+      args.profile_writer = csv.writer(profile_file)
+      args.profile_writer.writerow(["transect", "seconds", "shoreline", "intersects"])
+
+    args.func(args)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+from pyshores.AlongshoreAggregator import AlongshoreAggregator
+
+quantiles = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+def bruteForce(rates):
+  '''
+    the statistics of one cell of rates, as <statistic>: value
+  '''
+  rates = rates[~np.isnan(rates)]
+  stats = {
+    'n': len(rates),
+    'mean': rates.mean() if len(rates) > 0 else np.nan,
+    'SD': rates.std(ddof=1) if len(rates) > 1 else np.nan,
+    'erosion': (rates < 0).mean() if len(rates) > 0 else np.nan
+  }
+  for (name, q) in zip(AlongshoreAggregator.quantileNames(quantiles), quantiles):
+    stats[name] = np.quantile(rates, q) if len(rates) > 0 else np.nan
+
+  return stats
+
+def assertMatchesBruteForce(frame, cells, values, metrics):
+  for (row, rows) in enumerate(cells):
+    for (metric_indx, metric) in enumerate(metrics):
+      for (statistic, expected) in bruteForce(values[rows, metric_indx]).items():
+        np.testing.assert_allclose(
+          frame['{m}_{s}'.format(m=metric, s=statistic)].iloc[row],
+          expected,
+          rtol=1e-9,
+          atol=1e-9,
+          err_msg='{m}_{s} of cell {r}'.format(m=metric, s=statistic, r=row)
+        )
+
+def ratesOfSites(seed: int):
+  rng = np.random.default_rng(seed)
+  names = ['A_T{indx}'.format(indx=indx) for indx in range(23)] + ['B_T{indx}'.format(indx=indx) for indx in range(17)]
+  values = rng.normal(0, 2, (len(names), 2))
+  values[rng.uniform(size=values.shape) < 0.25] = np.nan
+
+  return np.array(names, dtype=object), values
+
+def test_windows_match_brute_force(monkeypatch):
+  names, values = ratesOfSites(0)
+  sites = AlongshoreAggregator.sites(names)
+  # quantiles in tiles of a few transects
+  monkeypatch.setattr(AlongshoreAggregator, 'budget_cells', 40)
+
+  for (window_size, frame) in AlongshoreAggregator.windows(values, [1, 4, 7], sites, ['LRR', 'EPR'], quantiles).items():
+    before = window_size // 2
+    after = window_size - 1 - before
+    windows = []
+    for indx in range(len(names)):
+      # windows stop at the ends of their site
+      same_site = np.flatnonzero(sites == sites[indx])
+      windows.append([row for row in range(indx - before, indx + after + 1) if row in same_site])
+    assertMatchesBruteForce(frame, windows, values, ['LRR', 'EPR'])
+
+def test_cells_match_brute_force():
+  _, values = ratesOfSites(1)
+  rng = np.random.default_rng(1)
+  cell_ids = rng.choice([-1, 0, 2, 5], len(values))
+
+  stats = AlongshoreAggregator.cellStats(values, cell_ids, ['LRR', 'EPR'], quantiles)
+  assert stats.index.tolist() == [0, 2, 5]
+  assertMatchesBruteForce(stats, [np.flatnonzero(cell_ids == cell) for cell in stats.index], values, ['LRR', 'EPR'])
+
+def test_fixed_cells_restart_at_every_site():
+  names, _ = ratesOfSites(2)
+  sites = AlongshoreAggregator.sites(names)
+  origins = np.stack([np.arange(len(names)) * 5.0, np.zeros(len(names))], axis=1)
+  chainage = AlongshoreAggregator.chainage(origins, sites)
+
+  np.testing.assert_allclose(chainage[:23], np.arange(23) * 5.0)
+  np.testing.assert_allclose(chainage[23:], np.arange(17) * 5.0)
+
+  cell_ids, cells = AlongshoreAggregator.fixedCells(chainage, sites, 20)
+  assert cells['cell'].tolist() == ['A_C0', 'A_C1', 'A_C2', 'A_C3', 'A_C4', 'A_C5', 'B_C0', 'B_C1', 'B_C2', 'B_C3', 'B_C4']
+  for (indx, cell) in enumerate(cell_ids):
+    assert cells['site'][cell] == sites[indx]
+    assert cells['start_chainage'][cell] <= chainage[indx] < cells['end_chainage'][cell]
+
+def square(x0, y0, size):
+  return [np.array([[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]], dtype=float)]
+
+def test_points_take_the_first_polygon_holding_them():
+  points = np.array([[1, 1], [3, 3], [6, 6], [20, 20]], dtype=float)
+
+  cell_ids = AlongshoreAggregator.polygonCells(points, [square(0, 0, 2), square(0, 0, 10)])
+
+  np.testing.assert_array_equal(cell_ids, [0, 1, 1, -1])
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from pyshores.AzimuthSmoother import AzimuthSmoother
+
+def bruteForce(azimuths, window_size, kernel, edges, sigma=None):
+  '''
+    the smoothed azimuth of every transect, one window at a time
+  '''
+  n = len(azimuths)
+  before = window_size // 2
+  after = window_size - 1 - before
+  if sigma is None:
+    sigma = window_size / 6
+
+  smoothed = np.empty(n)
+  for center in range(n):
+    if edges == 'none' and (center < before or center >= n - after):
+      smoothed[center] = azimuths[center]
+      continue
+
+    east = north = 0
+    for offset in range(-before, after + 1):
+      indx = center + offset
+      if edges == 'reflect':
+        indx = -indx if indx < 0 else (2 * (n - 1) - indx if indx >= n else indx)
+      elif edges == 'wrap':
+        indx = indx % n
+      elif not 0 <= indx < n:
+        continue
+      weight = 1 if kernel == 'boxcar' else np.exp(-0.5 * (offset / sigma) ** 2)
+      east += weight * np.sin(np.radians(azimuths[indx]))
+      north += weight * np.cos(np.radians(azimuths[indx]))
+    smoothed[center] = np.degrees(np.arctan2(east, north))
+
+  return smoothed
+
+def assertSameAzimuths(azimuths, expected):
+  # azimuths are compared as directions, 180 and -180 are the same
+  difference = (np.asarray(azimuths) - np.asarray(expected) + 180) % 360 - 180
+  np.testing.assert_allclose(difference, 0, atol=1e-9)
+
+@pytest.mark.parametrize('kernel', AzimuthSmoother.kernels)
+@pytest.mark.parametrize('edges', AzimuthSmoother.edges)
+@pytest.mark.parametrize('window_size', [2, 5, 8])
+def test_matches_brute_force(kernel, edges, window_size):
+  rng = np.random.default_rng(window_size)
+  azimuths = (np.cumsum(rng.normal(0, 20, 40)) + 350) % 360
+
+  assertSameAzimuths(
+    AzimuthSmoother.smooth(azimuths, window_size, kernel=kernel, edges=edges),
+    bruteForce(azimuths, window_size, kernel, edges)
+  )
+
+def test_gaussian_sigma_is_used():
+  azimuths = np.linspace(0, 90, 20)
+
+  assertSameAzimuths(
+    AzimuthSmoother.smooth(azimuths, 7, kernel='gaussian', sigma=3),
+    bruteForce(azimuths, 7, 'gaussian', 'shrink', sigma=3)
+  )
+
+def test_azimuths_across_north_average_to_north():
+  # the mean of the numbers would point south
+  smoothed = AzimuthSmoother.smooth([358, 2, 358, 2], 2)
+
+  assertSameAzimuths(smoothed[1:], [0, 0, 0])
+
+def test_window_of_one_keeps_the_azimuths():
+  azimuths = np.array([10.0, 200.0, 350.0])
+
+  np.testing.assert_array_equal(AzimuthSmoother.smooth(azimuths, 1), azimuths)
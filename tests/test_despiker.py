@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from pyshores.Despiker import Despiker
+
+def bruteForce(distances, window, threshold, max_jump, max_iterations=5):
+  '''
+    the flags of every cell, one transect and one window at a time.
+    window 0 and max_jump None skip their rule, as in despike
+  '''
+  flags = np.where(np.isnan(distances), Despiker.MISSING, 0)
+  for column in range(distances.shape[1]):
+    rows = np.flatnonzero(~np.isnan(distances[:, column]))
+    values = distances[rows, column]
+
+    mad_rejected = np.zeros(len(values), dtype=bool)
+    for i in range(len(values) if window else 0):
+      window_values = values[max(0, i - window // 2):i + window // 2 + 1]
+      median = np.median(window_values)
+      mad = np.median(np.abs(window_values - median))
+      mad_rejected[i] = abs(values[i] - median) > threshold * Despiker.mad_scale * mad
+    flags[rows[mad_rejected], column] |= Despiker.MAD
+
+    kept = list(np.flatnonzero(~mad_rejected))
+    for _ in range(max_iterations if max_jump is not None else 0):
+      spikes = [
+        kept[k] for k in range(1, len(kept) - 1)
+        if abs(values[kept[k]] - values[kept[k - 1]]) > max_jump
+        and abs(values[kept[k + 1]] - values[kept[k]]) > max_jump
+        and np.sign(values[kept[k]] - values[kept[k - 1]]) != np.sign(values[kept[k + 1]] - values[kept[k]])
+      ]
+      if spikes == []:
+        break
+      flags[rows[spikes], column] |= Despiker.JUMP
+      kept = [indx for indx in kept if indx not in spikes]
+
+  return flags
+
+def noisySeries(seed: int):
+  rng = np.random.default_rng(seed)
+  distances = np.cumsum(rng.normal(0, 1, (60, 25)), axis=0)
+  spikes = rng.uniform(size=distances.shape) < 0.08
+  distances[spikes] += rng.choice([-1, 1], spikes.sum()) * rng.uniform(10, 30, spikes.sum())
+  distances[rng.uniform(size=distances.shape) < 0.2] = np.nan
+
+  return distances
+
+def test_flags_match_brute_force(monkeypatch):
+  distances = noisySeries(0)
+  expected = bruteForce(distances, 5, 3, 8)
+
+  cleaned, flags = Despiker.despike(distances, window=5, threshold=3, max_jump=8)
+  np.testing.assert_array_equal(flags, expected)
+  np.testing.assert_array_equal(cleaned, np.where(expected & (Despiker.MAD | Despiker.JUMP), np.nan, distances))
+
+  # tiles of a few transects give the same flags
+  monkeypatch.setattr(Despiker, 'budget_cells', 60 * 5 * 3)
+  np.testing.assert_array_equal(Despiker.despike(distances, window=5, threshold=3, max_jump=8)[1], expected)
+
+def test_rules_can_be_skipped():
+  distances = noisySeries(1)
+
+  _, mad_only = Despiker.despike(distances, window=7, threshold=2.5)
+  np.testing.assert_array_equal(mad_only, bruteForce(distances, 7, 2.5, None))
+
+  _, jump_only = Despiker.despike(distances, window=0, max_jump=5)
+  np.testing.assert_array_equal(jump_only, bruteForce(distances, 0, None, 5))
+
+def test_single_spike_is_removed():
+  distances = np.array([[10.0], [11.0], [40.0], [12.0], [13.0]])
+  cleaned, flags = Despiker.despike(distances, window=0, max_jump=10)
+
+  np.testing.assert_array_equal(flags[:, 0], [0, 0, Despiker.JUMP, 0, 0])
+  assert np.isnan(cleaned[2, 0])
+
+def test_table_round_trip(tmp_path):
+  distances = noisySeries(2)
+  table = pd.DataFrame(distances, columns=['T{indx}'.format(indx=indx) for indx in range(distances.shape[1])])
+  table.insert(0, 'dates', ['{day:02d}/01/2020'.format(day=day % 28 + 1) for day in range(len(table))])
+  table.to_csv(tmp_path / 'ts.csv', index=False)
+
+  counts = Despiker.despikeTable(str(tmp_path / 'ts.csv'), str(tmp_path / 'clean.npy'), window=5, max_jump=8)
+  written = pd.read_csv(tmp_path / 'ts.csv')
+  expected = bruteForce(written[written.columns[1:]].to_numpy(dtype=float), 5, 3, 8)
+
+  assert counts['jump_rejected'] == np.count_nonzero(expected & Despiker.JUMP)
+  assert counts['mad_rejected'] == np.count_nonzero(expected & Despiker.MAD)
+  assert (tmp_path / 'clean_flags.npy').is_file()
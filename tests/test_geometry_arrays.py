@@ -0,0 +1,83 @@
+import numpy as np
+
+from pyshores.GeometryArrays import GeometryArrays
+
+def bruteForce(transects, segments):
+  '''
+    the closest crossing of every transect, one pair at a time
+  '''
+  distances = np.full(len(transects), np.nan)
+  for (i, ((px, py), (ex, ey))) in enumerate(transects):
+    rx, ry = ex - px, ey - py
+    best = None
+    for ((qx, qy), (fx, fy)) in segments:
+      sx, sy = fx - qx, fy - qy
+      denom = rx * sy - ry * sx
+      if denom == 0:
+        continue
+      t = ((qx - px) * sy - (qy - py) * sx) / denom
+      u = ((qx - px) * ry - (qy - py) * rx) / denom
+      if 0 <= t <= 1 and 0 <= u <= 1 and (best is None or t < best):
+        best = t
+    if best is not None:
+      distances[i] = best * np.hypot(rx, ry)
+
+  return distances
+
+def test_box_candidate_without_crossing_is_nan():
+  # the second transect overlaps the bounding box of the shoreline but never crosses it
+  distances = GeometryArrays.intersectPolyline(
+    [[[0, 0], [0, 10]], [[1.5, 6], [1.5, 10]]],
+    [[-1, 5], [2, 5], [2, 20]]
+  )
+
+  np.testing.assert_allclose(distances, [5, np.nan])
+
+def test_closest_crossing_is_taken():
+  distances = GeometryArrays.intersectPolyline([[[0, 0], [0, 10]]], [[-1, 8], [1, 8], [1, 3], [-1, 3]])
+
+  np.testing.assert_allclose(distances, [3])
+
+def test_parts_are_not_joined():
+  segments = GeometryArrays.partsSegments([np.array([[-1, 2], [-0.5, 2]]), np.array([[0.5, 4], [1, 4]])])
+  distances = GeometryArrays.intersectSegments([[[0, 0], [0, 10]]], segments)
+
+  assert np.isnan(distances[0])
+
+def test_kernel_matches_brute_force(monkeypatch):
+  # small blocks and chunks so that every transect crosses block and chunk boundaries
+  monkeypatch.setattr(GeometryArrays, "block_transects", 7)
+  monkeypatch.setattr(GeometryArrays, "chunk_pairs", 50)
+
+  rng = np.random.default_rng(0)
+  for _ in range(20):
+    origins = rng.uniform(0, 100, (60, 2))
+    angles = rng.uniform(0, 2 * np.pi, 60)
+    lengths = rng.uniform(1, 40, 60)
+    ends = origins + lengths[:, None] * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    transects = np.stack([origins, ends], axis=1)
+    vertices = np.cumsum(rng.normal(0, 8, (40, 2)), axis=0) + 50
+    segments = GeometryArrays.polylineSegments(vertices)
+
+    np.testing.assert_allclose(
+      GeometryArrays.intersectSegments(transects, segments),
+      bruteForce(transects, segments),
+      atol=1e-9
+    )
+
+def test_nearest_matches_brute_force(monkeypatch):
+  monkeypatch.setattr(GeometryArrays, "block_transects", 16)
+
+  rng = np.random.default_rng(1)
+  for _ in range(10):
+    # a wiggly baseline with a few long segments, and points on both sides and beyond its ends
+    vertices = np.cumsum(rng.normal(0, 3, (300, 2)) + [2, 0], axis=0)
+    vertices[::50] += rng.normal(0, 40, (6, 2))
+    segments = GeometryArrays.polylineSegments(vertices)
+    points = np.cumsum(rng.normal(0, 3, (500, 2)) + [1.5, 0], axis=0) + [-100, 20]
+
+    nearest, distances = GeometryArrays.nearestOnSegments(points, segments)
+    dist2, _ = GeometryArrays.projectOnSegments(points, segments)
+
+    np.testing.assert_allclose(distances, np.sqrt(dist2.min(axis=1)), atol=1e-9)
+    np.testing.assert_allclose(np.hypot(*(nearest - points).T), distances, atol=1e-9)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from pyshores.IntersectMatrix import IntersectMatrix, IntersectMatrixWriter
+
+def randomMatrix(seed: int = 0) -> IntersectMatrix:
+  rng = np.random.default_rng(seed)
+  distances = rng.normal(50, 10, (12, 7))
+  distances[rng.uniform(size=distances.shape) < 0.25] = np.nan
+  dates = ['{day:02d}/01/2020'.format(day=day) for day in range(1, 13)]
+
+  return IntersectMatrix(dates, ['T{indx}'.format(indx=indx) for indx in range(7)], distances, 'EPSG:32651')
+
+def assertSameMatrix(matrix, expected):
+  assert matrix.dates == expected.dates
+  assert matrix.transects == expected.transects
+  np.testing.assert_array_equal(np.asarray(matrix.distances), np.asarray(expected.distances))
+
+def test_save_load_round_trip(tmp_path):
+  matrix = randomMatrix()
+  matrix.save(str(tmp_path / 'intersects'))
+  loaded = IntersectMatrix.load(str(tmp_path / 'intersects.npy'))
+
+  assertSameMatrix(loaded, matrix)
+  assert loaded.crs == 'EPSG:32651'
+  # memory mapped, one transect is one contiguous block of the file
+  assert isinstance(loaded.distances, np.memmap)
+  assert loaded.distances.flags['F_CONTIGUOUS']
+
+def test_convert_round_trip(tmp_path):
+  matrix = randomMatrix(1)
+  matrix.toCSV(str(tmp_path / 'table.csv'))
+
+  IntersectMatrix.convert(str(tmp_path / 'table.csv'), str(tmp_path / 'table.npy'), crs='EPSG:32651')
+  IntersectMatrix.convert(str(tmp_path / 'table.npy'), str(tmp_path / 'back.csv'))
+
+  # the csv parser may round the last digit, the .npy keeps what it read
+  assertSameMatrix(IntersectMatrix.load(str(tmp_path / 'table.npy')), IntersectMatrix.fromCSV(str(tmp_path / 'table.csv')))
+  np.testing.assert_allclose(IntersectMatrix.load(str(tmp_path / 'table.npy')).distances, matrix.distances, rtol=1e-15)
+  pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'back.csv'), pd.read_csv(tmp_path / 'table.csv'))
+
+def test_slices_chunks_and_rows(tmp_path):
+  matrix = randomMatrix(2)
+  matrix.save(str(tmp_path / 'intersects.npy'))
+  loaded = IntersectMatrix.load(str(tmp_path / 'intersects.npy'))
+
+  np.testing.assert_array_equal(loaded.sliceTransects(2, 5).distances, matrix.distances[:, 2:5])
+  assert loaded.sliceTransects(2, 5).transects == matrix.transects[2:5]
+  assertSameMatrix(loaded.sliceDates(0, 4).appendRows(loaded.sliceDates(4, 12)), matrix)
+  assertSameMatrix(loaded.takeRows([3, 0]), IntersectMatrix([matrix.dates[3], matrix.dates[0]], matrix.transects, matrix.distances[[3, 0]]))
+
+  chunks = list(IntersectMatrix.readTableChunks(str(tmp_path / 'intersects.npy'), 5))
+  assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+  pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), IntersectMatrix.readTable(str(tmp_path / 'intersects.npy')))
+
+def test_writer_matches_save(tmp_path):
+  matrix = randomMatrix(3)
+  writer = IntersectMatrixWriter(str(tmp_path / 'written'), len(matrix.dates), matrix.transects, matrix.crs)
+  for (date, row) in zip(matrix.dates, matrix.distances):
+    writer.addRow(date, row)
+  writer.close()
+
+  assertSameMatrix(IntersectMatrix.load(str(tmp_path / 'written.npy')), matrix)
+
+  in_memory = IntersectMatrixWriter(None, len(matrix.dates), matrix.transects)
+  for (date, row) in zip(matrix.dates[:5], matrix.distances[:5]):
+    in_memory.addRow(date, row)
+  assertSameMatrix(in_memory.toMatrix(), matrix.sliceDates(0, 5))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from pyshores.RatesAccumulator import RatesAccumulator
+from pyshores.RatesEngine import RatesEngine
+
+def intersectMatrix(seed: int):
+  rng = np.random.default_rng(seed)
+  dates = np.datetime64('2000-01-01') + rng.choice(np.arange(10000), 30, replace=False).astype('timedelta64[D]')
+  distances = rng.normal(0, 2, (30, 50)).cumsum(axis=0)
+  distances[rng.uniform(size=distances.shape) < 0.3] = np.nan
+  distances[:, 0] = np.nan
+
+  return dates, distances
+
+def assertMatchesEngine(accumulator, dates, distances):
+  expected = RatesEngine.compute(RatesEngine.yearsSince(dates), distances)
+  for (metric, values) in accumulator.rates().items():
+    np.testing.assert_allclose(values, expected[metric], rtol=1e-7, atol=1e-7, err_msg=metric)
+
+def test_updates_match_engine():
+  dates, distances = intersectMatrix(0)
+  names = ['T{indx}'.format(indx=indx) for indx in range(distances.shape[1])]
+
+  # dates are added out of order, from an epoch that is not a shoreline date
+  accumulator = RatesAccumulator(names, '1990-06-15')
+  for (date, row) in zip(dates, distances):
+    accumulator.update(date, row)
+    added = len(accumulator.dates)
+    assertMatchesEngine(accumulator, dates[:added], distances[:added])
+
+def test_rebuild_matches_updates():
+  dates, distances = intersectMatrix(1)
+  names = ['T{indx}'.format(indx=indx) for indx in range(distances.shape[1])]
+
+  accumulator = RatesAccumulator(names, dates.min())
+  for (date, row) in zip(dates, distances):
+    accumulator.update(date, row)
+  rebuilt = RatesAccumulator.rebuild(names, dates, distances)
+
+  assert rebuilt.dates == accumulator.dates
+  for (metric, values) in rebuilt.rates().items():
+    np.testing.assert_allclose(values, accumulator.rates()[metric], rtol=1e-7, atol=1e-7, err_msg=metric)
+  assertMatchesEngine(rebuilt, dates, distances)
+
+def test_save_load_and_update_again(tmp_path):
+  dates, distances = intersectMatrix(2)
+  names = ['T{indx}'.format(indx=indx) for indx in range(distances.shape[1])]
+
+  accumulator = RatesAccumulator.rebuild(names, dates[:-1], distances[:-1])
+  accumulator.save(str(tmp_path / 'state.npz'))
+  loaded = RatesAccumulator.load(str(tmp_path / 'state.npz'))
+  loaded.update(dates[-1], distances[-1])
+
+  assertMatchesEngine(loaded, dates, distances)
+  with pytest.raises(Exception):
+    loaded.update(dates[0], distances[0])
@@ -0,0 +1,71 @@
+import numpy as np
+
+from pyshores.RatesBootstrap import RatesBootstrap
+from pyshores.RatesEngine import RatesEngine
+
+def intersectMatrix(seed: int):
+  rng = np.random.default_rng(seed)
+  years = np.sort(rng.uniform(0, 20, 15))
+  distances = rng.normal(0, 3, (15, 30)) + rng.normal(0, 1, 30) * years[:, None]
+  distances[rng.uniform(size=distances.shape) < 0.2] = np.nan
+  uncertainty = rng.uniform(1, 8, 15)
+
+  return years, distances, uncertainty
+
+def bruteForce(counts, years, distances, weights):
+  '''
+    slope of every replicate of every transect, one weighted fit at a time
+  '''
+  slopes = np.full((len(counts), distances.shape[1]), np.nan)
+  for replicate in range(len(counts)):
+    for column in range(distances.shape[1]):
+      w = counts[replicate] * weights * ~np.isnan(distances[:, column])
+      drawn = w > 0
+      if len(np.unique(years[drawn])) < 2:
+        continue
+      x, y, w = years[drawn], distances[drawn, column], w[drawn]
+      mean_x, mean_y = np.average(x, weights=w), np.average(y, weights=w)
+      slopes[replicate, column] = (w * (x - mean_x) * (y - mean_y)).sum() / (w * (x - mean_x) ** 2).sum()
+
+  return slopes
+
+def test_replicate_slopes_match_brute_force():
+  years, distances, uncertainty = intersectMatrix(0)
+  counts = RatesBootstrap.countMatrix(len(years), 40, seed=1)
+  weights = RatesEngine.uncertaintyWeights(uncertainty)
+
+  np.testing.assert_allclose(RatesBootstrap.replicateSlopes(counts, years, distances), bruteForce(counts, years, distances, np.ones(len(years))), rtol=1e-8, atol=1e-10)
+  np.testing.assert_allclose(RatesBootstrap.replicateSlopes(counts, years, distances, weights), bruteForce(counts, years, distances, weights), rtol=1e-8, atol=1e-10)
+
+def test_intervals_do_not_depend_on_tiles_or_processes(monkeypatch):
+  years, distances, uncertainty = intersectMatrix(1)
+  one_tile = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=200, seed=3)
+
+  # tiles of 3 transects
+  monkeypatch.setattr(RatesBootstrap, 'budget_cells', 600)
+  for processes in (1, 2):
+    tiled = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=200, seed=3, processes=processes)
+    assert list(tiled) == list(one_tile)
+    # the same draws, only the blocking of the matrix products may differ in the last bits
+    for (metric, values) in tiled.items():
+      np.testing.assert_allclose(values, one_tile[metric], rtol=1e-12, atol=1e-15, err_msg=metric)
+
+def test_intervals_depend_only_on_the_seed():
+  years, distances, uncertainty = intersectMatrix(2)
+  first = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=100, seed=7)
+  again = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=100, seed=7)
+  other = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=100, seed=8)
+
+  for metric in first:
+    np.testing.assert_array_equal(first[metric], again[metric])
+  assert not np.allclose(first['LRR_SE'], other['LRR_SE'], equal_nan=True)
+
+def test_interval_brackets_the_fitted_slope():
+  years, distances, uncertainty = intersectMatrix(3)
+  rates = RatesBootstrap.compute(years, distances, uncertainty, n_replicates=500, level=0.9, seed=0)
+  lrr = RatesEngine.compute(years, distances)['LRR']
+
+  fitted = ~np.isnan(rates['LRR_lo'])
+  assert fitted.all()
+  assert ((rates['LRR_lo'] <= lrr) & (lrr <= rates['LRR_hi'])).mean() > 0.9
+  assert (rates['LRR_SE'] > 0).all()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from pyshores.RatesEngine import RatesEngine
+
+def bruteForce(years, distances, uncertainty):
+  '''
+    the metrics of every transect, one transect at a time
+  '''
+  rates = {metric: np.full(distances.shape[1], np.nan) for metric in ('NSM', 'EPR', 'EPRunc', 'SCE', 'LRR', 'LR2', 'WLR', 'WR2')}
+  for column in range(distances.shape[1]):
+    observed = ~np.isnan(distances[:, column])
+    x, y, u = years[observed], distances[observed, column], uncertainty[observed]
+    if len(x) == 0:
+      continue
+    order = np.argsort(x, kind='stable')
+    x, y, u = x[order], y[order], u[order]
+
+    rates['NSM'][column] = y[-1] - y[0]
+    rates['SCE'][column] = y.max() - y.min()
+    if x[-1] > x[0]:
+      rates['EPR'][column] = (y[-1] - y[0]) / (x[-1] - x[0])
+      rates['EPRunc'][column] = np.sqrt(u[0] ** 2 + u[-1] ** 2) / (x[-1] - x[0])
+      for (slope, r_squared, w) in (('LRR', 'LR2', np.ones(len(x))), ('WLR', 'WR2', 1 / u ** 2)):
+        # least squares of sqrt(w) * (y - a - b x)
+        design = np.stack([np.ones(len(x)), x], axis=1) * np.sqrt(w)[:, None]
+        (_, b), *_ = np.linalg.lstsq(design, y * np.sqrt(w), rcond=None)
+        rates[slope][column] = b
+        residuals = y - (np.average(y, weights=w) + b * (x - np.average(x, weights=w)))
+        total = y - np.average(y, weights=w)
+        if (w * total ** 2).sum() > 0:
+          rates[r_squared][column] = 1 - (w * residuals ** 2).sum() / (w * total ** 2).sum()
+
+  return rates
+
+def test_compute_matches_brute_force():
+  rng = np.random.default_rng(0)
+  years = rng.uniform(0, 30, 25)
+  distances = rng.normal(0, 1, (25, 40)).cumsum(axis=0) + 0.5 * years[:, None]
+  distances[rng.uniform(size=distances.shape) < 0.3] = np.nan
+  # transects with no intersection and with a single one
+  distances[:, 0] = np.nan
+  distances[1:, 1] = np.nan
+  uncertainty = rng.uniform(1, 10, 25)
+
+  rates = RatesEngine.compute(years, distances, uncertainty)
+  expected = bruteForce(years, distances, uncertainty)
+  for (metric, values) in expected.items():
+    np.testing.assert_allclose(rates[metric], values, rtol=1e-9, atol=1e-9, err_msg=metric)
+
+def test_single_metrics_match_compute():
+  rng = np.random.default_rng(1)
+  years = rng.uniform(0, 10, 12)
+  distances = rng.normal(0, 5, (12, 8))
+  distances[rng.uniform(size=distances.shape) < 0.2] = np.nan
+  uncertainty = rng.uniform(1, 5, 12)
+
+  rates = RatesEngine.compute(years, distances, uncertainty)
+  np.testing.assert_allclose(RatesEngine.calcWLR(years, distances, uncertainty), rates['WLR'])
+  np.testing.assert_allclose(RatesEngine.calcEPRunc(years, distances, uncertainty), rates['EPRunc'])
+  np.testing.assert_allclose(RatesEngine.calcEPR(years, distances), rates['EPR'])
+
+def test_without_uncertainty_weighted_metrics_are_nan():
+  rates = RatesEngine.compute(np.array([0, 1, 2]), np.array([[0.0], [1.0], [2.0]]))
+
+  assert np.isnan(rates['WLR']).all() and np.isnan(rates['WR2']).all() and np.isnan(rates['EPRunc']).all()
+  np.testing.assert_allclose(rates['LRR'], [1])
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyshores.IntersectMatrix import IntersectMatrix
+from pyshores.TideCorrector import TideCorrector
+
+def test_matched_dates_take_their_level():
+  tides = pd.DataFrame({'dates': ['03/01/2020', '01/01/2020', '02/01/2020'], 'tide': [0.3, 0.1, 0.2]})
+
+  np.testing.assert_array_equal(TideCorrector.tideLevels(['01/01/2020', '03/01/2020'], tides), [0.1, 0.3])
+
+def test_missing_dates_are_interpolated_in_time():
+  # unsorted table, dates are day first as in CoastSat
+  tides = pd.DataFrame({'dates': ['11/01/2020', '01/01/2020', '01/02/2020'], 'tide': [1.0, 0.0, -1.0]})
+  dates = ['01/01/2020', '06/01/2020', '16/01/2020', '11/01/2020']
+
+  # brute force: a straight line between the two table dates around every date
+  def expected(date):
+    day = datetime.datetime.strptime(date, '%d/%m/%Y')
+    points = sorted((datetime.datetime.strptime(table_date, '%d/%m/%Y'), tide) for (table_date, tide) in zip(tides['dates'], tides['tide']))
+    for ((start, start_tide), (end, end_tide)) in zip(points[:-1], points[1:]):
+      if start <= day <= end:
+        return start_tide + (end_tide - start_tide) * (day - start) / (end - start)
+
+  np.testing.assert_allclose(TideCorrector.tideLevels(dates, tides, interpolate=True), [expected(date) for date in dates])
+
+  with pytest.raises(Exception):
+    TideCorrector.tideLevels(dates, tides)
+
+def test_correction_matches_brute_force(tmp_path, monkeypatch):
+  rng = np.random.default_rng(0)
+  distances = rng.normal(50, 10, (9, 11))
+  distances[rng.uniform(size=distances.shape) < 0.2] = np.nan
+  tide_levels = rng.uniform(-1, 1, 9)
+  slopes = rng.uniform(0.02, 0.2, 11)
+
+  expected = np.empty(distances.shape)
+  for date in range(9):
+    for transect in range(11):
+      expected[date, transect] = distances[date, transect] + (tide_levels[date] - 0.5) / slopes[transect]
+  np.testing.assert_allclose(TideCorrector.correct(distances, tide_levels, slopes, 0.5), expected)
+
+  # the tiled correction of a memory mapped matrix, tiles of 2 transects
+  monkeypatch.setattr(TideCorrector, 'budget_cells', 18)
+  matrix = IntersectMatrix(['{day:02d}/01/2020'.format(day=day) for day in range(1, 10)], ['T{indx}'.format(indx=indx) for indx in range(11)], distances)
+  corrected = TideCorrector.correctMatrix(matrix, tide_levels, slopes, str(tmp_path / 'corrected.npy'), 0.5)
+  np.testing.assert_allclose(corrected.distances, expected)
+
+def test_transect_slopes():
+  table = pd.DataFrame({'transect': ['T1', 'T0'], 'slope': [0.1, 0.05]})
+
+  np.testing.assert_array_equal(TideCorrector.transectSlopes(['T0', 'T1'], table), [0.05, 0.1])
+  np.testing.assert_array_equal(TideCorrector.transectSlopes(['T0', 'T1'], 0.08), [0.08, 0.08])
+  with pytest.raises(Exception):
+    TideCorrector.transectSlopes(['T0', 'T2'], table)
+  with pytest.raises(Exception):
+    TideCorrector.transectSlopes(['T0'], 0)